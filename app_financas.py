@@ -3,10 +3,33 @@ import pandas as pd
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
-import time
+from pathlib import Path
+import functools
 import json
+import os
+import tempfile
+import uuid
+import hashlib
 import plotly.express as px
 
+from backup import exportar, formato_do_arquivo, restaurar
+from categorizacao import Categorizador, categorizar
+from dados import (CAMPOS_EDITAVEIS, CONTAS_SALDO, ERROS_CONEXAO, CacheTransacoes,
+                   calcular_resumos, carregar_mes, carregar_periodo, carregar_regras,
+                   carregar_resumos, carregar_saldos, carregar_vocabulario, diferencas_edicao,
+                   excluir_importacao, excluir_mes, excluir_tudo, existem_transacoes,
+                   gerar_ids, impressoes_existentes, ler_todas_transacoes, limites_mes,
+                   listar_importacoes, montar_registro, numerar_ocorrencias, preencher_impressoes,
+                   reconstruir_resumos, reconstruir_saldos, reconstruir_vocabulario,
+                   registrar_importacao, saldo_em, saldos_calculados, salvar_em_lotes,
+                   salvar_regras, tipar_transacoes, vocabulario_calculado)
+from importacao import (TIPO_EXTRATO, TIPO_FATURA, aplicar_cabecalho,
+                        classificar_lancamentos, ler_grade, normalizar_importacao)
+from replica import ReplicaLocal
+from tendencias import (FREQUENCIAS, evolucao_categorias, frequencia_sugerida, receitas_despesas,
+                        reduzir, resultado_anterior, saldo_diario)
+import instrumentacao
+
 # --- Configuração da Página ---
 st.set_page_config(page_title="Minhas Finanças", layout="wide", initial_sidebar_state="collapsed")
 
@@ -64,138 +87,291 @@ if st.sidebar.button("🔒 Sair"):
 
 db = firestore.client()
 
-# --- Funções de Banco de Dados (CRUD) ---
-
-def adicionar_transacao(data_iso, tipo, cat_principal, sub_cat, desc, valor, pagto):
-    # data_iso deve vir no formato YYYY-MM-DD para salvar no banco
-    doc_ref = db.collection('transacoes').document()
-    doc_ref.set({
-        'data': data_iso,
-        'tipo': tipo,
-        'categoria_principal': cat_principal,
-        'sub_categoria': sub_cat,
-        'descricao': desc,
-        'valor': float(valor),
-        'forma_pagamento': pagto,
-        'criado_em': firestore.SERVER_TIMESTAMP
-    })
-    return True
-
-def atualizar_transacao(doc_id, data_iso, tipo, cat_principal, sub_cat, desc, valor, pagto):
-    doc_ref = db.collection('transacoes').document(doc_id)
-    doc_ref.update({
-        'data': data_iso,
-        'tipo': tipo,
-        'categoria_principal': cat_principal,
-        'sub_categoria': sub_cat,
-        'descricao': desc,
-        'valor': float(valor),
-        'forma_pagamento': pagto
-    })
-    return True
-
-def excluir_transacao(doc_id):
-    db.collection('transacoes').document(doc_id).delete()
-    return True
-
-def excluir_tudo():
-    docs = db.collection('transacoes').stream()
-    for doc in docs:
-        doc.reference.delete()
-    return True
+# --- Cache de Dados ---
+
+# Caminho do arquivo SQLite da réplica local (opcional). Com ela, o app abre a partir do disco,
+# sincroniza em segundo plano e continua funcionando se o Firestore ficar inacessível.
+REPLICA_LOCAL = st.secrets.get("REPLICA_LOCAL", "")
+
+@st.cache_resource
+def obter_cache():
+    # Compartilhado entre reruns: só a primeira carga lê a coleção inteira
+    replica = ReplicaLocal(REPLICA_LOCAL) if REPLICA_LOCAL else None
+    cache = CacheTransacoes(replica=replica)
+    if replica is not None:
+        cache.iniciar_sincronia(db)
+    return cache
 
 def carregar_dados():
-    # Busca todos os documentos da coleção 'transacoes'
-    docs = db.collection('transacoes').stream()
-    items = []
-    for doc in docs:
-        item = doc.to_dict()
-        item['id'] = doc.id # Guarda o ID para poder editar/excluir depois
-        items.append(item)
+    return obter_cache().carregar(db)
+
+def ler_ou_calcular(etapa, ler, calcular):
+    # ler(db) no Firestore; sem conexão, com réplica local, `calcular` dá o mesmo a partir da cópia em disco
+    try:
+        with instrumentacao.medir(etapa):
+            return ler(db)
+    except ERROS_CONEXAO:
+        if not REPLICA_LOCAL:
+            raise
+        return calcular()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def ler_resumos():
+    return ler_ou_calcular('firestore.resumos', carregar_resumos, lambda: calcular_resumos(carregar_dados()))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def ler_saldos():
+    return ler_ou_calcular('firestore.saldos', carregar_saldos, lambda: saldos_calculados(carregar_dados()))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def ler_vocabulario():
+    return ler_ou_calcular('firestore.vocabulario', carregar_vocabulario, lambda: vocabulario_calculado(carregar_dados()))
+
+def tem_transacoes():
+    # Só para decidir se os agregados precisam ser gerados: uma leitura, não a coleção
+    return ler_ou_calcular('firestore.existem', existem_transacoes, lambda: not carregar_dados().empty)
+
+def obter_vocabulario():
+    # Categorias por tipo e formas de pagamento já usadas, das mais frequentes para as menos
+    vocabulario = ler_vocabulario()
+    if vocabulario is None:
+        # Dados gravados antes de existir o vocabulário: gera uma vez a partir das transações
+        reconstruir_vocabulario(db, carregar_dados())
+        ler_vocabulario.clear()
+        vocabulario = ler_vocabulario()
+    return vocabulario
+
+def com_padrao(usados, padrao):
+    # Os já usados primeiro (por frequência), depois os padrão que ainda não apareceram
+    return list(dict.fromkeys(usados + padrao))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def ler_regras():
+    # Sem conexão, a importação sugere categorias só pelo histórico
+    return ler_ou_calcular('firestore.regras', carregar_regras, list)
+
+@st.cache_resource(max_entries=1, show_spinner="Aprendendo categorias do histórico...")
+def montar_categorizador(versao, regras_json):
+    # Refeito só quando as transações (versão do cache) ou as regras mudam
+    return Categorizador(carregar_dados(), json.loads(regras_json))
+
+def obter_categorizador():
+    return montar_categorizador(obter_cache().versao, json.dumps(ler_regras(), sort_keys=True))
+
+# "periodo": o extrato consulta no Firestore só o mês selecionado; "cache": filtra o cache completo
+# (padrão quando há réplica local, que já está em disco)
+MODO_CONSULTA = st.secrets.get("MODO_CONSULTA", "cache" if REPLICA_LOCAL else "periodo")
+
+@st.cache_data(ttl=30, show_spinner=False)
+def ler_mes(mes, tipos):
+    # Mesmo formato do cache (tipar_transacoes), para as abas tratarem as duas fontes igual
+    with instrumentacao.medir('firestore.mes', mes=mes):
+        return tipar_transacoes(carregar_mes(db, mes, list(tipos)))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def ler_periodo(inicio, fim):
+    # Meses 'YYYY-MM' de inicio a fim (inclusive), no formato do cache
+    with instrumentacao.medir('firestore.periodo', inicio=inicio, fim=fim):
+        return tipar_transacoes(carregar_periodo(db, limites_mes(inicio)[0], limites_mes(fim)[1]))
+
+# Linhas lidas para a pré-visualização da importação (além das puladas)
+LINHAS_PREVIA = 20
+
+@st.cache_data(max_entries=8, show_spinner="Lendo planilha...")
+def ler_planilha(hash_conteudo, _conteudo, nome_arquivo, limite_linhas=None):
+    # Cacheada pelo hash do conteúdo (o '_' faz o Streamlit não hashear os bytes a cada rerun)
+    return ler_grade(_conteudo, nome_arquivo, limite_linhas)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def normalizar_planilha(hash_conteudo, pular_linhas, _df_import, col_data, col_desc, col_valor,
+                        ano_extrato, mes_extrato, data_fixa, adicionar_data_desc):
+    # Chave: arquivo + linhas puladas + opções; mexer em outro controle da aba não refaz a normalização
+    return normalizar_importacao(_df_import, col_data, col_desc, col_valor, ano_extrato, mes_extrato,
+                                 data_fixa=data_fixa, adicionar_data_desc=adicionar_data_desc)
+
+def hash_upload(arquivo):
+    # sha256 calculado uma vez por upload, não a cada rerun da aba
+    hashes = st.session_state.setdefault('hashes_upload', {})
+    if arquivo.file_id not in hashes:
+        hashes[arquivo.file_id] = hashlib.sha256(arquivo.getvalue()).hexdigest()
+    return hashes[arquivo.file_id]
+
+def dados_alterados(recarregar=False):
+    # Chamar depois de toda gravação. As de obter_cache().gravar/incluir já estão no frame em memória;
+    # as exclusões em massa (recarregar=True) pedem a sincronização com o Firestore na próxima leitura
+    if recarregar:
+        obter_cache().invalidar()
+    ler_resumos.clear()
+    ler_saldos.clear()
+    ler_vocabulario.clear()
+    ler_mes.clear()
+    ler_periodo.clear()
+
+def avisar(mensagem, icone="✅"):
+    # Mostrado no rerun seguinte à gravação (um st.success sumiria junto com o rerun)
+    st.session_state.setdefault('avisos', []).append((mensagem, icone))
+
+def baixar_backup(caminho):
+    # Dados do botão de download, lidos só quando ele é clicado: depois disso o arquivo temporário
+    # não serve mais (o botão some no rerun seguinte)
+    conteudo = Path(caminho).read_bytes()
+    os.remove(caminho)
+    return conteudo
+
+# Com o segredo MEDIR_TEMPOS, liga a instrumentação: cada aba mostra no rodapé o tempo e as
+# leituras/escritas da sua última execução, a barra lateral mostra o detalhamento do último rerun
+# completo e cada etapa medida vira uma linha JSON no log (logger 'instrumentacao')
+MEDIR_TEMPOS = st.secrets.get("MEDIR_TEMPOS", False)
+if MEDIR_TEMPOS:
+    instrumentacao.ativar()
+    instrumentacao.configurar_log()
+
+def cronometrado(aba):
+    @functools.wraps(aba)
+    def _cronometrado():
+        with instrumentacao.medir(f"aba.{aba.__name__}") as medicao:
+            aba()
+        if medicao is not None:
+            st.caption(f"⏱️ {aba.__name__}: {medicao.ms:.0f} ms · {medicao.leituras} leitura(s) · {medicao.escritas} escrita(s) · "
+                       f"{(medicao.bytes_lidos + medicao.bytes_escritos) / 1024:.1f} KB")
+    return _cronometrado
+
+def painel_desempenho(execucao):
+    historico = st.session_state.setdefault('historico_execucoes', [])
+    historico.append(execucao.registro())
+    del historico[:-30]
     
-    if not items:
-        return pd.DataFrame()
+    with st.sidebar.expander("🛠️ Desempenho (último rerun completo)"):
+        col_t, col_l, col_e = st.columns(3)
+        col_t.metric("Tempo", f"{execucao.ms:.0f} ms")
+        col_l.metric("Leituras", execucao.leituras)
+        col_e.metric("Escritas", execucao.escritas)
+        st.caption(f"{execucao.bytes_lidos / 1024:.1f} KB lidos · {execucao.bytes_escritos / 1024:.1f} KB escritos (leituras em tamanho aproximado)")
+        
+        etapas = pd.DataFrame(list(execucao.linhas()))
+        etapas['etapa'] = etapas['nivel'].map(lambda nivel: "· " * nivel) + etapas['etapa']
+        st.dataframe(etapas[['etapa', 'ms', 'leituras', 'escritas', 'bytes_lidos', 'bytes_escritos']], hide_index=True, use_container_width=True)
         
-    df = pd.DataFrame(items)
-    return df
+        st.markdown("**Reruns anteriores (ms)**")
+        st.line_chart(pd.DataFrame(historico)['ms'])
 
 # --- Interface Principal ---
+# Cada aba é um fragmento: interagir com um controle reexecuta só a aba dele. Gravações chamam
+# st.rerun() (o app inteiro), para todas as abas verem os dados novos. Cada aba lê os dados pelo
+# cache (carregar_dados e ler_*), sem custo quando nada mudou.
+execucao = instrumentacao.iniciar('rerun')
+
 st.title("📱 Minhas Finanças")
 
-# Carrega os dados uma vez para usar em todas as abas (Otimização e Aprendizado)
-df_geral = carregar_dados()
+for mensagem, icone in st.session_state.pop('avisos', []):
+    st.toast(mensagem, icon=icone)
+
+aviso_conexao = st.empty()
 
-tab1, tab2, tab3, tab4 = st.tabs(["📊 Dashboard", "➕ Novo Lançamento", "📝 Gerenciar / Editar", "📂 Importar Excel"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Dashboard", "📈 Tendências", "➕ Novo Lançamento", "📝 Gerenciar / Editar", "📂 Importar Excel"])
 
 # --- ABA 1: DASHBOARD E EXTRATO ---
-with tab1:
-    df = df_geral
+@st.fragment
+@cronometrado
+def aba_dashboard():
+    # Métricas e gráficos leem os resumos mensais (poucos registros por mês), não as transações
+    resumos = ler_resumos()
     
-    if not df.empty:
-        # Converte a coluna de data (string YYYY-MM-DD) para datetime
-        df['data'] = pd.to_datetime(df['data'])
-        
+    if resumos.empty and tem_transacoes():
+        # Dados gravados antes de existirem os resumos: gera uma vez a partir das transações
+        reconstruir_resumos(db)
+        ler_resumos.clear()
+        resumos = ler_resumos()
+    
+    # Lançamentos sem data não têm mês (nem saldo no fim dele): ficam fora do seletor e
+    # aparecem em Gerenciar / Editar, com o filtro "Todos"
+    meses_disponiveis = [m for m in sorted(resumos['mes'].unique(), reverse=True) if m != 'sem-data']
+    
+    if meses_disponiveis:
         # Filtro de Mês/Ano
-        df['mes_ano'] = df['data'].dt.strftime('%Y-%m')
-        meses_disponiveis = sorted(df['mes_ano'].unique(), reverse=True)
         
         mes_selecionado = st.selectbox("Selecione o Período", meses_disponiveis)
         
-        df_filtrado = df[df['mes_ano'] == mes_selecionado].copy()
+        resumo_mes = resumos[resumos['mes'] == mes_selecionado]
         
         # Filtro de Tipo
-        tipos_disponiveis = sorted(df_filtrado['tipo'].unique())
+        tipos_disponiveis = sorted(resumo_mes['tipo'].unique())
         tipos_selecionados = st.multiselect("Filtrar por Tipo", tipos_disponiveis, default=tipos_disponiveis)
 
         if tipos_selecionados:
-            df_filtrado = df_filtrado[df_filtrado['tipo'].isin(tipos_selecionados)]
+            resumo_mes = resumo_mes[resumo_mes['tipo'].isin(tipos_selecionados)]
         
         # Filtro de Categoria
-        categorias_disponiveis = sorted(df_filtrado['sub_categoria'].unique())
+        categorias_disponiveis = sorted(resumo_mes['sub_categoria'].unique())
         categorias_selecionadas = st.multiselect("Filtrar por Categoria", categorias_disponiveis, default=categorias_disponiveis)
 
         if categorias_selecionadas:
-            df_filtrado = df_filtrado[df_filtrado['sub_categoria'].isin(categorias_selecionadas)]
-
-        # --- Lógica VR (Vale Refeição) ---
-        # Receita fixa mensal de R$ 220,00 se houver entrada de "Vale Refeição"
-        # OU se o usuário cadastrar manualmente. Vamos assumir o cálculo baseado nos lançamentos.
-        entradas_vr = df[(df['tipo'] == 'Receita') & (df['sub_categoria'] == 'Vale Refeição')]['valor'].sum()
-        saidas_vr = df[(df['tipo'] == 'Despesa') & (df['forma_pagamento'] == 'Vale Refeição')]['valor'].sum()
-        saldo_vr = entradas_vr - saidas_vr
+            resumo_mes = resumo_mes[resumo_mes['sub_categoria'].isin(categorias_selecionadas)]
+
+        # --- Lógica VR/VA (Vale Refeição / Alimentação) ---
+        # Entradas: Receitas da categoria do vale. Saídas: Despesas pagas com o vale.
+        # Os saldos correntes são mantidos a cada gravação; aqui só lemos os totais.
+        saldos = ler_saldos()
+        if not saldos and tem_transacoes():
+            # Dados gravados antes de existirem os saldos: calcula uma vez a partir das transações
+            reconstruir_saldos(db)
+            ler_saldos.clear()
+            saldos = ler_saldos()
+        vazio = {'total': 0.0, 'fechamentos': pd.Series(dtype=float)}
+        saldo_vr = saldos.get('vale_refeicao', vazio)
+        saldo_va = saldos.get('vale_alimentacao', vazio)
 
         # Métricas do Mês
-        receitas = df_filtrado[df_filtrado['tipo'] == 'Receita']['valor'].sum()
-        despesas = df_filtrado[df_filtrado['tipo'] == 'Despesa']['valor'].sum()
+        receitas = resumo_mes[resumo_mes['tipo'] == 'Receita']['valor'].sum()
+        despesas = resumo_mes[resumo_mes['tipo'] == 'Despesa']['valor'].sum()
         saldo = receitas - despesas
 
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         col1.metric("Saldo do Mês", f"R$ {saldo:,.2f}")
-        col2.metric("Saldo VR (Total)", f"R$ {saldo_vr:,.2f}")
+        col2.metric("Saldo VR (Total)", f"R$ {saldo_vr['total']:,.2f}", help=f"No fim de {mes_selecionado}: R$ {saldo_em(saldo_vr, mes_selecionado):,.2f}")
+        col3.metric("Saldo VA (Total)", f"R$ {saldo_va['total']:,.2f}", help=f"No fim de {mes_selecionado}: R$ {saldo_em(saldo_va, mes_selecionado):,.2f}")
         
         st.divider()
         
         st.subheader("Análise de Despesas")
-        df_despesas = df_filtrado[df_filtrado['tipo'] == 'Despesa']
+        df_despesas = resumo_mes[resumo_mes['tipo'] == 'Despesa']
         
         if not df_despesas.empty:
             col_g1, col_g2 = st.columns(2)
             
             with col_g1:
                 st.markdown("**Por Forma de Pagamento**")
-                gastos_por_pagto = df_despesas.groupby("forma_pagamento")["valor"].sum().sort_values(ascending=False)
-                st.bar_chart(gastos_por_pagto)
+                with instrumentacao.medir('grafico.pagamentos'):
+                    gastos_por_pagto = df_despesas.groupby("forma_pagamento")["valor"].sum().sort_values(ascending=False)
+                    st.bar_chart(gastos_por_pagto)
             
             with col_g2:
                 st.markdown("**Por Categoria**")
-                gastos_por_cat = df_despesas.groupby("sub_categoria")["valor"].sum().reset_index()
-                fig = px.pie(gastos_por_cat, values='valor', names='sub_categoria', hole=0.4)
-                st.plotly_chart(fig, use_container_width=True)
+                with instrumentacao.medir('grafico.categorias'):
+                    gastos_por_cat = df_despesas.groupby("sub_categoria")["valor"].sum().reset_index()
+                    fig = px.pie(gastos_por_cat, values='valor', names='sub_categoria', hole=0.4)
+                    st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("Nenhuma despesa encontrada com os filtros atuais.")
         
         st.subheader("Extrato Detalhado")
         
+        # Só o extrato precisa das transações individuais, e só as do mês
+        if MODO_CONSULTA == "periodo":
+            # Todos os tipos marcados é o mesmo que nenhum filtro: a leitura do mês fica no cache uma
+            # vez só, compartilhada com a aba de edição
+            filtro_tipos = () if set(tipos_selecionados) == set(tipos_disponiveis) else tuple(tipos_selecionados)
+            df_filtrado = ler_mes(mes_selecionado, filtro_tipos)
+        else:
+            df = carregar_dados()
+            df_filtrado = df[df['mes'] == pd.Period(mes_selecionado, freq='M')]
+            if tipos_selecionados:
+                df_filtrado = df_filtrado[df_filtrado['tipo'].isin(tipos_selecionados)]
+        if categorias_selecionadas:
+            df_filtrado = df_filtrado[df_filtrado['sub_categoria'].isin(categorias_selecionadas)]
+        # Valor em reais só para exibir (o frame guarda centavos)
+        df_filtrado = df_filtrado.assign(valor=df_filtrado['centavos'] / 100)
+        
         st.dataframe(
             df_filtrado[['data', 'tipo', 'sub_categoria', 'descricao', 'valor', 'forma_pagamento']].sort_values(by='data', ascending=False),
             use_container_width=True,
@@ -212,8 +388,79 @@ with tab1:
     else:
         st.info("Nenhum dado cadastrado.")
 
-# --- ABA 2: LANÇAMENTO MANUAL ---
-with tab2:
+# --- ABA 2: TENDÊNCIAS ---
+@st.fragment
+@cronometrado
+def aba_tendencias():
+    # Receitas/despesas e categorias saem dos resumos mensais; só o saldo diário usa as transações
+    # (no modo "periodo", lidas do Firestore só quando pedido e só as do intervalo)
+    resumos = ler_resumos()
+    meses = sorted(mes for mes in resumos['mes'].unique() if mes != 'sem-data')
+    if not meses:
+        st.info("Ainda não há lançamentos para mostrar tendências.")
+        return
+    
+    if len(meses) > 1:
+        inicio, fim = st.select_slider("Período", options=meses, value=(meses[max(0, len(meses) - 24)], meses[-1]))
+    else:
+        inicio = fim = meses[0]
+    inicio, fim = pd.Period(inicio, freq='M'), pd.Period(fim, freq='M')
+    
+    agrupamentos = list(FREQUENCIAS)
+    sugerido = agrupamentos[list(FREQUENCIAS.values()).index(frequencia_sugerida(inicio, fim))]
+    frequencia = FREQUENCIAS[st.radio("Agrupar por", agrupamentos, index=agrupamentos.index(sugerido), horizontal=True)]
+    
+    totais = receitas_despesas(resumos, inicio, fim, frequencia)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Receitas no Período", f"R$ {totais['Receita'].sum():,.2f}")
+    col2.metric("Despesas no Período", f"R$ {totais['Despesa'].sum():,.2f}")
+    col3.metric("Resultado", f"R$ {totais['Resultado'].sum():,.2f}")
+    
+    st.subheader("Receitas x Despesas")
+    with instrumentacao.medir('grafico.receitas_despesas'):
+        grafico = totais[['Receita', 'Despesa']].set_axis(totais.index.astype(str)).rename_axis('Período').reset_index()
+        grafico = grafico.melt(id_vars='Período', var_name='Tipo', value_name='Valor')
+        fig = px.bar(grafico, x='Período', y='Valor', color='Tipo', barmode='group')
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.subheader("Evolução por Categoria")
+    tipo = st.radio("Tipo", ["Despesa", "Receita"], horizontal=True, key="tipo_tendencias")
+    with instrumentacao.medir('grafico.evolucao_categorias'):
+        categorias = evolucao_categorias(resumos, tipo, inicio, fim, frequencia)
+        if categorias.empty:
+            st.info("Nenhum lançamento deste tipo no período.")
+        else:
+            grafico = categorias.set_axis(categorias.index.astype(str)).rename_axis('Período').reset_index()
+            grafico = grafico.melt(id_vars='Período', var_name='Categoria', value_name='Valor')
+            fig = px.area(grafico, x='Período', y='Valor', color='Categoria')
+            st.plotly_chart(fig, use_container_width=True)
+    
+    st.subheader("Saldo Acumulado")
+    diario = MODO_CONSULTA != "periodo" or st.toggle("Saldo dia a dia", key="saldo_diario",
+                                                      help="Lê do Firestore os lançamentos do período selecionado")
+    with instrumentacao.medir('grafico.saldo_acumulado'):
+        if not diario:
+            # Saldo no fim de cada período, já calculado dos resumos: nenhuma transação lida
+            fig = px.line(x=totais.index.astype(str), y=totais['Acumulado'].to_numpy(), markers=True,
+                          labels={'x': 'Período', 'y': 'Saldo (R$)'})
+            st.plotly_chart(fig, use_container_width=True)
+            return
+        if MODO_CONSULTA == "periodo":
+            # Só o intervalo vem do Firestore; o acumulado de antes dele sai dos resumos
+            saldo = saldo_diario(ler_periodo(str(inicio), str(fim)), inicio, fim, anterior=resultado_anterior(resumos, inicio))
+        else:
+            saldo = saldo_diario(carregar_dados(), inicio, fim)
+        # Anos de pontos diários viram no máximo MAXIMO_PONTOS, com picos e vales preservados
+        pontos = reduzir(saldo)
+        fig = px.line(x=pontos.index, y=pontos.to_numpy(), labels={'x': 'Data', 'y': 'Saldo (R$)'})
+        st.plotly_chart(fig, use_container_width=True)
+        if len(pontos) < len(saldo):
+            st.caption(f"{len(saldo)} dias resumidos em {len(pontos)} pontos no gráfico.")
+
+# --- ABA 3: LANÇAMENTO MANUAL ---
+@st.fragment
+@cronometrado
+def aba_lancamento():
     st.header("Registro Manual")
     
     # Listas Padrão
@@ -221,18 +468,11 @@ with tab2:
     lista_cat_despesa = ["Conta de Luz", "Conta de Celular", "Condomínio", "Internet", "Lazer", "Viagens", "Mercado", "Almoço/Jantar", "Outros"]
     lista_pagamento = ["Cartão de Crédito", "PIX", "Boleto", "Dinheiro", "Vale Refeição", "Vale Alimentação"]
 
-    # Aprendizado: Adiciona categorias/pagamentos que já existem no banco às listas padrão
-    if not df_geral.empty:
-        if 'sub_categoria' in df_geral.columns:
-            cats_receita_db = df_geral[df_geral['tipo'] == 'Receita']['sub_categoria'].unique().tolist()
-            lista_cat_receita = sorted(list(set(lista_cat_receita + cats_receita_db)))
-            
-            cats_despesa_db = df_geral[df_geral['tipo'] == 'Despesa']['sub_categoria'].unique().tolist()
-            lista_cat_despesa = sorted(list(set(lista_cat_despesa + cats_despesa_db)))
-        
-        if 'forma_pagamento' in df_geral.columns:
-            pagtos_db = df_geral['forma_pagamento'].unique().tolist()
-            lista_pagamento = sorted(list(set(lista_pagamento + pagtos_db)))
+    # Aprendizado: categorias/pagamentos que já existem no banco vêm antes das listas padrão
+    vocabulario = obter_vocabulario()
+    lista_cat_receita = com_padrao(vocabulario['categorias'].get('Receita', []), lista_cat_receita)
+    lista_cat_despesa = com_padrao(vocabulario['categorias'].get('Despesa', []), lista_cat_despesa)
+    lista_pagamento = com_padrao(vocabulario['pagamentos'], lista_pagamento)
 
     with st.form("form_manual"):
         tipo_operacao = st.radio("Tipo", ["Despesa", "Receita"], horizontal=True)
@@ -269,123 +509,314 @@ with tab2:
             pagto_final = novo_pagamento.strip() if novo_pagamento.strip() else forma_pagamento_selecao
             
             # Salva a data como string YYYY-MM-DD para o Firebase
-            adicionar_transacao(data_transacao.strftime('%Y-%m-%d'), tipo_operacao, cat_principal, cat_final, descricao, valor, pagto_final)
-            st.success("Salvo!")
-            
-            time.sleep(1) # Pequena pausa para o Firebase processar
+            gravado = obter_cache().gravar(db, 'adicionar', data_transacao.strftime('%Y-%m-%d'), tipo_operacao, cat_principal, cat_final, descricao, valor, pagto_final)
+            dados_alterados()
+            avisar("Salvo!" if gravado else "Salvo na fila local: será enviado quando a conexão voltar.")
             st.rerun()
 
-# --- ABA 3: GERENCIAR / EDITAR ---
-with tab3:
+# --- ABA 4: GERENCIAR / EDITAR ---
+@st.fragment
+@cronometrado
+def aba_edicao():
     st.header("Editar ou Excluir Lançamentos")
-    df_edit = df_geral.copy()
     
-    if not df_edit.empty:
-        df_edit['data'] = pd.to_datetime(df_edit['data'])
-        df_edit = df_edit.sort_values(by='data', ascending=False)
+    # No modo "periodo" só o mês escolhido é lido; a coleção inteira, só com o filtro "Todos"
+    if MODO_CONSULTA == "periodo":
+        ha_lancamentos = not ler_resumos().empty
+    else:
+        ha_lancamentos = not carregar_dados().empty
+    
+    if ha_lancamentos:
+        # --- Filtros: só a página filtrada é montada na tela ---
+        col_f1, col_f2, col_f3 = st.columns(3)
+        meses_edicao = ["Todos"] + [m for m in sorted(ler_resumos()['mes'].unique(), reverse=True) if m != 'sem-data']
+        mes_edicao = col_f1.selectbox("Mês", meses_edicao, index=min(1, len(meses_edicao) - 1), key="mes_edicao")
         
-        # Tratamento para evitar erros se houver campos vazios
-        df_edit['descricao'] = df_edit['descricao'].fillna('')
-        df_edit['valor'] = df_edit['valor'].fillna(0.0)
-        df_edit['sub_categoria'] = df_edit['sub_categoria'].fillna('Outros')
-        df_edit['categoria_principal'] = df_edit['categoria_principal'].fillna('Pessoal')
-
-        # Cria uma lista de descrições para o selectbox
-        df_edit['display'] = df_edit['data'].dt.strftime('%d/%m/%Y') + " - " + df_edit['descricao'].astype(str) + " (R$ " + df_edit['valor'].astype(str) + ")"
+        if mes_edicao == "Todos":
+            df_edit = carregar_dados()
+        elif MODO_CONSULTA == "periodo":
+            df_edit = ler_mes(mes_edicao, ())
+        else:
+            df_geral = carregar_dados()
+            df_edit = df_geral[df_geral['mes'] == pd.Period(mes_edicao, freq='M')]
         
-        escolha = st.selectbox("Selecione o lançamento para alterar:", df_edit['display'])
+        categorias_edicao = sorted(df_edit['sub_categoria'].dropna().astype(str).unique())
+        categorias_filtro = col_f2.multiselect("Categoria", categorias_edicao, key="categorias_edicao")
+        busca = col_f3.text_input("Buscar na descrição", key="busca_edicao").strip()
         
-        # Pega os dados do item selecionado
-        item_selecionado = df_edit[df_edit['display'] == escolha].iloc[0]
+        if categorias_filtro:
+            df_edit = df_edit[df_edit['sub_categoria'].isin(categorias_filtro)]
+        if busca:
+            df_edit = df_edit[df_edit['descricao'].str.contains(busca, case=False, regex=False)]
+        df_edit = df_edit.sort_values(['data', 'id'], ascending=False)
         
-        with st.expander("✏️ Editar Detalhes", expanded=True):
-            with st.form("form_edicao"):
-                id_doc = item_selecionado['id']
-                
-                # Campos preenchidos com os valores atuais
-                novo_tipo = st.radio("Tipo", ["Despesa", "Receita"], index=0 if item_selecionado['tipo'] == "Despesa" else 1, horizontal=True)
-                
-                # --- Lógica de Categorias para Edição ---
-                lista_cat_receita = ["Salário", "Vale Alimentação", "Vale Refeição", "Auxílio", "Empréstimo Recebido", "Outros"]
-                lista_cat_despesa = ["Conta de Luz", "Conta de Celular", "Condomínio", "Internet", "Lazer", "Viagens", "Mercado", "Almoço/Jantar", "Outros"]
-                
-                if not df_geral.empty:
-                    if 'sub_categoria' in df_geral.columns:
-                        cats_receita_db = df_geral[df_geral['tipo'] == 'Receita']['sub_categoria'].unique().tolist()
-                        lista_cat_receita = sorted(list(set(lista_cat_receita + cats_receita_db)))
-                        cats_despesa_db = df_geral[df_geral['tipo'] == 'Despesa']['sub_categoria'].unique().tolist()
-                        lista_cat_despesa = sorted(list(set(lista_cat_despesa + cats_despesa_db)))
-
-                # Define opções com base no tipo ORIGINAL
-                if item_selecionado['tipo'] == "Receita":
-                    opcoes_cat = lista_cat_receita
-                    opcoes_princ = ["Renda"]
+        col_p1, col_p2 = st.columns(2)
+        por_pagina = col_p1.selectbox("Linhas por página", [25, 50, 100], key="por_pagina_edicao")
+        total_paginas = max(1, -(-len(df_edit) // por_pagina))
+        pagina_atual = col_p2.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1)
+        pagina = df_edit.iloc[(pagina_atual - 1) * por_pagina:pagina_atual * por_pagina]
+        st.caption(f"{len(df_edit)} lançamento(s) encontrado(s).")
+        
+        # Só a página vira texto comum (uma coluna 'category' na grade só aceitaria as categorias
+        # já existentes) e valor em reais. Indexada pelo ID do documento: cada linha é localizada
+        # direto, sem ambiguidade entre lançamentos iguais.
+        pagina = pd.DataFrame({
+            'data': pagina['data'],
+            'tipo': pagina['tipo'].astype(object),
+            'categoria_principal': pagina['categoria_principal'].astype(object).fillna('Pessoal'),
+            'sub_categoria': pagina['sub_categoria'].astype(object).fillna('Outros'),
+            'descricao': pagina['descricao'],
+            'valor': pagina['centavos'] / 100,
+            'forma_pagamento': pagina['forma_pagamento'].astype(object)
+        }).set_index(pagina['id'])
+        
+        if pagina.empty:
+            st.info("Nenhum lançamento com esses filtros.")
+        else:
+            st.markdown("**Edição em grade:** altere as células (ou marque *Excluir*) e salve a página de uma vez.")
+            grade = pagina[CAMPOS_EDITAVEIS].assign(excluir=False)
+            # A chave muda junto com as linhas exibidas, para uma edição não ir parar em outra linha
+            chave_grade = hashlib.sha1('|'.join(pagina.index).encode('utf-8')).hexdigest()[:16]
+            editado = st.data_editor(
+                grade,
+                key=f"grade_edicao_{chave_grade}",
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "data": st.column_config.DateColumn("Data", format="DD/MM/YYYY", required=True),
+                    "tipo": st.column_config.SelectboxColumn("Tipo", options=["Despesa", "Receita"], required=True),
+                    "categoria_principal": "Classificação",
+                    "sub_categoria": "Categoria",
+                    "descricao": "Descrição",
+                    "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f", min_value=0.0, required=True),
+                    "forma_pagamento": "Pagamento",
+                    "excluir": st.column_config.CheckboxColumn("Excluir?")
+                }
+            )
+            
+            if st.button("💾 Salvar Alterações da Página"):
+                excluidos = editado.index[editado['excluir']].tolist()
+                alteracoes = {
+                    doc_id: argumentos for doc_id, argumentos in diferencas_edicao(grade, editado).items()
+                    if doc_id not in excluidos
+                }
+                if not alteracoes and not excluidos:
+                    st.info("Nenhuma alteração nesta página.")
                 else:
-                    opcoes_cat = lista_cat_despesa
-                    opcoes_princ = ["Pessoal", "Familiar"]
-                
-                # Garante que a categoria atual esteja na lista
-                if item_selecionado['sub_categoria'] not in opcoes_cat:
-                    opcoes_cat.append(item_selecionado['sub_categoria'])
-                
-                col_cat1, col_cat2 = st.columns(2)
-                
-                idx_princ = 0
-                if item_selecionado['categoria_principal'] in opcoes_princ:
-                    idx_princ = opcoes_princ.index(item_selecionado['categoria_principal'])
-                
-                nova_cat_principal = col_cat1.selectbox("Classificação", options=opcoes_princ, index=idx_princ)
-                
-                idx_sub = 0
-                if item_selecionado['sub_categoria'] in opcoes_cat:
-                    idx_sub = opcoes_cat.index(item_selecionado['sub_categoria'])
-                
-                nova_sub_cat_select = col_cat2.selectbox("Categoria Existente", options=opcoes_cat, index=idx_sub)
-                nova_sub_cat_text = st.text_input("Ou Nova Categoria (para renomear/criar):", placeholder="Digite para substituir a seleção acima")
+                    # Alterações e exclusões da página, com resumos e saldos, no mesmo commit
+                    gravado = obter_cache().gravar(db, 'editar_lote', alteracoes, excluidos)
+                    dados_alterados()
+                    avisar(f"{len(alteracoes)} alteração(ões) e {len(excluidos)} exclusão(ões) gravadas!" if gravado else "Alterações na fila local: serão enviadas quando a conexão voltar.")
+                    st.rerun()
+            
+            st.markdown("**Edição detalhada** (com sugestões de categoria):")
+            rotulos = (pagina['data'].dt.strftime('%d/%m/%Y').fillna('sem data') + " - " + pagina['descricao'].astype(str)
+                       + " (R$ " + pagina['valor'].map('{:.2f}'.format) + ")")
+            id_doc = st.selectbox("Selecione o lançamento para alterar:", pagina.index, format_func=rotulos.get)
+            item_selecionado = pagina.loc[id_doc]
+            
+            with st.expander("✏️ Editar Detalhes", expanded=True):
+                with st.form("form_edicao"):
+                    # Campos preenchidos com os valores atuais
+                    novo_tipo = st.radio("Tipo", ["Despesa", "Receita"], index=0 if item_selecionado['tipo'] == "Despesa" else 1, horizontal=True)
+                    
+                    # --- Lógica de Categorias para Edição ---
+                    lista_cat_receita = ["Salário", "Vale Alimentação", "Vale Refeição", "Auxílio", "Empréstimo Recebido", "Outros"]
+                    lista_cat_despesa = ["Conta de Luz", "Conta de Celular", "Condomínio", "Internet", "Lazer", "Viagens", "Mercado", "Almoço/Jantar", "Outros"]
+                    
+                    vocabulario = obter_vocabulario()
+                    lista_cat_receita = com_padrao(vocabulario['categorias'].get('Receita', []), lista_cat_receita)
+                    lista_cat_despesa = com_padrao(vocabulario['categorias'].get('Despesa', []), lista_cat_despesa)
+
+                    # Define opções com base no tipo ORIGINAL
+                    if item_selecionado['tipo'] == "Receita":
+                        opcoes_cat = lista_cat_receita
+                        opcoes_princ = ["Renda"]
+                    else:
+                        opcoes_cat = lista_cat_despesa
+                        opcoes_princ = ["Pessoal", "Familiar"]
+                    
+                    # Garante que a categoria atual esteja na lista
+                    if item_selecionado['sub_categoria'] not in opcoes_cat:
+                        opcoes_cat.append(item_selecionado['sub_categoria'])
+                    
+                    col_cat1, col_cat2 = st.columns(2)
+                    
+                    idx_princ = 0
+                    if item_selecionado['categoria_principal'] in opcoes_princ:
+                        idx_princ = opcoes_princ.index(item_selecionado['categoria_principal'])
+                    
+                    nova_cat_principal = col_cat1.selectbox("Classificação", options=opcoes_princ, index=idx_princ)
+                    
+                    idx_sub = 0
+                    if item_selecionado['sub_categoria'] in opcoes_cat:
+                        idx_sub = opcoes_cat.index(item_selecionado['sub_categoria'])
+                    
+                    nova_sub_cat_select = col_cat2.selectbox("Categoria Existente", options=opcoes_cat, index=idx_sub)
+                    nova_sub_cat_text = st.text_input("Ou Nova Categoria (para renomear/criar):", placeholder="Digite para substituir a seleção acima")
 
-                nova_data = st.date_input("Data", item_selecionado['data'], format="DD/MM/YYYY")
-                novo_valor = st.number_input("Valor", value=float(item_selecionado['valor']), format="%.2f")
-                nova_desc = st.text_input("Descrição", value=item_selecionado['descricao'])
-                
-                # Botões de ação
-                col_salvar, col_excluir = st.columns(2)
-                
-                if col_salvar.form_submit_button("💾 Salvar Alterações"):
-                    # Define categoria final (se digitou nova, usa a nova)
-                    cat_final = nova_sub_cat_text.strip() if nova_sub_cat_text.strip() else nova_sub_cat_select
+                    nova_data = st.date_input("Data", item_selecionado['data'] if pd.notna(item_selecionado['data']) else datetime.now(), format="DD/MM/YYYY")
+                    novo_valor = st.number_input("Valor", value=float(item_selecionado['valor']), format="%.2f")
+                    nova_desc = st.text_input("Descrição", value=item_selecionado['descricao'])
                     
-                    atualizar_transacao(
-                        id_doc, 
-                        nova_data.strftime('%Y-%m-%d'), 
-                        novo_tipo, 
-                        nova_cat_principal, 
-                        cat_final, 
-                        nova_desc, 
-                        novo_valor, 
-                        item_selecionado['forma_pagamento']
-                    )
-                    st.success("Atualizado com sucesso!")
-                    time.sleep(1)
-                    st.rerun()
-                
-                if col_excluir.form_submit_button("🗑️ Excluir Lançamento", type="primary"):
-                    excluir_transacao(id_doc)
-                    st.warning("Lançamento excluído.")
-                    time.sleep(1)
-                    st.rerun()
+                    # Botões de ação
+                    col_salvar, col_excluir = st.columns(2)
+                    
+                    if col_salvar.form_submit_button("💾 Salvar Alterações"):
+                        # Define categoria final (se digitou nova, usa a nova)
+                        cat_final = nova_sub_cat_text.strip() if nova_sub_cat_text.strip() else nova_sub_cat_select
+                        
+                        gravado = obter_cache().gravar(
+                            db,
+                            'atualizar',
+                            id_doc, 
+                            nova_data.strftime('%Y-%m-%d'), 
+                            novo_tipo, 
+                            nova_cat_principal, 
+                            cat_final, 
+                            nova_desc, 
+                            novo_valor, 
+                            item_selecionado['forma_pagamento']
+                        )
+                        dados_alterados()
+                        avisar("Atualizado com sucesso!" if gravado else "Alteração na fila local: será enviada quando a conexão voltar.")
+                        st.rerun()
+                    
+                    if col_excluir.form_submit_button("🗑️ Excluir Lançamento", type="primary"):
+                        gravado = obter_cache().gravar(db, 'excluir', id_doc)
+                        dados_alterados()
+                        avisar("Lançamento excluído." if gravado else "Exclusão na fila local: será enviada quando a conexão voltar.", "🗑️")
+                        st.rerun()
+        
+        st.markdown("---")
+        st.subheader("Manutenção")
+        st.caption("Os gráficos e os saldos de VR/VA do Dashboard usam totais atualizados a cada gravação. Se parecerem errados, recalcule a partir das transações.")
+        if st.button("🔄 Verificar e Reconstruir Resumos e Saldos"):
+            df_completo = ler_todas_transacoes(db)
+            divergencias = reconstruir_resumos(db, df_completo)
+            divergencias_saldo = reconstruir_saldos(db, df_completo)
+            preenchidas = preencher_impressoes(db, df_completo)
+            reconstruir_vocabulario(db, df_completo)
+            dados_alterados(recarregar=True)
+            # O relatório é mostrado depois do rerun, que leva os totais refeitos às outras abas
+            st.session_state['relatorio_manutencao'] = (divergencias, divergencias_saldo, preenchidas)
+            st.rerun()
+        relatorio = st.session_state.pop('relatorio_manutencao', None)
+        if relatorio is not None:
+            divergencias, divergencias_saldo, preenchidas = relatorio
+            if divergencias.empty:
+                st.success("Resumos conferidos: nenhuma divergência com as transações.")
+            else:
+                st.warning(f"{len(divergencias)} total(is) divergente(s) corrigido(s):")
+                st.dataframe(divergencias, hide_index=True)
+            for conta, (gravado, recalculado) in divergencias_saldo.items():
+                st.warning(f"Saldo de {CONTAS_SALDO[conta]} corrigido: R$ {gravado:,.2f} → R$ {recalculado:,.2f}")
+            if not divergencias_saldo:
+                st.success("Saldos de VR/VA conferidos: nenhuma divergência.")
+            if preenchidas:
+                st.info(f"{preenchidas} transação(ões) antiga(s) receberam a impressão usada para detectar duplicadas na importação.")
+        
+        st.markdown("---")
+        st.subheader("Backup")
+        st.caption("O backup lê as transações em páginas e grava o arquivo aos poucos. A restauração só é feita em um banco vazio (use \"Excluir TODAS\" antes) e, se for interrompida, pode ser retomada sem duplicar nada.")
+        col_exp, col_rest = st.columns(2)
+        with col_exp:
+            formatos_backup = {"Parquet (compactado)": 'parquet', "CSV": 'csv', "Excel": 'xlsx'}
+            formato_backup = formatos_backup[st.selectbox("Formato", list(formatos_backup), key="formato_backup")]
+            if st.button("📦 Gerar Backup"):
+                bar = st.progress(0.0)
+                # Gravado página a página em um arquivo temporário: só o caminho fica na sessão,
+                # e o conteúdo só é lido do disco (e o arquivo apagado) quando o download é pedido
+                anterior = st.session_state.pop('backup_gerado', None)
+                if anterior is not None and os.path.exists(anterior[1]):
+                    os.remove(anterior[1])
+                descritor, caminho_backup = tempfile.mkstemp(prefix="minhas_financas_", suffix=f".{formato_backup}")
+                os.close(descritor)
+                total = exportar(db, caminho_backup, formato_backup,
+                                 lambda feitas, total: bar.progress(feitas / total, text=f"{feitas} de {total} exportadas"))
+                nome_backup = f"minhas_financas_{datetime.now():%Y%m%d_%H%M}.{formato_backup}"
+                st.session_state['backup_gerado'] = (nome_backup, caminho_backup, total)
+            if 'backup_gerado' in st.session_state:
+                nome_backup, caminho_backup, total = st.session_state['backup_gerado']
+                if os.path.exists(caminho_backup):
+                    st.download_button(f"⬇️ Baixar {nome_backup} ({total} transações)", functools.partial(baixar_backup, caminho_backup),
+                                       file_name=nome_backup, on_click='ignore')
+        with col_rest:
+            arquivo_restauracao = st.file_uploader("Arquivo de backup", type=['parquet', 'csv', 'gz', 'xlsx'], key="arquivo_restauracao")
+            if arquivo_restauracao is not None:
+                # Ponto de retomada por arquivo: outra tentativa com o mesmo arquivo continua de onde parou
+                hash_backup = hash_upload(arquivo_restauracao)
+                pendente = st.session_state.get('restauracao_pendente')
+                retomada = pendente['retomada'] if pendente and pendente['hash'] == hash_backup else None
+                if retomada is not None:
+                    st.warning(f"A última restauração deste arquivo parou após {retomada['linhas']} linha(s). Os lotes gravados foram mantidos.")
+                if st.button("🔁 Retomar Restauração" if retomada is not None else "♻️ Restaurar Backup"):
+                    estado = {'hash': hash_backup, 'retomada': retomada}
+                    st.session_state['restauracao_pendente'] = estado
+                    andamento = st.empty()
+                    
+                    def ao_restaurar(ponto):
+                        estado['retomada'] = ponto
+                        andamento.caption(f"{ponto['linhas']} linha(s) restaurada(s)...")
+                    
+                    try:
+                        total = restaurar(db, arquivo_restauracao, formato_do_arquivo(arquivo_restauracao.name),
+                                          retomada=retomada, ao_progresso=ao_restaurar)
+                    except ValueError as e:
+                        st.session_state.pop('restauracao_pendente', None)
+                        st.error(str(e))
+                    except Exception as e:
+                        # Os lotes gravados aparecem nas outras abas; o aviso de retomada, no rerun
+                        dados_alterados(recarregar=True)
+                        avisar(f"Restauração interrompida: {e}", "⚠️")
+                        st.rerun()
+                    else:
+                        del st.session_state['restauracao_pendente']
+                        dados_alterados(recarregar=True)
+                        avisar(f"{total} transações restauradas do backup!")
+                        st.rerun()
         
         st.markdown("---")
         st.subheader("Zona de Perigo")
+        st.caption("As exclusões em massa são feitas em lotes. Se forem interrompidas, basta clicar de novo para continuar de onde pararam.")
+        
+        def barra_exclusao():
+            bar = st.progress(0.0)
+            return lambda excluidos, total: bar.progress(excluidos / total, text=f"{excluidos} de {total} excluídas")
+        
+        col_mes, col_imp = st.columns(2)
+        with col_mes:
+            meses_exclusao = [m for m in sorted(ler_resumos()['mes'].unique(), reverse=True) if m != 'sem-data']
+            mes_exclusao = st.selectbox("Mês", meses_exclusao, key="mes_exclusao")
+            if mes_exclusao and st.button("🗑️ Excluir Transações do Mês"):
+                total = excluir_mes(db, mes_exclusao, barra_exclusao())
+                dados_alterados(recarregar=True)
+                avisar(f"{total} transações de {mes_exclusao} excluídas.")
+                st.rerun()
+        with col_imp:
+            importacoes = {
+                f"{imp.get('arquivo', '?')} ({imp.get('quantidade', 0)} linhas)": imp['lote']
+                for imp in listar_importacoes(db)
+            }
+            importacao_exclusao = st.selectbox("Importação", list(importacoes), key="importacao_exclusao")
+            if importacao_exclusao and st.button("🗑️ Desfazer Importação"):
+                total = excluir_importacao(db, importacoes[importacao_exclusao], barra_exclusao())
+                dados_alterados(recarregar=True)
+                avisar(f"{total} transações da importação excluídas.")
+                st.rerun()
+        
         if st.button("🗑️ Excluir TODAS as Transações (Limpar Banco)"):
-            excluir_tudo()
-            st.success("Todas as transações foram excluídas com sucesso!")
-            time.sleep(2)
+            excluir_tudo(db, barra_exclusao())
+            dados_alterados(recarregar=True)
+            avisar("Todas as transações foram excluídas com sucesso!")
             st.rerun()
     else:
         st.info("Sem dados para editar.")
 
-# --- ABA 4: IMPORTAÇÃO DE EXCEL ---
-with tab4:
+# --- ABA 5: IMPORTAÇÃO DE EXCEL ---
+@st.fragment
+@cronometrado
+def aba_importacao():
     st.header("Importar Extrato ou Fatura")
     st.markdown("Faça upload do arquivo Excel (.xlsx) do seu banco ou cartão.")
     
@@ -398,11 +829,14 @@ with tab4:
             st.info("Se o cabeçalho da tabela não estiver na primeira linha (comum em extratos bancários), aumente o número abaixo até que a pré-visualização mostre os nomes das colunas corretamente (ex: Data, Histórico, Valor).")
             pular_linhas = st.number_input("Pular linhas do início do arquivo:", min_value=0, value=0)
             
-            uploaded_file.seek(0) # Garante que lê do início do arquivo
-            df_import = pd.read_excel(uploaded_file, skiprows=pular_linhas)
+            conteudo = uploaded_file.getvalue()
+            hash_conteudo = hash_upload(uploaded_file)
+            
+            # Só as primeiras linhas, lidas em streaming: a prévia aparece sem esperar o arquivo todo
+            previa = aplicar_cabecalho(ler_planilha(hash_conteudo, conteudo, uploaded_file.name, pular_linhas + LINHAS_PREVIA), pular_linhas)
             
             st.write("Pré-visualização dos dados:")
-            st.dataframe(df_import.head())
+            st.dataframe(previa.head())
             
             st.subheader("2. Configuração da Importação")
             
@@ -416,107 +850,170 @@ with tab4:
             
             adicionar_data_desc = st.checkbox("Adicionar data original na descrição? (Útil para conferência)", value=False)
             
-            tipo_importacao = st.radio("O que você está importando?", ["Extrato Bancário (Misturado)", "Fatura Cartão de Crédito (Apenas Despesas)"])
+            tipo_importacao = st.radio("O que você está importando?", [TIPO_EXTRATO, TIPO_FATURA])
             
-            if tipo_importacao == "Fatura Cartão de Crédito (Apenas Despesas)":
-                padrao_tipo = "Despesa"
-                padrao_pagto = "Cartão de Crédito"
+            padrao_cat_princ = None
+            if tipo_importacao == TIPO_FATURA:
                 padrao_cat_princ = st.selectbox("Classificação Padrão para esta fatura", ["Pessoal", "Familiar"])
             
             st.markdown("### 3. Mapeie as colunas do seu Excel")
-            colunas_excel = df_import.columns.tolist()
+            colunas_excel = previa.columns.tolist()
             
             col_data = st.selectbox("Qual coluna é a DATA?", colunas_excel)
             col_desc = st.selectbox("Qual coluna é a DESCRIÇÃO?", colunas_excel)
             col_valor = st.selectbox("Qual coluna é o VALOR?", colunas_excel)
             
+            # Planilha completa, lida uma vez por arquivo; mudar as linhas puladas só refaz o cabeçalho
+            df_import = aplicar_cabecalho(ler_planilha(hash_conteudo, conteudo, uploaded_file.name), pular_linhas)
+            
+            # Normalização de datas e valores feita por coluna, de uma vez só
+            df_limpo, invalidas = normalizar_planilha(
+                hash_conteudo, pular_linhas, df_import, col_data, col_desc, col_valor, ano_extrato, mes_extrato,
+                data_vencimento if usar_data_vencimento else None, adicionar_data_desc
+            )
+            
+            if invalidas.any():
+                st.warning(f"{int(invalidas.sum())} linha(s) com data ou valor ilegível serão ignoradas. Confira o mapeamento das colunas ou corrija a planilha:")
+                st.dataframe(df_import.loc[df_limpo.index[invalidas]])
+            
+            df_final = classificar_lancamentos(df_limpo[~invalidas], tipo_importacao, padrao_cat_princ)
+            
+            st.subheader("4. Categorias")
+            with st.expander("⚙️ Regras de categorização"):
+                st.caption("Descrições que contêm o padrão recebem a categoria da regra, antes do que foi aprendido do histórico. Campos vazios mantêm o valor da importação.")
+                regras = pd.DataFrame(ler_regras(), columns=['padrao', 'sub_categoria', 'categoria_principal', 'forma_pagamento'])
+                regras_editadas = st.data_editor(
+                    regras,
+                    key="editor_regras",
+                    num_rows="dynamic",
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "padrao": "Descrição contém",
+                        "sub_categoria": "Categoria",
+                        "categoria_principal": "Classificação",
+                        "forma_pagamento": "Pagamento"
+                    }
+                )
+                if st.button("💾 Salvar Regras"):
+                    salvar_regras(db, regras_editadas.dropna(subset=['padrao', 'sub_categoria']).fillna('').to_dict('records'))
+                    ler_regras.clear()
+                    avisar("Regras de categorização salvas!")
+                    st.rerun()
+            
+            origem = pd.Series(None, index=df_final.index, dtype=object)
+            if st.checkbox("🧠 Sugerir categorias a partir do histórico e das regras", value=True) and not df_final.empty:
+                # Índice montado uma vez por versão dos dados: classificar o arquivo é só consulta
+                df_final, origem = categorizar(df_final, obter_categorizador(), manter_pagamento=tipo_importacao == TIPO_FATURA)
+                por_origem = ", ".join(f"{qtd} por {nome}" for nome, qtd in origem.value_counts().items())
+                st.caption(f"{int(origem.notna().sum())} de {len(df_final)} linha(s) categorizadas automaticamente" + (f" ({por_origem})." if por_origem else "."))
+            
+            # Prévia editável: o que for corrigido aqui é o que será gravado
+            st.write("Confira (e corrija, se preciso) as categorias antes de salvar:")
+            chave_previa = hashlib.sha1(pd.util.hash_pandas_object(df_final).values.tobytes()).hexdigest()[:16]
+            df_final = st.data_editor(
+                df_final.assign(origem=origem.fillna("—")),
+                key=f"previa_categorias_{chave_previa}",
+                hide_index=True,
+                use_container_width=True,
+                disabled=['data', 'tipo', 'descricao', 'valor', 'origem'],
+                column_config={
+                    "data": "Data",
+                    "tipo": "Tipo",
+                    "categoria_principal": "Classificação",
+                    "sub_categoria": "Categoria",
+                    "descricao": "Descrição",
+                    "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+                    "forma_pagamento": "Pagamento",
+                    "origem": "Sugestão"
+                }
+            ).drop(columns='origem')
+            
+            pular_duplicadas = st.checkbox("Ignorar lançamentos que já existem no banco (recomendado ao reimportar extratos)", value=True)
+            
             if st.button("Processar e Salvar Importação"):
-                count = 0
-                bar = st.progress(0)
+                registros = numerar_ocorrencias([montar_registro(*linha) for linha in df_final.itertuples(index=False)])
                 
-                for index, row in df_import.iterrows():
-                    data_raw = row[col_data]
-                    desc_raw = row[col_desc]
-                    valor_raw = row[col_valor]
-                    
-                    # Tratamento de Valor (Correção para erro de 'str')
-                    try:
-                        if isinstance(valor_raw, str):
-                            # Remove R$, $, espaços
-                            valor_limpo = valor_raw.replace('R$', '').replace('$', '').replace(' ', '')
-                            # Ajusta vírgula decimal (Brasil: 1.000,00 -> 1000.00)
-                            if ',' in valor_limpo and '.' in valor_limpo:
-                                valor_limpo = valor_limpo.replace('.', '').replace(',', '.')
-                            elif ',' in valor_limpo:
-                                valor_limpo = valor_limpo.replace(',', '.')
-                            valor_raw = float(valor_limpo)
-                        else:
-                            valor_raw = float(valor_raw)
-                    except ValueError:
-                        valor_raw = 0.0
-
-                    # Tratamento de Data
-                    data_final_str = None
-                    
-                    if usar_data_vencimento:
-                        # Se o usuário escolheu forçar a data, usamos a data escolhida
-                        data_obj = pd.to_datetime(data_vencimento)
-                        data_final_str = data_obj.strftime('%Y-%m-%d')
-                    else:
-                        try:
-                            # Lógica para datas curtas (ex: 01/01) do Bradesco
-                            if isinstance(data_raw, str):
-                                data_limpa = data_raw.strip()
-                                if '/' in data_limpa and len(data_limpa) <= 5 and data_limpa.count('/') == 1:
-                                    # Separa dia e mês para análise inteligente
-                                    dia_str, mes_str = data_limpa.split('/')
-                                    dia = int(dia_str)
-                                    mes = int(mes_str)
-                                    
-                                    # Lógica de Virada de Ano:
-                                    # Se a transação é do mês 12 e o extrato é do mês 1 -> Ano Anterior
-                                    ano_considerado = ano_extrato
-                                    if mes > mes_extrato + 6: # Ex: Mes 12 vs Mes 1 (Diferença grande)
-                                        ano_considerado = ano_extrato - 1
-                                    
-                                    data_raw = f"{dia:02d}/{mes:02d}/{ano_considerado}"
-
-                            data_obj = pd.to_datetime(data_raw, dayfirst=True, errors='coerce')
-                            if pd.isnull(data_obj):
-                                data_obj = datetime.now()
-                        except:
-                            data_obj = datetime.now()
-                        
-                        data_final_str = data_obj.strftime('%Y-%m-%d')
-                    
-                    if adicionar_data_desc:
-                        desc_raw = f"{desc_raw} (Ref: {row[col_data]})"
-
-                    if tipo_importacao == "Extrato Bancário (Misturado)":
-                        if valor_raw < 0:
-                            tipo_final = "Despesa"
-                            valor_final = abs(valor_raw)
-                            pagto_final = "Débito/PIX"
-                        else:
-                            tipo_final = "Receita"
-                            valor_final = valor_raw
-                            pagto_final = "Depósito"
-                        cat_princ_final = "Pessoal"
-                        sub_cat_final = "Outros"
-                    else:
-                        tipo_final = padrao_tipo
-                        valor_final = abs(valor_raw)
-                        pagto_final = padrao_pagto
-                        cat_princ_final = padrao_cat_princ
-                        sub_cat_final = "Fatura Cartão"
-                    
-                    adicionar_transacao(data_final_str, tipo_final, cat_princ_final, sub_cat_final, desc_raw, valor_final, pagto_final)
-                    count += 1
-                    bar.progress((index + 1) / len(df_import))
+                duplicadas = 0
+                if pular_duplicadas:
+                    # Poucas consultas pelas impressões do arquivo, sem baixar o histórico
+                    existentes = impressoes_existentes(db, [registro['impressao'] for registro in registros])
+                    duplicadas = sum(registro['impressao'] in existentes for registro in registros)
+                    registros = [registro for registro in registros if registro['impressao'] not in existentes]
                 
-                st.success(f"{count} transações importadas com sucesso!")
-                time.sleep(2)
-                st.rerun()
+                # Marca as linhas com o lote, para poder desfazer a importação depois
+                lote = uuid.uuid4().hex
+                for registro in registros:
+                    registro['lote_importacao'] = lote
                 
+                # IDs fixados antes do envio: se cair no meio, a retomada não duplica linhas
+                st.session_state['importacao_pendente'] = {
+                    'lote': lote,
+                    'arquivo': uploaded_file.name,
+                    'registros': registros,
+                    'ids': gerar_ids(db, len(registros)),
+                    'lotes_gravados': 0,
+                    'duplicadas': duplicadas,
+                    'erro': None
+                }
+            
         except Exception as e:
-            st.error(f"Erro ao ler o arquivo: {e}")
\ No newline at end of file
+            st.error(f"Erro ao ler o arquivo: {e}")
+    
+    # Fora do bloco do arquivo: uma importação interrompida continua retomável (ou descartável)
+    # mesmo depois de o arquivo sair do upload
+    pendente = st.session_state.get('importacao_pendente')
+    if pendente is not None:
+        enviar = True
+        if pendente['erro'] is not None:
+            st.warning(f"A importação de {pendente['arquivo']} parou após {pendente['lotes_gravados']} lote(s): {pendente['erro']}. Os lotes gravados foram mantidos e a retomada não duplica linhas.")
+            col_retomar, col_descartar = st.columns(2)
+            enviar = col_retomar.button("🔁 Retomar Importação")
+            if col_descartar.button("🗑️ Descartar Importação", help="Exclui as linhas que essa importação já gravou"):
+                total = excluir_importacao(db, pendente['lote'])
+                del st.session_state['importacao_pendente']
+                dados_alterados(recarregar=True)
+                avisar(f"Importação de {pendente['arquivo']} descartada: {total} transação(ões) já gravada(s) excluída(s).")
+                st.rerun()
+        
+        if enviar:
+            bar = st.progress(0.0)
+            
+            def ao_progresso(lotes_gravados, total_lotes):
+                pendente['lotes_gravados'] = lotes_gravados
+                bar.progress(lotes_gravados / total_lotes, text=f"Lote {lotes_gravados} de {total_lotes} gravado")
+            
+            try:
+                if pendente['registros']: # Arquivo só com duplicadas não deixa importação vazia na lista
+                    registrar_importacao(db, pendente['lote'], pendente['arquivo'], len(pendente['registros']))
+                salvar_em_lotes(db, pendente['registros'], pendente['ids'], ao_progresso, inicio_lote=pendente['lotes_gravados'])
+            except Exception as e:
+                pendente['erro'] = str(e)
+                dados_alterados(recarregar=True) # Lotes já gravados aparecem pela sincronização
+                st.rerun() # Mostra o aviso e o botão de retomada
+            else:
+                del st.session_state['importacao_pendente']
+                obter_cache().incluir(pendente['registros'], pendente['ids'])
+                dados_alterados()
+                avisar(f"{len(pendente['registros'])} transações importadas com sucesso!")
+                if pendente['duplicadas']:
+                    avisar(f"{pendente['duplicadas']} lançamento(s) já existiam no banco e foram ignorados.", "ℹ️")
+                st.rerun()
+
+with tab1:
+    aba_dashboard()
+with tab2:
+    aba_tendencias()
+with tab3:
+    aba_lancamento()
+with tab4:
+    aba_edicao()
+with tab5:
+    aba_importacao()
+
+if obter_cache().offline:
+    aviso_conexao.warning("Sem conexão com o Firestore: mostrando a cópia local. Gravações ficam na fila e são enviadas quando a conexão voltar.")
+
+instrumentacao.finalizar(execucao)
+if execucao is not None:
+    painel_desempenho(execucao)
\ No newline at end of file
@@ -0,0 +1,367 @@
+"""Backup das transações em Parquet, CSV ou Excel, e restauração a partir dele.
+
+A exportação percorre a coleção em páginas ordenadas pelo ID e grava cada página no arquivo
+assim que ela chega: a memória usada é a de uma página, não a do histórico. Cada linha leva
+também o arquivo e a data da importação que a gravou, para a restauração refazer o histórico
+de importações (coleção 'importacoes'). A restauração
+lê o arquivo também em páginas e grava pelo salvar_em_lotes da importação, guardando um ponto
+de retomada a cada lote; resumos, saldos e vocabulário são somados em memória (poucas linhas por
+mês) e gravados uma vez no fim, em vez de um incremento por lote.
+
+Uso sem o app:
+    python backup.py exportar transacoes.parquet
+    python backup.py restaurar transacoes.parquet --retomada restauracao.json
+(credenciais em firestore_key.json, como no app; --credenciais e --emulador mudam isso)
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+import firebase_admin
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+import instrumentacao
+from dados import (COLECAO_TRANSACOES, calcular_resumos, existem_transacoes, gravar_agregados,
+                   listar_importacoes, montar_registro, registrar_importacao, salvar_em_lotes,
+                   somar_resumos)
+
+# Documentos por página lida do Firestore (exportação) ou do arquivo (restauração)
+TAMANHO_PAGINA_BACKUP = 2000
+
+COLUNAS_TEXTO = ['id', 'data', 'tipo', 'categoria_principal', 'sub_categoria', 'descricao',
+                 'forma_pagamento', 'impressao', 'lote_importacao', 'arquivo_importacao']
+COLUNAS_DATA_HORA = ['criado_em', 'atualizado_em', 'importado_em']
+COLUNAS_BACKUP = COLUNAS_TEXTO[:6] + ['valor'] + COLUNAS_TEXTO[6:] + COLUNAS_DATA_HORA
+
+# Mesmo esquema em todas as páginas (e em todos os backups), mesmo com campos ausentes
+ESQUEMA_PARQUET = pa.schema(
+    [(coluna, pa.float64() if coluna == 'valor' else
+      pa.timestamp('us', tz='UTC') if coluna in COLUNAS_DATA_HORA else pa.string())
+     for coluna in COLUNAS_BACKUP]
+)
+
+FORMATOS = {'.parquet': 'parquet', '.csv.gz': 'csv.gz', '.csv': 'csv', '.xlsx': 'xlsx'}
+
+# Limite de linhas de uma aba do Excel (menos o cabeçalho): o backup continua em outra aba
+LINHAS_ABA_EXCEL = 1_048_575
+
+
+def formato_do_arquivo(nome):
+    """'parquet', 'csv', 'csv.gz' ou 'xlsx', pela extensão do nome do arquivo."""
+    for extensao, formato in FORMATOS.items():
+        if nome.lower().endswith(extensao):
+            return formato
+    raise ValueError(f"Formato de backup não reconhecido: {nome} (use {', '.join(FORMATOS)})")
+
+def normalizar_pagina(df):
+    """Frame com as COLUNAS_BACKUP e tipos fixos: textos (ou nulo), valor float e datas/horas em UTC."""
+    df = df.reindex(columns=COLUNAS_BACKUP)
+    colunas = {}
+    for coluna in COLUNAS_TEXTO:
+        serie = df[coluna].astype(object)
+        colunas[coluna] = serie.where(serie.isna(), serie.astype(str))
+    colunas['valor'] = pd.to_numeric(df['valor'], errors='coerce').astype(float)
+    for coluna in COLUNAS_DATA_HORA:
+        colunas[coluna] = pd.to_datetime(df[coluna], utc=True, errors='coerce')
+    return pd.DataFrame(colunas, columns=COLUNAS_BACKUP).reset_index(drop=True)
+
+
+# --- Exportação ---
+
+def paginas_transacoes(db, tamanho_pagina=TAMANHO_PAGINA_BACKUP):
+    """Gera a coleção de transações em frames de até `tamanho_pagina` linhas (normalizar_pagina).
+
+    Paginação por cursor (ordem do ID e start_after no último documento): cada consulta lê só a
+    sua página. Documentos gravados durante a exportação podem entrar ou não, conforme o ID.
+    As linhas importadas recebem 'arquivo_importacao' e 'importado_em' do registro da importação.
+    """
+    importacoes = {importacao['lote']: importacao for importacao in listar_importacoes(db)}
+    consulta = db.collection(COLECAO_TRANSACOES).order_by(FieldPath.document_id()).limit(tamanho_pagina)
+    ultimo = None
+    while True:
+        pagina = consulta.start_after(ultimo) if ultimo is not None else consulta
+        docs = list(instrumentacao.contados(pagina.stream()))
+        if not docs:
+            return
+        linhas = []
+        for doc in docs:
+            linha = {**doc.to_dict(), 'id': doc.id}
+            importacao = importacoes.get(linha.get('lote_importacao'), {})
+            linha.update(arquivo_importacao=importacao.get('arquivo'), importado_em=importacao.get('importado_em'))
+            linhas.append(linha)
+        yield normalizar_pagina(pd.DataFrame(linhas))
+        if len(docs) < tamanho_pagina:
+            return
+        ultimo = docs[-1]
+
+
+class _EscritorParquet:
+    # Um row group por página, compactado com zstd
+    def __init__(self, destino, metadados):
+        esquema = ESQUEMA_PARQUET.with_metadata({'minhas_financas': json.dumps(metadados)})
+        self._escritor = pq.ParquetWriter(destino, esquema, compression='zstd')
+
+    def escrever(self, pagina):
+        tabela = pa.Table.from_pandas(pagina, schema=self._escritor.schema, preserve_index=False, safe=False)
+        self._escritor.write_table(tabela)
+
+    def fechar(self):
+        self._escritor.close()
+
+
+class _EscritorCsv:
+    def __init__(self, destino, metadados, compactar=False):
+        self._proprio = isinstance(destino, (str, os.PathLike))
+        if self._proprio:
+            self._arquivo = (gzip.open if compactar else open)(destino, 'wt', encoding='utf-8', newline='')
+        else:
+            binario = gzip.GzipFile(fileobj=destino, mode='wb') if compactar else destino
+            self._arquivo = io.TextIOWrapper(binario, encoding='utf-8', newline='')
+        self._cabecalho = True
+
+    def escrever(self, pagina):
+        pagina.to_csv(self._arquivo, header=self._cabecalho, index=False)
+        self._cabecalho = False
+
+    def fechar(self):
+        if self._cabecalho: # Backup vazio: ainda assim com o cabeçalho
+            self._arquivo.write(','.join(COLUNAS_BACKUP) + '\n')
+        if self._proprio:
+            self._arquivo.close()
+            return
+        self._arquivo.flush()
+        binario = self._arquivo.detach() # Não fecha o arquivo de quem chamou
+        if isinstance(binario, gzip.GzipFile):
+            binario.close()
+
+
+class _EscritorExcel:
+    # Modo write_only do openpyxl: as linhas vão para o disco conforme são escritas
+    def __init__(self, destino, metadados):
+        self._destino = destino
+        self._livro = openpyxl.Workbook(write_only=True)
+        self._aba = None
+        self._linhas_aba = LINHAS_ABA_EXCEL
+
+    def escrever(self, pagina):
+        # Datas/horas vão como texto ISO em UTC: a célula de data do Excel não tem fuso e
+        # arredonda para milissegundos
+        for coluna in COLUNAS_DATA_HORA:
+            pagina = pagina.assign(**{coluna: pagina[coluna].dt.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')})
+        pagina = pagina.astype(object).where(pagina.notna(), None)
+        for linha in pagina.itertuples(index=False):
+            if self._linhas_aba == LINHAS_ABA_EXCEL:
+                self._aba = self._livro.create_sheet(f"Transações {len(self._livro.worksheets) + 1}")
+                self._aba.append(COLUNAS_BACKUP)
+                self._linhas_aba = 0
+            self._aba.append(list(linha))
+            self._linhas_aba += 1
+
+    def fechar(self):
+        if self._aba is None:
+            self._livro.create_sheet("Transações 1").append(COLUNAS_BACKUP)
+        self._livro.save(self._destino)
+
+
+ESCRITORES = {
+    'parquet': _EscritorParquet,
+    'csv': _EscritorCsv,
+    'csv.gz': lambda destino, metadados: _EscritorCsv(destino, metadados, compactar=True),
+    'xlsx': _EscritorExcel
+}
+
+def exportar(db, destino, formato=None, ao_progresso=None, tamanho_pagina=TAMANHO_PAGINA_BACKUP):
+    """Grava todas as transações em `destino` (caminho ou arquivo binário aberto). Retorna o total de linhas.
+
+    `formato` ('parquet', 'csv', 'csv.gz' ou 'xlsx') sai da extensão quando `destino` é um
+    caminho. `ao_progresso(exportadas, total)` é chamado após cada página.
+    """
+    formato = formato or formato_do_arquivo(os.fspath(destino))
+    total = db.collection(COLECAO_TRANSACOES).count().get()[0][0].value
+    instrumentacao.contar_leituras(1)
+
+    metadados = {'exportado_em': datetime.now(timezone.utc).isoformat(), 'transacoes': total}
+    escritor = ESCRITORES[formato](destino, metadados)
+    exportadas = 0
+    try:
+        for pagina in paginas_transacoes(db, tamanho_pagina):
+            escritor.escrever(pagina)
+            exportadas += len(pagina)
+            if ao_progresso:
+                ao_progresso(exportadas, max(total, exportadas))
+    finally:
+        escritor.fechar()
+    return exportadas
+
+
+# --- Restauração ---
+
+def _paginas_parquet(origem, tamanho_pagina):
+    arquivo = pq.ParquetFile(origem)
+    for lote in arquivo.iter_batches(batch_size=tamanho_pagina):
+        yield lote.to_pandas()
+
+def _paginas_csv(origem, tamanho_pagina, compactado=False):
+    compressao = 'gzip' if compactado else None
+    tipos = {coluna: str for coluna in COLUNAS_TEXTO}
+    with pd.read_csv(origem, chunksize=tamanho_pagina, dtype=tipos, compression=compressao) as leitor:
+        yield from leitor
+
+def _paginas_excel(origem, tamanho_pagina):
+    livro = openpyxl.load_workbook(origem, read_only=True, data_only=True)
+    try:
+        for aba in livro.worksheets:
+            linhas = aba.iter_rows(values_only=True)
+            cabecalho = next(linhas, None) or ()
+            pagina = []
+            for linha in linhas:
+                # Planilha sem dimensão gravada (modo write_only): o openpyxl corta as células vazias do fim
+                pagina.append(linha + (None,) * (len(cabecalho) - len(linha)))
+                if len(pagina) == tamanho_pagina:
+                    yield pd.DataFrame(pagina, columns=cabecalho)
+                    pagina = []
+            if pagina:
+                yield pd.DataFrame(pagina, columns=cabecalho)
+    finally:
+        livro.close()
+
+LEITORES = {
+    'parquet': _paginas_parquet,
+    'csv': _paginas_csv,
+    'csv.gz': lambda origem, tamanho_pagina: _paginas_csv(origem, tamanho_pagina, compactado=True),
+    'xlsx': _paginas_excel
+}
+
+def paginas_backup(origem, formato=None, tamanho_pagina=TAMANHO_PAGINA_BACKUP):
+    """Lê um backup (caminho ou arquivo binário aberto) em frames de normalizar_pagina."""
+    formato = formato or formato_do_arquivo(os.fspath(origem))
+    for pagina in LEITORES[formato](origem, tamanho_pagina):
+        yield normalizar_pagina(pagina)
+
+def _registros(pagina):
+    """(registros, ids) da página para salvar_em_lotes, mantendo impressão, lote e criação originais."""
+    if pagina['id'].isna().any():
+        raise ValueError("Linha do backup sem 'id': o arquivo não veio da exportação do app.")
+    registros = []
+    for linha in pagina.to_dict('records'):
+        registro = montar_registro(linha['data'], linha['tipo'], linha['categoria_principal'], linha['sub_categoria'],
+                                   linha['descricao'], linha['valor'], linha['forma_pagamento'])
+        if pd.notna(linha['impressao']):
+            registro['impressao'] = linha['impressao'] # Mantém o número da ocorrência
+        if pd.notna(linha['lote_importacao']):
+            registro['lote_importacao'] = linha['lote_importacao']
+        if pd.notna(linha['criado_em']):
+            registro['criado_em'] = linha['criado_em'].to_pydatetime()
+        registros.append(registro)
+    return registros, pagina['id'].tolist()
+
+def _somar_importacoes(importacoes, pagina):
+    # {lote: {'arquivo', 'importado_em', 'quantidade'}} das linhas importadas da página
+    importadas = pagina[pagina['lote_importacao'].notna() & pagina['arquivo_importacao'].notna()]
+    for lote, grupo in importadas.groupby('lote_importacao'):
+        importacao = importacoes.setdefault(lote, {'arquivo': grupo['arquivo_importacao'].iloc[0],
+                                                   'importado_em': grupo['importado_em'].min(), 'quantidade': 0})
+        importacao['quantidade'] += len(grupo)
+
+def restaurar(db, origem, formato=None, retomada=None, ao_progresso=None, tamanho_pagina=TAMANHO_PAGINA_BACKUP):
+    """Grava no banco as transações de um backup, com os mesmos IDs. Retorna o total de linhas gravadas.
+
+    Pensada para um banco vazio (novo projeto ou depois de excluir_tudo): os resumos, saldos e
+    vocabulário são regravados no fim só com os totais do backup, então sem `retomada` o banco
+    precisa estar vazio. Até o fim da restauração, o dashboard ainda não tem esses totais.
+    `ao_progresso(retomada)` recebe, após cada commit, o ponto de retomada ({'linhas', 'lotes',
+    'tamanho_pagina'}) a guardar; passá-lo de volta em `retomada` continua de onde parou sem
+    regravar nada (ver salvar_em_lotes). As páginas já gravadas ainda são lidas do arquivo, para
+    entrar nos totais. O histórico de importações também é regravado no fim (backups anteriores
+    à coluna 'arquivo_importacao' não o trazem).
+    """
+    formato = formato or formato_do_arquivo(os.fspath(origem))
+    if retomada is None:
+        if existem_transacoes(db):
+            raise ValueError("O banco já tem transações: exclua tudo antes de restaurar um backup.")
+        retomada = {'linhas': 0, 'lotes': 0, 'tamanho_pagina': tamanho_pagina}
+    retomada = dict(retomada)
+    # As páginas precisam ter os mesmos limites da execução interrompida
+    tamanho_pagina = retomada['tamanho_pagina']
+
+    inicio_pagina = 0
+    resumo = calcular_resumos(pd.DataFrame())
+    importacoes = {}
+    for pagina in paginas_backup(origem, formato, tamanho_pagina):
+        fim_pagina = inicio_pagina + len(pagina)
+        registros, ids = _registros(pagina)
+        resumo = somar_resumos(resumo, calcular_resumos(pd.DataFrame(registros)))
+        _somar_importacoes(importacoes, pagina)
+        if fim_pagina <= retomada['linhas']:
+            inicio_pagina = fim_pagina
+            continue # Página gravada antes da interrupção
+
+        def _ao_lote(lotes_gravados, total_lotes):
+            concluida = lotes_gravados == total_lotes
+            retomada.update(linhas=fim_pagina if concluida else inicio_pagina, lotes=0 if concluida else lotes_gravados)
+            if ao_progresso:
+                ao_progresso(dict(retomada))
+
+        salvar_em_lotes(db, registros, ids, _ao_lote, inicio_lote=retomada['lotes'], com_movimentos=False)
+        inicio_pagina = fim_pagina
+
+    gravar_agregados(db, resumo)
+    for lote, importacao in importacoes.items():
+        importado_em = importacao['importado_em']
+        registrar_importacao(db, lote, importacao['arquivo'], importacao['quantidade'],
+                             importado_em.to_pydatetime() if pd.notna(importado_em) else None)
+    return retomada['linhas']
+
+
+# --- Linha de Comando ---
+
+def conectar(credenciais='firestore_key.json', emulador=None):
+    """Cliente do Firestore para uso fora do app: o emulador em host:porta ou a conta de serviço."""
+    if emulador:
+        os.environ['FIRESTORE_EMULATOR_HOST'] = emulador
+        return firestore.Client(project=os.environ.get('GCLOUD_PROJECT', 'demo-minhas-financas'))
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(credenciais))
+    return firestore.client()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backup e restauração das transações do Minhas Finanças.")
+    parser.add_argument('acao', choices=['exportar', 'restaurar'])
+    parser.add_argument('arquivo', help="arquivo .parquet, .csv, .csv.gz ou .xlsx")
+    parser.add_argument('--retomada', help="arquivo JSON do ponto de retomada da restauração (criado se não existir)")
+    parser.add_argument('--pagina', type=int, default=TAMANHO_PAGINA_BACKUP, help="documentos por página")
+    parser.add_argument('--credenciais', default='firestore_key.json')
+    parser.add_argument('--emulador', metavar='HOST:PORTA')
+    args = parser.parse_args()
+
+    db = conectar(args.credenciais, args.emulador)
+    if args.acao == 'exportar':
+        total = exportar(db, args.arquivo, ao_progresso=lambda feitas, total: print(f"\r{feitas}/{total}", end='', flush=True),
+                         tamanho_pagina=args.pagina)
+        print(f"\n{total} transações exportadas para {args.arquivo}")
+    else:
+        retomada = None
+        if args.retomada and os.path.exists(args.retomada):
+            with open(args.retomada, encoding='utf-8') as arquivo:
+                retomada = json.load(arquivo)
+            print(f"Retomando após {retomada['linhas']} linha(s) e {retomada['lotes']} lote(s)")
+
+        def guardar(ponto):
+            print(f"\r{ponto['linhas']} linha(s) restaurada(s)", end='', flush=True)
+            if args.retomada:
+                with open(args.retomada, 'w', encoding='utf-8') as arquivo:
+                    json.dump(ponto, arquivo)
+
+        total = restaurar(db, args.arquivo, retomada=retomada, ao_progresso=guardar, tamanho_pagina=args.pagina)
+        print(f"\n{total} transações restauradas de {args.arquivo}")
+        if args.retomada and os.path.exists(args.retomada):
+            os.remove(args.retomada) # Concluída: a próxima restauração começa do zero
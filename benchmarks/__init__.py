@@ -0,0 +1 @@
+"""Medições de desempenho do app, executadas fora do Streamlit (python -m benchmarks.<nome>)."""
@@ -0,0 +1,54 @@
+"""Exportação e restauração do backup (backup.py) em cada formato, sobre um histórico sintético.
+
+Para cada formato: exporta a coleção inteira para um arquivo temporário e restaura esse
+arquivo em um banco vazio, medindo tempo, leituras/escritas, pico de memória e tamanho do
+arquivo. O pico de memória deve acompanhar o tamanho da página, não o do histórico.
+
+Uso: python -m benchmarks.backup [linhas ...] [--formatos parquet csv.gz xlsx] [--pagina N] [--sem-memoria]
+     (padrão: 100000 linhas, todos os formatos)
+"""
+import argparse
+import os
+import tempfile
+
+import pandas as pd
+
+import backup
+import instrumentacao
+from benchmarks.suite import conectar, medir_etapa, popular
+
+
+def executar(linhas, formatos, tamanho_pagina, memoria=True):
+    origem = conectar()
+    popular(origem, linhas)
+    instrumentacao.ativar()
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for formato in formatos:
+            caminho = os.path.join(pasta, f"backup.{formato}")
+            exportadas, exportacao = medir_etapa(f"exportar.{formato}", lambda: backup.exportar(
+                origem, caminho, tamanho_pagina=tamanho_pagina), memoria)
+            destino = conectar()
+            restauradas, restauracao = medir_etapa(f"restaurar.{formato}", lambda: backup.restaurar(
+                destino, caminho, tamanho_pagina=tamanho_pagina), memoria)
+            if exportadas != linhas or restauradas != linhas:
+                raise AssertionError(f"{formato}: {exportadas} exportadas e {restauradas} restauradas de {linhas}")
+            tamanho = os.path.getsize(caminho) / 2**20
+            resultados += [{'linhas': linhas, **exportacao, 'MB arquivo': tamanho},
+                           {'linhas': linhas, **restauracao, 'MB arquivo': tamanho}]
+    instrumentacao.ativar(False)
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark do backup e da restauração.")
+    parser.add_argument('linhas', type=int, nargs='*', default=[100_000])
+    parser.add_argument('--formatos', nargs='+', default=['parquet', 'csv', 'csv.gz', 'xlsx'], choices=list(backup.ESCRITORES))
+    parser.add_argument('--pagina', type=int, default=backup.TAMANHO_PAGINA_BACKUP)
+    parser.add_argument('--sem-memoria', action='store_true')
+    args = parser.parse_args()
+
+    for linhas in args.linhas:
+        resultados = executar(linhas, args.formatos, args.pagina, memoria=not args.sem_memoria)
+        print(f"\n{linhas} transações (páginas de {args.pagina}):")
+        print(pd.DataFrame(resultados).drop(columns='linhas').set_index('etapa').round(1).to_string())
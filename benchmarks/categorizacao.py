@@ -0,0 +1,33 @@
+"""Tempo para montar o índice do categorizador e classificar um arquivo importado.
+
+Uso: python -m benchmarks.categorizacao [linhas_historico linhas_arquivo]   (padrão: 100000 5000)
+"""
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.gerador import documentos
+from categorizacao import Categorizador
+from dados import tipar_transacoes
+
+
+if __name__ == '__main__':
+    linhas_historico, linhas_arquivo = [int(arg) for arg in sys.argv[1:3]] or [100_000, 5_000]
+    historico = tipar_transacoes(pd.DataFrame(documentos(linhas_historico)))
+    # Arquivo com descrições do histórico acrescidas de ruído (datas, parcelas), como nos extratos
+    arquivo = historico.sample(linhas_arquivo, random_state=1)[['tipo', 'descricao']].reset_index(drop=True)
+    arquivo['descricao'] = arquivo['descricao'] + " 12/05 PARC 03/10"
+    regras = [{'padrao': 'uber trip', 'sub_categoria': 'Transporte', 'categoria_principal': 'Pessoal', 'forma_pagamento': ''}]
+
+    inicio = time.perf_counter()
+    categorizador = Categorizador(historico, regras)
+    montagem = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    propostas = categorizador.classificar(arquivo)
+    classificacao = (time.perf_counter() - inicio) * 1000
+
+    print(f"índice: {montagem:.1f} ms para {linhas_historico} transações no histórico")
+    print(f"classificação: {classificacao:.1f} ms para {linhas_arquivo} linhas")
+    print(propostas['origem'].value_counts(dropna=False).to_string())
@@ -0,0 +1,296 @@
+"""Cliente Firestore em memória, com o subconjunto da API que dados.py usa.
+
+Serve para rodar a camada de dados sem rede nem emulador: coleções são dicts {id: campos},
+lotes e transações acumulam as escritas e as aplicam de uma vez no commit, e os valores
+especiais do Firestore (SERVER_TIMESTAMP, Increment, set com merge) são resolvidos como no
+servidor. Consultas aceitam where (==, !=, <, <=, >, >=, in, not-in), select, order_by (por um
+campo ou pelo ID), start_after, limit, stream e count. Sem ordenação explícita os documentos
+saem na ordem de inserção, não na do ID.
+
+Não simula latência, índices nem contenção: para isso, rode a suíte contra o emulador
+(python -m benchmarks.suite --emulador localhost:8080).
+"""
+import heapq
+import threading
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from types import SimpleNamespace
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+import instrumentacao
+
+_OPERADORES = {
+    '==': lambda campo, valor: campo == valor,
+    '!=': lambda campo, valor: campo != valor,
+    '<': lambda campo, valor: campo < valor,
+    '<=': lambda campo, valor: campo <= valor,
+    '>': lambda campo, valor: campo > valor,
+    '>=': lambda campo, valor: campo >= valor,
+    'in': lambda campo, valor: campo in valor,
+    'not-in': lambda campo, valor: campo not in valor,
+}
+_AUSENTE = object()
+
+
+def _resolver(base, campos, agora, mesclar):
+    """Campos gravados sobre `base`, com timestamps do servidor e incrementos já calculados."""
+    resultado = dict(base)
+    for nome, valor in campos.items():
+        anterior = resultado.get(nome)
+        if valor is firestore.SERVER_TIMESTAMP:
+            resultado[nome] = agora
+        elif isinstance(valor, firestore.Increment):
+            numero = anterior if isinstance(anterior, (int, float)) and not isinstance(anterior, bool) else 0
+            resultado[nome] = numero + valor.value
+        elif isinstance(valor, dict):
+            # set com merge mescla os mapas aninhados; set sem merge e update os substituem
+            resultado[nome] = _resolver(anterior if mesclar and isinstance(anterior, dict) else {}, valor, agora, mesclar)
+        else:
+            resultado[nome] = valor
+    return resultado
+
+
+class DocumentoFalso:
+    """DocumentSnapshot: campos lidos (ou só os projetados) de um documento."""
+
+    def __init__(self, referencia, campos):
+        self.reference = referencia
+        self.id = referencia.id
+        self._campos = campos
+
+    @property
+    def exists(self):
+        return self._campos is not None
+
+    def to_dict(self):
+        return dict(self._campos) if self._campos is not None else None
+
+    def get(self, campo):
+        return (self._campos or {}).get(campo)
+
+
+class ReferenciaFalsa:
+    def __init__(self, cliente, colecao, doc_id):
+        self._cliente = cliente
+        self._colecao = colecao
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        return DocumentoFalso(self, self._cliente._ler(self._colecao, self.id))
+
+    def set(self, campos, merge=False):
+        lote = self._cliente.batch()
+        lote.set(self, campos, merge=merge)
+        lote.commit()
+
+    def update(self, campos):
+        lote = self._cliente.batch()
+        lote.update(self, campos)
+        lote.commit()
+
+    def delete(self):
+        lote = self._cliente.batch()
+        lote.delete(self)
+        lote.commit()
+
+
+class ConsultaFalsa:
+    def __init__(self, cliente, colecao, filtros=(), campos=None, ordem=None, limite=None, cursor=None):
+        self._cliente = cliente
+        self._colecao = colecao
+        self._filtros = tuple(filtros)
+        self._campos = campos
+        self._ordem = ordem
+        self._limite = limite
+        self._cursor = cursor
+
+    def _copia(self, **mudancas):
+        atual = {'filtros': self._filtros, 'campos': self._campos, 'ordem': self._ordem,
+                 'limite': self._limite, 'cursor': self._cursor}
+        return ConsultaFalsa(self._cliente, self._colecao, **{**atual, **mudancas})
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copia(filtros=self._filtros + ((field_path, _OPERADORES[op_string], value),))
+
+    def select(self, campos):
+        return self._copia(campos=[campo for campo in campos if campo != '__name__'])
+
+    def order_by(self, campo, direction=firestore.Query.ASCENDING):
+        return self._copia(ordem=(campo, direction == firestore.Query.DESCENDING))
+
+    def limit(self, quantidade):
+        return self._copia(limite=quantidade)
+
+    def start_after(self, documento):
+        # Só com order_by: continua depois do valor (ou ID) do documento no campo ordenado
+        campo, _ = self._ordem
+        return self._copia(cursor=documento.id if campo == '__name__' else documento.get(campo))
+
+    def _atende(self, campos):
+        for nome, operador, valor in self._filtros:
+            atual = campos.get(nome, _AUSENTE)
+            if atual is _AUSENTE:
+                return False
+            try:
+                if not operador(atual, valor):
+                    return False
+            except TypeError: # Tipos diferentes nunca se comparam no Firestore
+                return False
+        return True
+
+    def _resultado(self):
+        with self._cliente._trava:
+            documentos = self._cliente._colecoes.get(self._colecao, {})
+            pares = ((doc_id, campos) for doc_id, campos in documentos.items() if self._atende(campos))
+            if self._ordem is None:
+                return list(islice(pares, self._limite))
+
+            campo, decrescente = self._ordem
+            if campo == '__name__':
+                chave = lambda par: par[0]
+            else:
+                pares = (par for par in pares if campo in par[1])
+                chave = lambda par: par[1][campo]
+            if self._cursor is not None:
+                pares = (par for par in pares if (chave(par) < self._cursor if decrescente else chave(par) > self._cursor))
+            if self._limite is None:
+                return sorted(pares, key=chave, reverse=decrescente)
+            # Página de uma coleção grande: sem ordenar tudo a cada consulta
+            return (heapq.nlargest if decrescente else heapq.nsmallest)(self._limite, pares, key=chave)
+
+    def stream(self, transaction=None):
+        for doc_id, campos in self._resultado():
+            if self._campos is not None:
+                campos = {nome: campos[nome] for nome in self._campos if nome in campos}
+            yield DocumentoFalso(ReferenciaFalsa(self._cliente, self._colecao, doc_id), campos)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction))
+
+    def count(self):
+        consulta = self
+        return SimpleNamespace(get=lambda transaction=None: [[SimpleNamespace(alias='count', value=len(consulta._resultado()))]])
+
+
+class ColecaoFalsa(ConsultaFalsa):
+    def __init__(self, cliente, nome):
+        super().__init__(cliente, nome)
+        self.id = nome
+
+    def document(self, doc_id=None):
+        return ReferenciaFalsa(self._cliente, self._colecao, doc_id or uuid.uuid4().hex[:20])
+
+
+class EscritaFalsa:
+    """Escrita pendente. ByteSize imita o protobuf, para instrumentacao.contar_escritas."""
+
+    def __init__(self, operacao, referencia, campos=None, merge=False):
+        self.operacao = operacao
+        self.referencia = referencia
+        self.campos = campos
+        self.merge = merge
+
+    def ByteSize(self):
+        return instrumentacao.tamanho_documento(self.campos, self.referencia.id)
+
+
+class LoteFalso:
+    """WriteBatch: as escritas só valem no commit, todas juntas."""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._write_pbs = []
+
+    def set(self, referencia, campos, merge=False):
+        self._write_pbs.append(EscritaFalsa('set', referencia, campos, merge))
+
+    def update(self, referencia, campos):
+        self._write_pbs.append(EscritaFalsa('update', referencia, campos))
+
+    def delete(self, referencia):
+        self._write_pbs.append(EscritaFalsa('delete', referencia))
+
+    def commit(self):
+        self._cliente._aplicar(self._write_pbs)
+        self._write_pbs = []
+        return []
+
+
+class TransacaoFalsa(LoteFalso):
+    """Transaction, com os métodos que o decorador firestore.transactional chama.
+
+    Não há concorrência a detectar, então uma tentativa basta e o commit nunca é abortado.
+    """
+    _max_attempts = 1
+    _read_only = False
+
+    def __init__(self, cliente):
+        super().__init__(cliente)
+        self._id = None
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _clean_up(self):
+        self._write_pbs = []
+        self._id = None
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        resultado = self.commit()
+        self._clean_up()
+        return resultado
+
+
+class ClienteFalso:
+    """firestore.Client em memória. Seguro para as consultas paralelas de impressoes_existentes."""
+
+    def __init__(self):
+        self._colecoes = {}
+        self._trava = threading.RLock()
+
+    def collection(self, nome):
+        return ColecaoFalsa(self, nome)
+
+    def batch(self):
+        return LoteFalso(self)
+
+    def transaction(self, **opcoes):
+        return TransacaoFalsa(self)
+
+    def get_all(self, referencias, field_paths=None, transaction=None):
+        for referencia in referencias:
+            yield referencia.get(transaction=transaction)
+
+    def _ler(self, colecao, doc_id):
+        with self._trava:
+            return self._colecoes.get(colecao, {}).get(doc_id)
+
+    def _aplicar(self, escritas):
+        agora = datetime.now(timezone.utc)
+        with self._trava:
+            # Confere tudo antes de aplicar: o commit é atômico
+            for escrita in escritas:
+                if escrita.operacao == 'update' and self._ler(escrita.referencia._colecao, escrita.referencia.id) is None:
+                    raise NotFound(f"No document to update: {escrita.referencia._colecao}/{escrita.referencia.id}")
+            for escrita in escritas:
+                documentos = self._colecoes.setdefault(escrita.referencia._colecao, {})
+                doc_id = escrita.referencia.id
+                if escrita.operacao == 'delete':
+                    documentos.pop(doc_id, None)
+                elif escrita.operacao == 'update':
+                    documentos[doc_id] = _resolver(documentos[doc_id], escrita.campos, agora, mesclar=False)
+                else:
+                    base = documentos.get(doc_id, {}) if escrita.merge else {}
+                    documentos[doc_id] = _resolver(base, escrita.campos, agora, mesclar=escrita.merge)
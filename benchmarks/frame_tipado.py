@@ -0,0 +1,56 @@
+"""Memória e tempo de agregação do frame bruto (como vinha do Firestore) x frame tipado.
+
+Uso: python -m benchmarks.frame_tipado [linhas ...]   (padrão: 10000 100000 1000000)
+"""
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.gerador import FIM_HISTORICO, documentos
+from dados import tipar_transacoes
+
+
+def _medir(funcao, repeticoes=5):
+    # Melhor de N execuções, em milissegundos
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos)
+
+
+def agregar_bruto(df):
+    # O que o dashboard fazia a cada rerun: converte a data e deriva o mês do frame de objetos
+    data = pd.to_datetime(df['data'])
+    mes = data.dt.strftime('%Y-%m')
+    return df.assign(mes=mes).groupby(['mes', 'tipo', 'sub_categoria'])['valor'].sum()
+
+
+def agregar_tipado(df):
+    return df.groupby(['mes', 'tipo', 'sub_categoria'], observed=True)['centavos'].sum()
+
+
+def medir(linhas):
+    bruto = pd.DataFrame(documentos(linhas))
+    inicio = time.perf_counter()
+    tipado = tipar_transacoes(bruto)
+    construcao = (time.perf_counter() - inicio) * 1000
+    mes = FIM_HISTORICO.strftime('%Y-%m') # Último mês do histórico, presente em qualquer tamanho
+    return {
+        'linhas': linhas,
+        'MB bruto': bruto.memory_usage(deep=True).sum() / 2**20,
+        'MB tipado': tipado.memory_usage(deep=True).sum() / 2**20,
+        'ms tipar': construcao,
+        'ms agregação bruto': _medir(lambda: agregar_bruto(bruto)),
+        'ms agregação tipado': _medir(lambda: agregar_tipado(tipado)),
+        'ms filtro mês bruto': _medir(lambda: bruto[bruto['data'].astype(str).str[:7] == mes]),
+        'ms filtro mês tipado': _medir(lambda: tipado[tipado['mes'] == pd.Period(mes, freq='M')])
+    }
+
+
+if __name__ == '__main__':
+    tamanhos = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    resultados = pd.DataFrame([medir(linhas) for linhas in tamanhos]).set_index('linhas')
+    print(resultados.round(1).to_string())
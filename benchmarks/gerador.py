@@ -0,0 +1,156 @@
+"""Dados sintéticos para os benchmarks: históricos de transações e planilhas de banco/cartão.
+
+As distribuições imitam o uso real do app: ~200 lançamentos por mês, receitas fixas no início
+do mês (salário, VR, VA), despesas concentradas em poucas categorias, forma de pagamento que
+depende da categoria e valores log-normais em torno da mediana de cada categoria.
+Tudo sai de um gerador com semente: a mesma chamada devolve sempre os mesmos dados.
+"""
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+FIM_HISTORICO = pd.Timestamp('2025-12-31')
+LANCAMENTOS_POR_MES = 200
+# Período máximo do histórico: acima de LANCAMENTOS_POR_MES * MESES_MAXIMOS linhas cresce a densidade
+MESES_MAXIMOS = 60
+
+# Categoria: (peso, mediana em reais, {forma de pagamento: peso}, estabelecimentos)
+DESPESAS = {
+    "Mercado": (22, 180, {"Vale Alimentação": 40, "Cartão de Crédito": 40, "Débito/PIX": 20},
+                ["SUPERMERCADO PAO DE ACUCAR", "CARREFOUR", "ASSAI ATACADISTA", "HORTIFRUTI", "MERCADINHO SAO JOAO"]),
+    "Almoço/Jantar": (18, 45, {"Vale Refeição": 60, "Cartão de Crédito": 30, "PIX": 10},
+                      ["RESTAURANTE SABOR CASEIRO", "IFOOD", "PADARIA REAL", "BURGER KING", "RESTAURANTE KILO BOM"]),
+    "Transporte": (12, 25, {"Cartão de Crédito": 70, "PIX": 30},
+                   ["UBER TRIP", "99 POP", "POSTO IPIRANGA", "ESTAPAR", "METRO SP"]),
+    "Lazer": (8, 90, {"Cartão de Crédito": 80, "PIX": 20},
+              ["CINEMARK", "INGRESSO RAPIDO", "BAR DO ZE", "LIVRARIA CULTURA"]),
+    "Farmácia": (6, 60, {"Cartão de Crédito": 60, "Débito/PIX": 40},
+                 ["DROGASIL", "DROGA RAIA", "PAGUE MENOS"]),
+    "Assinaturas": (5, 40, {"Cartão de Crédito": 100},
+                    ["NETFLIX.COM", "SPOTIFY", "AMAZON PRIME", "GOOGLE STORAGE"]),
+    "Vestuário": (5, 150, {"Cartão de Crédito": 90, "PIX": 10},
+                  ["RENNER", "C&A", "ZARA", "CENTAURO"]),
+    "Conta de Luz": (2, 220, {"Boleto": 80, "PIX": 20}, ["ENEL DISTRIBUICAO"]),
+    "Internet": (2, 120, {"Boleto": 50, "Cartão de Crédito": 50}, ["VIVO FIBRA", "CLARO NET"]),
+    "Conta de Celular": (2, 60, {"Cartão de Crédito": 100}, ["TIM PRE", "VIVO MOVEL"]),
+    "Condomínio": (2, 900, {"Boleto": 100}, ["CONDOMINIO ED. AURORA"]),
+    "Viagens": (2, 1500, {"Cartão de Crédito": 100}, ["LATAM AIRLINES", "BOOKING.COM", "AIRBNB"]),
+    "Outros": (14, 80, {"Cartão de Crédito": 50, "PIX": 35, "Dinheiro": 15},
+               ["COMPRA", "PAGAMENTO", "TRANSFERENCIA", "LOJA"]),
+}
+
+# Categoria: (fração das receitas, mediana em reais, forma de recebimento, descrição)
+RECEITAS = {
+    "Salário": (0.35, 8000, "Depósito/Conta", "SALARIO EMPRESA LTDA"),
+    "Vale Refeição": (0.25, 900, "Vale Refeição", "CREDITO BENEFICIO VR"),
+    "Vale Alimentação": (0.25, 700, "Vale Alimentação", "CREDITO BENEFICIO VA"),
+    "Outros": (0.15, 300, "PIX", "PIX RECEBIDO"),
+}
+FRACAO_RECEITAS = 0.08
+
+
+def _sorteio(rng, opcoes, pesos, quantidade):
+    pesos = np.asarray(pesos, dtype=float)
+    return rng.choice(np.asarray(opcoes, dtype=object), size=quantidade, p=pesos / pesos.sum())
+
+def _valores(rng, medianas, dispersao=0.6):
+    return np.round(rng.lognormal(np.log(medianas), dispersao), 2)
+
+def historico(linhas, semente=42):
+    """Frame de transações (colunas de COLUNAS_TRANSACAO, sem impressão) ordenado por data.
+
+    O período cresce com o volume para manter ~LANCAMENTOS_POR_MES lançamentos por mês, até
+    MESES_MAXIMOS meses terminando em FIM_HISTORICO; daí em diante cresce a densidade
+    (1k linhas ~ 5 meses; 10k ~ 50 meses; 100k e 1M, 5 anos com ~1,7k e ~17k por mês).
+    """
+    rng = np.random.default_rng(semente)
+    meses = min(max(1, int(np.ceil(linhas / LANCAMENTOS_POR_MES))), MESES_MAXIMOS)
+    inicio = FIM_HISTORICO - pd.DateOffset(months=meses) + pd.Timedelta(days=1)
+    dias = (FIM_HISTORICO - inicio).days + 1
+
+    receita = rng.random(linhas) < FRACAO_RECEITAS
+    datas = inicio + pd.to_timedelta(rng.integers(0, dias, linhas), unit='D')
+    # Receitas caem no início do mês
+    datas = datas.where(~receita, datas.to_period('M').to_timestamp() + pd.to_timedelta(rng.integers(0, 5, linhas), unit='D'))
+
+    df = pd.DataFrame({'data': datas, 'tipo': np.where(receita, 'Receita', 'Despesa')})
+    df['categoria_principal'] = np.where(receita, 'Renda', np.where(rng.random(linhas) < 0.7, 'Pessoal', 'Familiar'))
+    df['sub_categoria'] = pd.Series(index=df.index, dtype=object)
+    df['descricao'] = pd.Series(index=df.index, dtype=object)
+    df['valor'] = 0.0
+    df['forma_pagamento'] = pd.Series(index=df.index, dtype=object)
+
+    despesas = np.flatnonzero(~receita)
+    categorias = _sorteio(rng, list(DESPESAS), [d[0] for d in DESPESAS.values()], len(despesas))
+    for categoria, (_, mediana, pagamentos, lojas) in DESPESAS.items():
+        linhas_cat = despesas[categorias == categoria]
+        n = len(linhas_cat)
+        df.loc[linhas_cat, 'sub_categoria'] = categoria
+        df.loc[linhas_cat, 'valor'] = _valores(rng, np.full(n, mediana))
+        df.loc[linhas_cat, 'forma_pagamento'] = _sorteio(rng, list(pagamentos), list(pagamentos.values()), n)
+        # Mesmo estabelecimento aparece com códigos de loja diferentes, como nos extratos
+        lojas_sorteadas = _sorteio(rng, lojas, np.arange(len(lojas), 0, -1), n)
+        codigos = rng.integers(0, 40, n)
+        df.loc[linhas_cat, 'descricao'] = [f"{loja} {codigo:04d}" for loja, codigo in zip(lojas_sorteadas, codigos)]
+
+    receitas = np.flatnonzero(receita)
+    categorias = _sorteio(rng, list(RECEITAS), [r[0] for r in RECEITAS.values()], len(receitas))
+    for categoria, (_, mediana, pagamento, descricao) in RECEITAS.items():
+        linhas_cat = receitas[categorias == categoria]
+        df.loc[linhas_cat, 'sub_categoria'] = categoria
+        df.loc[linhas_cat, 'valor'] = _valores(rng, np.full(len(linhas_cat), mediana), dispersao=0.1)
+        df.loc[linhas_cat, 'forma_pagamento'] = pagamento
+        df.loc[linhas_cat, 'descricao'] = descricao
+
+    df = df.sort_values('data', kind='stable').reset_index(drop=True)
+    df['data'] = df['data'].dt.strftime('%Y-%m-%d')
+    return df
+
+def documentos(linhas, semente=42):
+    """Lista de dicts no formato dos documentos de 'transacoes' (o que o cache recebe)."""
+    df = historico(linhas, semente)
+    df.insert(0, 'id', [f"doc{i:09d}" for i in range(linhas)])
+    return df.to_dict('records')
+
+
+# --- Planilhas ---
+
+def _xlsx(cabecalho_banco, colunas, linhas):
+    livro = openpyxl.Workbook(write_only=True)
+    aba = livro.create_sheet("Extrato")
+    for linha in cabecalho_banco:
+        aba.append(linha)
+    aba.append(colunas)
+    for linha in linhas:
+        aba.append(linha)
+    saida = BytesIO()
+    livro.save(saida)
+    return saida.getvalue()
+
+def _brl(valor):
+    # 1234.5 -> '1.234,50', como os bancos exportam
+    return f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+def planilha_extrato(linhas, semente=7):
+    """Extrato bancário .xlsx: 3 linhas de cabeçalho do banco, datas dd/mm/aaaa e valores em
+    texto no formato brasileiro, negativos para saídas (importar com pular_linhas=3).
+    Devolve (conteúdo, nome do arquivo)."""
+    df = historico(linhas, semente)
+    sinal = np.where(df['tipo'] == 'Despesa', -1, 1)
+    datas = pd.to_datetime(df['data']).dt.strftime('%d/%m/%Y')
+    corpo = zip(datas, df['descricao'], (_brl(v) for v in df['valor'] * sinal))
+    conteudo = _xlsx([["BANCO EXEMPLO S.A."], ["Agência 0001 Conta 12345-6"], []],
+                     ["Data", "Histórico", "Valor"], corpo)
+    return conteudo, "extrato_sintetico.xlsx"
+
+def planilha_fatura(linhas, semente=11):
+    """Fatura de cartão .xlsx: datas curtas dd/mm (sem ano) e valores numéricos positivos,
+    cabeçalho na primeira linha. Devolve (conteúdo, nome do arquivo)."""
+    df = historico(linhas, semente)
+    df = df[df['tipo'] == 'Despesa']
+    datas = pd.to_datetime(df['data']).dt.strftime('%d/%m')
+    corpo = zip(datas, df['descricao'], df['valor'].astype(float))
+    conteudo = _xlsx([], ["Data", "Lançamento", "Valor (R$)"], corpo)
+    return conteudo, "fatura_sintetica.xlsx"
@@ -0,0 +1,160 @@
+"""Latência de rerun por tipo de interação, com o app no AppTest do Streamlit sobre o cliente em memória.
+
+Para cada interação (filtros do dashboard, busca e paginação da edição, envio e mapeamento da
+importação), mede a mediana do rerun completo do script e, com a instrumentação ligada
+(MEDIR_TEMPOS), a da aba do controle: com os fragmentos, é só ela que o Streamlit reexecuta. O
+AppTest sempre roda o script inteiro, então o tempo da aba vem da instrumentação.
+
+Uso: python -m benchmarks.reruns [linhas] [--app PASTA] [--repeticoes N]   (padrão: 10000 linhas)
+
+--app mede o app_financas.py (e a camada de dados) de outra cópia do repositório, por exemplo a
+anterior aos fragmentos: git worktree add ../antes 073d5aa && python -m benchmarks.reruns --app ../antes
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.firestore_falso import ClienteFalso
+from benchmarks.gerador import historico, planilha_extrato
+
+# O app roda sobre o banco em memória guardado na sessão, sem credenciais do Firebase
+SCRIPT = """
+import firebase_admin
+import streamlit as st
+from firebase_admin import firestore
+firebase_admin._apps.setdefault('[DEFAULT]', object())
+firestore.client = lambda: st.session_state['banco_benchmark']
+exec(compile(open({caminho!r}, encoding='utf-8').read(), 'app_financas.py', 'exec'))
+"""
+
+BUSCAS = ['MERCADO', 'UBER', 'IFOOD', 'NETFLIX', '']
+
+
+class _Coletor(logging.Handler):
+    """Guarda as linhas JSON da instrumentação emitidas durante o rerun."""
+
+    def __init__(self):
+        super().__init__()
+        self.registros = []
+
+    def emit(self, record):
+        self.registros.append(json.loads(record.getMessage()))
+
+
+def popular(linhas):
+    # Com a camada de dados da cópia medida (o formato dos agregados muda entre versões)
+    dados = importlib.import_module('dados')
+    db = ClienteFalso()
+    registros = dados.numerar_ocorrencias([dados.montar_registro(*linha) for linha in historico(linhas).itertuples(index=False)])
+    dados.salvar_em_lotes(db, registros, dados.gerar_ids(db, len(registros)))
+    return db
+
+def _controle(at, tipo, rotulo):
+    return next(controle for controle in getattr(at, tipo) if controle.label == rotulo)
+
+def interacoes(at):
+    """(nome, aba, ação por repetição): cada ação muda um controle antes do rerun medido."""
+    periodos = _controle(at, 'selectbox', "Selecione o Período").options
+    extrato, nome_extrato = planilha_extrato(2000)
+
+    def _enviar(i):
+        # Cada repetição é um arquivo diferente chegando (o anterior é removido fora da medição)
+        _controle(at, 'file_uploader', "Escolha o arquivo Excel").set_value(None)
+        at.run()
+        conteudo, nome = planilha_extrato(2000, semente=100 + i)
+        _controle(at, 'file_uploader', "Escolha o arquivo Excel").set_value((nome, conteudo, 'application/octet-stream'))
+
+    def _preparar_importacao(i):
+        if i == 0:
+            _controle(at, 'file_uploader', "Escolha o arquivo Excel").set_value((nome_extrato, extrato, 'application/octet-stream'))
+            at.run()
+            _controle(at, 'number_input', "Pular linhas do início do arquivo:").set_value(3)
+            at.run()
+
+    def _mapear(i):
+        _preparar_importacao(i)
+        controle = _controle(at, 'selectbox', "Qual coluna é a DESCRIÇÃO?")
+        controle.set_value(controle.options[(1 + i) % len(controle.options)])
+
+    return [
+        ("dashboard: período", 'aba_dashboard',
+         lambda i: _controle(at, 'selectbox', "Selecione o Período").set_value(periodos[1 + i % (len(periodos) - 1)])),
+        ("dashboard: filtro de tipo", 'aba_dashboard',
+         lambda i: _controle(at, 'multiselect', "Filtrar por Tipo").set_value(['Despesa'] if i % 2 == 0 else ['Despesa', 'Receita'])),
+        ("edição: busca (digitação)", 'aba_edicao',
+         lambda i: _controle(at, 'text_input', "Buscar na descrição").input(BUSCAS[i % len(BUSCAS)])),
+        ("edição: linhas por página", 'aba_edicao',
+         lambda i: _controle(at, 'selectbox', "Linhas por página").set_value([50, 100, 25][i % 3])),
+        ("importação: envio do arquivo", 'aba_importacao', _enviar),
+        ("importação: mapeamento de coluna", 'aba_importacao', _mapear),
+        ("importação: opção (checkbox)", 'aba_importacao',
+         lambda i: _controle(at, 'checkbox', "Adicionar data original na descrição? (Útil para conferência)").set_value(i % 2 == 0)),
+    ]
+
+def medir(caminho_app, db, instrumentado, repeticoes):
+    """{interação: (mediana do rerun completo, mediana da aba ou None)} em milissegundos."""
+    coletor = _Coletor()
+    log = logging.getLogger('instrumentacao')
+    log.addHandler(coletor)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+    at = AppTest.from_string(SCRIPT.format(caminho=caminho_app), default_timeout=300)
+    at.secrets['APP_PASSWORD'] = 'benchmark'
+    if instrumentado:
+        at.secrets['MEDIR_TEMPOS'] = True
+    at.session_state['logged_in'] = True
+    at.session_state['banco_benchmark'] = db
+    at.run()
+    at.run() # Caches aquecidos
+
+    resultados = {}
+    try:
+        for nome, aba, acao in interacoes(at):
+            completos, abas = [], []
+            for i in range(repeticoes):
+                acao(i)
+                coletor.registros.clear()
+                inicio = time.perf_counter()
+                at.run()
+                completos.append((time.perf_counter() - inicio) * 1000)
+                if at.exception:
+                    raise RuntimeError(f"{nome}: {at.exception[0].value}")
+                abas += [registro['ms'] for registro in coletor.registros if registro['etapa'] == f"aba.{aba}"]
+            resultados[nome] = (statistics.median(completos), statistics.median(abas) if abas else None)
+    finally:
+        log.removeHandler(coletor)
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Latência de rerun por tipo de interação.")
+    parser.add_argument('linhas', type=int, nargs='?', default=10_000)
+    parser.add_argument('--app', default='.', help="pasta com o app_financas.py a medir (padrão: esta cópia)")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    pasta = os.path.abspath(args.app)
+    sys.path.insert(0, pasta) # dados, importacao... da cópia medida
+    logging.getLogger().setLevel(logging.ERROR)
+    logging.getLogger('streamlit').setLevel(logging.ERROR) # Avisos de depreciação a cada rerun
+    db = popular(args.linhas)
+    caminho_app = os.path.join(pasta, 'app_financas.py')
+
+    # Sem instrumentação para o rerun completo (o painel de desempenho também custa); com ela, as abas
+    completos = medir(caminho_app, db, False, args.repeticoes)
+    instrumentados = medir(caminho_app, db, True, args.repeticoes)
+    tabela = pd.DataFrame({
+        'ms rerun completo': {nome: completo for nome, (completo, _) in completos.items()},
+        'ms aba (fragmento)': {nome: aba for nome, (_, aba) in instrumentados.items()}
+    })
+    print(f"{args.linhas} transações, {pasta}:")
+    print(tabela.round(1).to_string())
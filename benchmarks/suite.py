@@ -0,0 +1,216 @@
+"""Suíte de desempenho da camada de dados, sem Streamlit: tempo, leituras/escritas e pico de memória.
+
+Para cada tamanho de histórico, popula um banco sintético (benchmarks.gerador) e mede as
+etapas do app, na ordem em que o usuário as dispara:
+
+    carga                  carregar_dados do app: carga completa + frame tipado
+    sincronizacao          sincronização incremental depois de DELTA_SINCRONIA inclusões, edições e
+                           exclusões feitas por outro aparelho
+    dashboard              resumos e saldos do Firestore + agregações do mês
+    dashboard.sem_conexao  os mesmos totais calculados do frame tipado (réplica offline)
+    tendencias             séries da aba de Tendências para o histórico inteiro, saldo diário reduzido
+    categorizador          índice da categorização automática (uma vez por versão dos dados)
+    importacao.extrato     planilha bancária: leitura, normalização, categorização, duplicadas e gravação
+    importacao.fatura      o mesmo, para uma fatura de cartão
+    reimportacao.extrato   o mesmo extrato de novo (todas as linhas caem como duplicadas)
+    excluir_tudo           exclusão completa
+
+Leituras/escritas e bytes vêm da instrumentação (instrumentacao.py); o pico de memória é o
+do tracemalloc durante a etapa, acima do que já estava alocado (inclui o banco em memória só
+no quanto ele cresce). O tracemalloc deixa tudo mais lento: compare tempos com --sem-memoria.
+
+Uso: python -m benchmarks.suite [linhas ...] [--arquivo N] [--emulador HOST:PORTA] [--sem-memoria] [--json]
+     (padrão: 1000 10000 100000 linhas de histórico e arquivos de 2000 linhas)
+
+Sem --emulador, roda no cliente em memória (benchmarks.firestore_falso). Com ele, usa o
+cliente oficial contra o emulador (`firebase emulators:start --only firestore`), que mede
+também o custo de rede/serialização; o banco do emulador é esvaziado antes de cada tamanho.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from itertools import islice
+
+import pandas as pd
+from firebase_admin import firestore
+
+import instrumentacao
+from benchmarks.firestore_falso import ClienteFalso
+from benchmarks.gerador import FIM_HISTORICO, historico, planilha_extrato, planilha_fatura
+from categorizacao import Categorizador, categorizar
+from dados import (COLECAO_TRANSACOES, CONTAS_SALDO, MARGEM_SINCRONIA, CacheTransacoes,
+                   adicionar_transacao, calcular_resumos, carregar_regras, carregar_resumos,
+                   carregar_saldos, excluir_tudo, gerar_ids, impressoes_existentes, montar_registro,
+                   numerar_ocorrencias, registrar_importacao, saldo_em, saldos_calculados,
+                   salvar_edicoes, salvar_em_lotes, vocabulario_calculado)
+from importacao import (TIPO_EXTRATO, TIPO_FATURA, aplicar_cabecalho, classificar_lancamentos,
+                        ler_grade, normalizar_importacao)
+from tendencias import (evolucao_categorias, frequencia_sugerida, receitas_despesas, reduzir,
+                        saldo_diario)
+
+PROJETO_EMULADOR = 'demo-minhas-financas'
+
+# Alterações de cada tipo feitas "por outro aparelho" antes da etapa de sincronização
+DELTA_SINCRONIA = 50
+
+
+def conectar(emulador=None):
+    """Cliente em memória, ou o cliente oficial apontado para o emulador em `emulador` (host:porta)."""
+    if emulador is None:
+        return ClienteFalso()
+    os.environ['FIRESTORE_EMULATOR_HOST'] = emulador
+    db = firestore.Client(project=PROJETO_EMULADOR)
+    excluir_tudo(db)
+    return db
+
+def popular(db, linhas):
+    """Grava um histórico sintético pelas mesmas funções da importação (com resumos, saldos e vocabulário)."""
+    df = historico(linhas)
+    registros = numerar_ocorrencias([montar_registro(*linha) for linha in df.itertuples(index=False)])
+    salvar_em_lotes(db, registros, gerar_ids(db, len(registros)))
+
+def alterar(db, quantidade, semente=3):
+    """O que outro aparelho grava entre duas sincronizações: `quantidade` inclusões, edições e exclusões."""
+    ids = [doc.id for doc in db.collection(COLECAO_TRANSACOES).limit(2 * quantidade).stream()]
+    novas = historico(2 * quantidade, semente).itertuples(index=False)
+    for linha in islice(novas, quantidade):
+        adicionar_transacao(db, *linha)
+    salvar_edicoes(db, dict(zip(ids[:quantidade], novas)), excluidos=ids[quantidade:])
+
+
+# --- Etapas ---
+
+def dashboard(db):
+    # O que aba_dashboard faz para o mês mais recente, com todos os tipos e categorias
+    resumos = carregar_resumos(db)
+    saldos = carregar_saldos(db)
+    mes = resumos['mes'].max()
+    resumo_mes = resumos[resumos['mes'] == mes]
+    despesas = resumo_mes[resumo_mes['tipo'] == 'Despesa']
+    despesas.groupby('forma_pagamento')['valor'].sum().sort_values(ascending=False)
+    despesas.groupby('sub_categoria')['valor'].sum().reset_index()
+    for conta in CONTAS_SALDO:
+        if conta in saldos:
+            saldo_em(saldos[conta], mes)
+
+def dashboard_sem_conexao(tipado):
+    calcular_resumos(tipado)
+    saldos_calculados(tipado)
+    vocabulario_calculado(tipado)
+
+def tendencias(db, tipado):
+    # aba_tendencias com o período inteiro selecionado (o pior caso de pontos)
+    resumos = carregar_resumos(db)
+    meses = pd.PeriodIndex(resumos.loc[resumos['mes'] != 'sem-data', 'mes'], freq='M')
+    inicio, fim = meses.min(), meses.max()
+    frequencia = frequencia_sugerida(inicio, fim)
+    receitas_despesas(resumos, inicio, fim, frequencia)
+    evolucao_categorias(resumos, 'Despesa', inicio, fim, frequencia)
+    reduzir(saldo_diario(tipado, inicio, fim))
+
+def importar(db, conteudo, nome_arquivo, tipo_importacao, pular_linhas, categorizador):
+    """O caminho do botão "Processar e Salvar Importação", com as colunas já mapeadas. Retorna as linhas gravadas."""
+    df_import = aplicar_cabecalho(ler_grade(conteudo, nome_arquivo), pular_linhas)
+    col_data, col_desc, col_valor = df_import.columns[:3]
+    df_limpo, invalidas = normalizar_importacao(df_import, col_data, col_desc, col_valor,
+                                                FIM_HISTORICO.year, FIM_HISTORICO.month)
+    fatura = tipo_importacao == TIPO_FATURA
+    df_final = classificar_lancamentos(df_limpo[~invalidas], tipo_importacao, "Pessoal" if fatura else None)
+    df_final, _ = categorizar(df_final, categorizador, manter_pagamento=fatura)
+
+    registros = numerar_ocorrencias([montar_registro(*linha) for linha in df_final.itertuples(index=False)])
+    existentes = impressoes_existentes(db, [registro['impressao'] for registro in registros])
+    registros = [registro for registro in registros if registro['impressao'] not in existentes]
+    lote = uuid.uuid4().hex
+    for registro in registros:
+        registro['lote_importacao'] = lote
+    if registros:
+        registrar_importacao(db, lote, nome_arquivo, len(registros))
+        salvar_em_lotes(db, registros, gerar_ids(db, len(registros)))
+    return len(registros)
+
+
+# --- Execução ---
+
+def medir_etapa(etapa, funcao, memoria):
+    """Roda `funcao` medida pela instrumentação (e pelo tracemalloc). Retorna (resultado, linha do relatório)."""
+    if memoria:
+        tracemalloc.start()
+    with instrumentacao.medir(etapa) as medicao:
+        resultado = funcao()
+    pico = None
+    if memoria:
+        pico = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return resultado, {
+        'etapa': etapa,
+        'ms': medicao.ms,
+        'leituras': medicao.leituras,
+        'escritas': medicao.escritas,
+        'KB lidos': medicao.bytes_lidos / 1024,
+        'KB escritos': medicao.bytes_escritos / 1024,
+        'MB pico': pico
+    }
+
+def executar(linhas, linhas_arquivo=2000, emulador=None, memoria=True):
+    """Roda todas as etapas sobre um histórico de `linhas` transações. Retorna uma linha por etapa."""
+    db = conectar(emulador)
+    popular(db, linhas)
+    # Como entre duas sessões: passada a margem da sincronização, a carga deixa a marca d'água
+    # depois da gravação do histórico e a sincronização só lê o que mudar em seguida
+    time.sleep(MARGEM_SINCRONIA.total_seconds())
+    extrato = planilha_extrato(linhas_arquivo)
+    fatura = planilha_fatura(linhas_arquivo)
+
+    instrumentacao.ativar()
+    resultados = []
+
+    def etapa(nome, funcao):
+        resultado, medicao = medir_etapa(nome, funcao, memoria)
+        resultados.append({'linhas': linhas, **medicao})
+        return resultado
+
+    cache = CacheTransacoes(intervalo_sincronia=3600)
+
+    def sincronizar():
+        cache.invalidar()
+        return cache.carregar(db)
+
+    tipado = etapa('carga', lambda: cache.carregar(db))
+    alterar(db, DELTA_SINCRONIA)
+    tipado = etapa('sincronizacao', sincronizar)
+    etapa('dashboard', lambda: dashboard(db))
+    etapa('dashboard.sem_conexao', lambda: dashboard_sem_conexao(tipado))
+    etapa('tendencias', lambda: tendencias(db, tipado))
+    categorizador = etapa('categorizador', lambda: Categorizador(tipado, carregar_regras(db)))
+    etapa('importacao.extrato', lambda: importar(db, *extrato, TIPO_EXTRATO, 3, categorizador))
+    etapa('importacao.fatura', lambda: importar(db, *fatura, TIPO_FATURA, 0, categorizador))
+    etapa('reimportacao.extrato', lambda: importar(db, *extrato, TIPO_EXTRATO, 3, categorizador))
+    etapa('excluir_tudo', lambda: excluir_tudo(db))
+
+    instrumentacao.ativar(False)
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Suíte de desempenho da camada de dados.")
+    parser.add_argument('linhas', type=int, nargs='*', default=[1_000, 10_000, 100_000], help="tamanhos do histórico")
+    parser.add_argument('--arquivo', type=int, default=2000, help="linhas das planilhas importadas")
+    parser.add_argument('--emulador', metavar='HOST:PORTA', help="usa o emulador do Firestore em vez do cliente em memória")
+    parser.add_argument('--sem-memoria', action='store_true', help="não mede o pico de memória (tempos sem o custo do tracemalloc)")
+    parser.add_argument('--json', action='store_true', help="uma linha JSON por etapa, para scripts")
+    args = parser.parse_args()
+
+    for linhas in args.linhas:
+        resultados = executar(linhas, args.arquivo, args.emulador, memoria=not args.sem_memoria)
+        if args.json:
+            for resultado in resultados:
+                print(json.dumps(resultado, ensure_ascii=False))
+        else:
+            print(f"\n{linhas} transações:")
+            print(pd.DataFrame(resultados).drop(columns='linhas').set_index('etapa').round(1).to_string())
+        sys.stdout.flush()
@@ -0,0 +1,120 @@
+"""Categorização automática dos lançamentos importados, aprendida do histórico e de regras do usuário."""
+import re
+
+import pandas as pd
+
+# Categorias que a importação coloca por padrão: não ensinam nada sobre a descrição
+CATEGORIAS_GENERICAS = {"Outros", "Fatura Cartão"}
+
+# Palavras iniciais da descrição usadas como prefixo ("uber trip sp 123" -> "uber trip")
+PALAVRAS_PREFIXO = 2
+
+# Fração mínima das transações de uma descrição/prefixo que precisa ter a mesma categoria
+CONFIANCA_MINIMA = 0.6
+
+CAMPOS_PROPOSTA = ['sub_categoria', 'categoria_principal', 'forma_pagamento']
+
+
+def normalizar_descricoes(serie):
+    """Chave de comparação das descrições, calculada de uma vez para a coluna inteira.
+
+    Sem acentos, minúscula e só com letras: datas, números de cartão, parcelas ("03/10") e
+    pontuação variam entre lançamentos do mesmo estabelecimento e são descartados.
+    """
+    texto = serie.astype(object).fillna('').astype(str)
+    texto = texto.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.lower()
+    return texto.str.replace(r'[^a-z]+', ' ', regex=True).str.strip()
+
+def _prefixos(chaves):
+    return chaves.str.split(' ', n=PALAVRAS_PREFIXO).str[:PALAVRAS_PREFIXO].str.join(' ')
+
+def _texto(serie):
+    return serie.astype(object).fillna('').astype(str)
+
+
+class Categorizador:
+    """Índice descrição -> (sub_categoria, categoria_principal, forma_pagamento).
+
+    Montado uma vez a partir do histórico (frame com tipo, descricao e os CAMPOS_PROPOSTA) e
+    das regras do usuário ([{'padrao', 'sub_categoria', 'categoria_principal', 'forma_pagamento'}]).
+    A classificação procura, nesta ordem: regra cujo padrão aparece na descrição, descrição
+    idêntica já categorizada e mesmo prefixo. Tudo por coluna: dicionários consultados com
+    Series.map e as regras compiladas em uma única expressão regular.
+    """
+
+    def __init__(self, historico, regras=()):
+        base = pd.DataFrame({
+            'tipo': _texto(historico['tipo']),
+            'chave': normalizar_descricoes(historico['descricao']),
+            **{campo: _texto(historico[campo]) for campo in CAMPOS_PROPOSTA}
+        }) if not historico.empty else pd.DataFrame(columns=['tipo', 'chave'] + CAMPOS_PROPOSTA)
+        base = base[(base['chave'] != '') & (base['sub_categoria'] != '') & ~base['sub_categoria'].isin(CATEGORIAS_GENERICAS)]
+
+        self.exatas = self._mais_frequentes(base, base['tipo'] + '|' + base['chave'])
+        self.prefixos = self._mais_frequentes(base, base['tipo'] + '|' + _prefixos(base['chave']))
+
+        self.regras = {}
+        for regra in regras:
+            padrao = normalizar_descricoes(pd.Series([regra.get('padrao')])).iloc[0]
+            if padrao and regra.get('sub_categoria'):
+                self.regras[padrao] = tuple(regra.get(campo) or '' for campo in CAMPOS_PROPOSTA)
+        # Padrões mais longos primeiro: na alternância, "uber eats" ganha de "uber"
+        padroes = sorted(self.regras, key=len, reverse=True)
+        self._expressao = re.compile(r'\b(' + '|'.join(map(re.escape, padroes)) + r')\b') if padroes else None
+
+    @staticmethod
+    def _mais_frequentes(base, chaves):
+        """{chave: proposta} com a combinação mais comum de cada chave, se tiver a confiança mínima."""
+        if base.empty:
+            return {}
+        contagem = base.assign(_chave=chaves).groupby(['_chave'] + CAMPOS_PROPOSTA).size().rename('n').reset_index()
+        contagem['total'] = contagem.groupby('_chave')['n'].transform('sum')
+        contagem = contagem.sort_values('n', ascending=False).drop_duplicates('_chave')
+        contagem = contagem[contagem['n'] >= CONFIANCA_MINIMA * contagem['total']]
+        return dict(zip(contagem['_chave'], zip(*(contagem[campo] for campo in CAMPOS_PROPOSTA))))
+
+    def classificar(self, df):
+        """Propostas para as linhas de `df` (colunas tipo e descricao).
+
+        Retorna um frame com o mesmo índice, os CAMPOS_PROPOSTA e 'origem' ('regra', 'histórico'
+        ou 'prefixo'); linhas sem proposta ficam com NaN.
+        """
+        chaves = normalizar_descricoes(df['descricao'])
+        tipos = _texto(df['tipo'])
+        propostas = pd.Series(None, index=df.index, dtype=object)
+        origem = pd.Series(None, index=df.index, dtype=object)
+
+        niveis = []
+        if self._expressao is not None:
+            niveis.append(('regra', self.regras, chaves.str.extract(self._expressao, expand=False)))
+        niveis.append(('histórico', self.exatas, tipos + '|' + chaves))
+        niveis.append(('prefixo', self.prefixos, tipos + '|' + _prefixos(chaves)))
+
+        for nome, mapa, chaves_nivel in niveis:
+            faltando = propostas.isna()
+            if not faltando.any():
+                break
+            achadas = chaves_nivel[faltando].map(mapa).dropna()
+            propostas[achadas.index] = achadas
+            origem[achadas.index] = nome
+
+        encontradas = propostas.dropna()
+        resultado = pd.DataFrame(encontradas.tolist(), index=encontradas.index, columns=CAMPOS_PROPOSTA)
+        resultado = resultado.mask(resultado == '').reindex(df.index) # Campo vazio na regra: mantém o da importação
+        resultado['origem'] = origem
+        return resultado
+
+
+def categorizar(df_final, categorizador, manter_pagamento=False):
+    """Aplica as propostas do categorizador às linhas de classificar_lancamentos.
+
+    Campos sem proposta mantêm o valor da importação. Com `manter_pagamento` (fatura do
+    cartão), só a sub_categoria muda: pagamento e classificação já foram escolhidos na tela.
+    Retorna (df com as categorias propostas, Series 'origem').
+    """
+    propostas = categorizador.classificar(df_final)
+    campos = ['sub_categoria'] if manter_pagamento else CAMPOS_PROPOSTA
+    df = df_final.copy()
+    for campo in campos:
+        df[campo] = propostas[campo].fillna(df[campo])
+    return df, propostas['origem']
@@ -0,0 +1,1285 @@
+"""Camada de dados do app: acesso ao Firestore e cache incremental das transações."""
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from firebase_admin import firestore
+from google.api_core.exceptions import (Aborted, DeadlineExceeded, FailedPrecondition,
+                                        InternalServerError, RetryError, ServiceUnavailable,
+                                        TooManyRequests)
+from google.auth.exceptions import TransportError
+from google.cloud.firestore_v1.field_path import FieldPath
+
+import instrumentacao
+
+logger = logging.getLogger(__name__)
+
+COLECAO_TRANSACOES = 'transacoes'
+COLECAO_EXCLUSOES = 'exclusoes'  # "Lápides" dos documentos excluídos, lidas na sincronização
+COLECAO_RESUMOS = 'resumos_mensais'  # Um documento por mês (YYYY-MM) com os totais agregados
+COLECAO_SALDOS = 'saldos'  # Um documento por conta de benefício com o saldo corrente
+COLECAO_IMPORTACOES = 'importacoes'  # Um documento por importação de planilha (lote_importacao)
+COLECAO_META = 'meta'
+DOC_SINCRONIZACAO = 'sincronizacao'
+DOC_VOCABULARIO = 'vocabulario'  # Em 'meta': categorias e formas de pagamento já usadas, com contagem
+DOC_REGRAS = 'regras_categorizacao'  # Em 'meta': regras do usuário para a categorização da importação
+
+COLUNAS_TRANSACAO = ['id', 'data', 'tipo', 'categoria_principal', 'sub_categoria', 'descricao', 'valor', 'forma_pagamento']
+COLUNAS_RESUMO = ['mes', 'tipo', 'sub_categoria', 'forma_pagamento', 'centavos', 'quantidade', 'valor']
+
+# Contas com saldo corrente: recebem as Receitas dessa sub_categoria e pagam as Despesas
+# com essa forma_pagamento. A chave é o ID do documento em 'saldos'.
+CONTAS_SALDO = {
+    'vale_refeicao': 'Vale Refeição',
+    'vale_alimentacao': 'Vale Alimentação'
+}
+
+# Margem da marca d'água: ela nunca passa do início da última sincronização menos isto, o que
+# cobre commits concorrentes à leitura (timestamp do servidor anterior a ela) e o relógio local.
+MARGEM_SINCRONIA = timedelta(seconds=10)
+
+# Tempo que as lápides ficam em 'exclusoes': a política de TTL do campo 'expira_em' (fieldOverrides de
+# firestore.indexes.json, publicada com `firebase deploy --only firestore:indexes`) apaga as vencidas.
+# Um cache com marca d'água anterior a isso recarrega tudo.
+RETENCAO_EXCLUSOES = timedelta(days=30)
+
+# Limite de escritas por commit em lote do Firestore
+TAMANHO_LOTE = 500
+# Exclusões com escopo gravam, por documento, a exclusão e a lápide, mais resumos e saldos
+# (no máximo um mês por documento): 3 x 160 + contas de saldo + vocabulário cabe em um commit.
+TAMANHO_PAGINA_ESCOPO = 160
+
+# Máximo de valores em um filtro 'in' do Firestore
+LIMITE_IN = 30
+
+# Falhas que indicam Firestore inacessível (sem rede, timeout), e não erro de dados
+ERROS_CONEXAO = (ServiceUnavailable, DeadlineExceeded, RetryError, TransportError)
+
+# Falhas passageiras de um commit, que valem nova tentativa: as de conexão, contenção e cota
+ERROS_TRANSITORIOS = ERROS_CONEXAO + (Aborted, InternalServerError, TooManyRequests)
+
+
+# --- Funções de Banco de Dados (CRUD) ---
+
+def montar_registro(data_iso, tipo, cat_principal, sub_cat, desc, valor, pagto):
+    # data_iso deve vir no formato YYYY-MM-DD para salvar no banco
+    return {
+        'data': data_iso,
+        'tipo': tipo,
+        'categoria_principal': cat_principal,
+        'sub_categoria': sub_cat,
+        'descricao': desc,
+        'valor': float(valor),
+        'forma_pagamento': pagto,
+        'impressao': calcular_impressao(data_iso, desc, valor, pagto)
+    }
+
+def adicionar_transacao(db, data_iso, tipo, cat_principal, sub_cat, desc, valor, pagto, doc_id=None):
+    # doc_id fixo (opcional) torna a gravação repetível, como na fila de gravações sem conexão
+    doc_ref = db.collection(COLECAO_TRANSACOES).document(doc_id)
+    registro = montar_registro(data_iso, tipo, cat_principal, sub_cat, desc, valor, pagto)
+    # Lançamento igual a outro já gravado vira a ocorrência seguinte, como na importação
+    registro['impressao'] = proxima_ocorrencia(db, registro['impressao'])
+    registro['criado_em'] = firestore.SERVER_TIMESTAMP
+    registro['atualizado_em'] = firestore.SERVER_TIMESTAMP
+
+    # Transação e resumo do mês no mesmo commit
+    batch = db.batch()
+    batch.set(doc_ref, registro)
+    _aplicar_movimentos(batch, db, [(registro, 1)])
+    _confirmar(batch)
+    return True
+
+def atualizar_transacao(db, doc_id, data_iso, tipo, cat_principal, sub_cat, desc, valor, pagto):
+    doc_ref = db.collection(COLECAO_TRANSACOES).document(doc_id)
+    registro = montar_registro(data_iso, tipo, cat_principal, sub_cat, desc, valor, pagto)
+    registro['atualizado_em'] = firestore.SERVER_TIMESTAMP
+
+    @firestore.transactional
+    def _atualizar(transacao):
+        # Lê a versão anterior para tirar do resumo o que ela somava
+        antigo = instrumentacao.contar_leitura(doc_ref.get(transaction=transacao)).to_dict() or {}
+        _manter_ocorrencia(antigo, registro)
+        transacao.update(doc_ref, registro)
+        _aplicar_movimentos(transacao, db, [(antigo, -1), (registro, 1)])
+        instrumentacao.contar_escritas(transacao)
+
+    _atualizar(db.transaction())
+    return True
+
+def excluir_transacao(db, doc_id):
+    doc_ref = db.collection(COLECAO_TRANSACOES).document(doc_id)
+
+    @firestore.transactional
+    def _excluir(transacao):
+        snap = instrumentacao.contar_leitura(doc_ref.get(transaction=transacao))
+        if not snap.exists:
+            return
+        transacao.delete(doc_ref)
+        # Lápide no mesmo commit, para os caches saberem que o documento sumiu
+        transacao.set(db.collection(COLECAO_EXCLUSOES).document(doc_id), _lapide())
+        _aplicar_movimentos(transacao, db, [(snap.to_dict(), -1)])
+        instrumentacao.contar_escritas(transacao)
+
+    _excluir(db.transaction())
+    return True
+
+def excluir_tudo(db, ao_progresso=None):
+    excluir_em_massa(db, db.collection(COLECAO_TRANSACOES), ao_progresso)
+    # As lápides perdem o sentido, e resumos/saldos/vocabulário voltam a zero
+    for colecao in (COLECAO_EXCLUSOES, COLECAO_RESUMOS, COLECAO_SALDOS, COLECAO_IMPORTACOES):
+        excluir_em_massa(db, db.collection(colecao))
+    db.collection(COLECAO_META).document(DOC_VOCABULARIO).delete()
+    instrumentacao.contar_escritas(quantidade=1)
+
+    # Marco de reset só depois de tudo excluído: os caches recarregam do zero. Se parar no
+    # meio, chamar de novo continua a exclusão e grava o marco no fim
+    db.collection(COLECAO_META).document(DOC_SINCRONIZACAO).set({'reset_em': firestore.SERVER_TIMESTAMP}, merge=True)
+    instrumentacao.contar_escritas(quantidade=1)
+    return True
+
+def excluir_mes(db, mes, ao_progresso=None):
+    """Exclui as transações de um mês ('YYYY-MM')."""
+    inicio_iso, fim_iso = limites_mes(mes)
+    consulta = db.collection(COLECAO_TRANSACOES) \
+        .where(filter=firestore.FieldFilter('data', '>=', inicio_iso)) \
+        .where(filter=firestore.FieldFilter('data', '<', fim_iso))
+    return excluir_em_massa(db, consulta, ao_progresso, com_movimentos=True)
+
+def excluir_importacao(db, lote, ao_progresso=None):
+    """Exclui todas as transações gravadas por uma importação (campo 'lote_importacao')."""
+    consulta = db.collection(COLECAO_TRANSACOES).where(filter=firestore.FieldFilter('lote_importacao', '==', lote))
+    total = excluir_em_massa(db, consulta, ao_progresso, com_movimentos=True)
+    db.collection(COLECAO_IMPORTACOES).document(lote).delete()
+    instrumentacao.contar_escritas(quantidade=1)
+    return total
+
+
+# --- Impressões Digitais (Detecção de Duplicadas) ---
+# A impressão é o hash de data, descrição, valor e forma de pagamento normalizados, mais o
+# número da ocorrência ('<hash>-<n>'): duas compras iguais no mesmo dia do mesmo extrato são
+# ocorrências 0 e 1, e reimportar o extrato encontra as duas. Fica no campo indexado
+# 'impressao' de cada transação.
+
+def _normalizar_texto(texto):
+    # Sem acentos, minúsculo e com espaços colapsados: "PADARIA  São João" == "padaria sao joao"
+    texto = unicodedata.normalize('NFKD', _texto(texto)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(texto.lower().split())
+
+def calcular_impressao(data_iso, desc, valor, pagto, ocorrencia=0):
+    base = '|'.join([_texto(data_iso)[:10], _normalizar_texto(desc), str(_centavos(valor)), _normalizar_texto(pagto)])
+    return f"{hashlib.sha1(base.encode('utf-8')).hexdigest()[:24]}-{ocorrencia}"
+
+def _base_impressao(impressao):
+    return _texto(impressao).rsplit('-', 1)[0]
+
+def _manter_ocorrencia(antigo, registro):
+    # Edição que não muda data/descrição/valor/pagamento mantém a ocorrência da impressão
+    if _base_impressao(antigo.get('impressao')) == _base_impressao(registro['impressao']):
+        registro['impressao'] = antigo['impressao']
+
+def numerar_ocorrencias(registros, ja_usadas=None):
+    """Renumera as impressões dos registros iguais (0, 1, 2...) na ordem em que aparecem.
+
+    `ja_usadas` conta ocorrências que já existem por base, para continuar a numeração delas.
+    """
+    contagem = dict(ja_usadas or {})
+    for registro in registros:
+        base = _base_impressao(registro['impressao'])
+        registro['impressao'] = f"{base}-{contagem.get(base, 0)}"
+        contagem[base] = contagem.get(base, 0) + 1
+    return registros
+
+def impressoes_existentes(db, impressoes):
+    """Quais das impressões já estão gravadas.
+
+    Consulta em filtros 'in' de LIMITE_IN valores, com projeção só no campo 'impressao' e
+    algumas consultas em paralelo: o custo depende das linhas do arquivo, não do histórico.
+    """
+    unicas = list(dict.fromkeys(impressoes))
+    colecao = db.collection(COLECAO_TRANSACOES)
+
+    def _consultar(grupo):
+        consulta = colecao.where(filter=firestore.FieldFilter('impressao', 'in', grupo)).select(['impressao'])
+        return list(consulta.stream())
+
+    grupos = [unicas[i:i + LIMITE_IN] for i in range(0, len(unicas), LIMITE_IN)]
+    existentes = set()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # Contadas aqui: as medições da instrumentação são da thread que chamou
+        for docs in executor.map(_consultar, grupos):
+            existentes |= {doc.get('impressao') for doc in instrumentacao.contados(docs)}
+    return existentes
+
+def proxima_ocorrencia(db, impressao):
+    """A impressão com a primeira ocorrência ainda não gravada (uma consulta por LIMITE_IN ocorrências)."""
+    base = _base_impressao(impressao)
+    inicio = 0
+    while True:
+        candidatas = [f"{base}-{ocorrencia}" for ocorrencia in range(inicio, inicio + LIMITE_IN)]
+        existentes = impressoes_existentes(db, candidatas)
+        livre = next((candidata for candidata in candidatas if candidata not in existentes), None)
+        if livre is not None:
+            return livre
+        inicio += LIMITE_IN
+
+def preencher_impressoes(db, df):
+    """Grava 'impressao' nas transações antigas, de antes da detecção de duplicadas.
+
+    As ocorrências seguem a ordem de criação e continuam a numeração das impressões já
+    gravadas. Não mexe em 'atualizado_em'. Retorna quantos documentos foram atualizados.
+    """
+    if df.empty:
+        return 0
+    if 'impressao' not in df.columns:
+        df = df.assign(impressao=None)
+
+    tem_impressao = df['impressao'].notna()
+    ja_usadas = {}
+    for impressao in df.loc[tem_impressao, 'impressao']:
+        base = _base_impressao(impressao)
+        ja_usadas[base] = ja_usadas.get(base, 0) + 1
+
+    faltando = df[~tem_impressao]
+    if 'criado_em' in faltando.columns:
+        ordem = pd.to_datetime(faltando['criado_em'], utc=True, errors='coerce')
+        faltando = faltando.loc[ordem.sort_values(na_position='first', kind='stable').index]
+    registros = [
+        {'id': linha['id'], 'impressao': calcular_impressao(linha.get('data'), linha.get('descricao'), linha.get('valor'), linha.get('forma_pagamento'))}
+        for linha in faltando.to_dict('records')
+    ]
+    numerar_ocorrencias(registros, ja_usadas)
+
+    colecao = db.collection(COLECAO_TRANSACOES)
+    for inicio in range(0, len(registros), TAMANHO_LOTE):
+        batch = db.batch()
+        for registro in registros[inicio:inicio + TAMANHO_LOTE]:
+            batch.update(colecao.document(registro['id']), {'impressao': registro['impressao']})
+        _confirmar(batch)
+    return len(registros)
+
+
+# --- Gravação em Lote ---
+
+def gerar_ids(db, quantidade):
+    """Reserva IDs de documento no cliente (sem ida ao servidor), para gravações repetíveis."""
+    colecao = db.collection(COLECAO_TRANSACOES)
+    return [colecao.document().id for _ in range(quantidade)]
+
+def _dividir_lotes(registros, limite):
+    """Intervalos (inicio, fim) em que transações + resumos + saldos + vocabulário cabem em `limite` escritas."""
+    intervalos = []
+    inicio = 0
+    meses = set()
+    for i, registro in enumerate(registros):
+        mes = _mes(registro)
+        escritas = (i - inicio) + len(meses | {mes}) + len(CONTAS_SALDO) + 1 # + vocabulário
+        if i > inicio and escritas >= limite:
+            intervalos.append((inicio, i))
+            inicio = i
+            meses = set()
+        meses.add(mes)
+    if inicio < len(registros):
+        intervalos.append((inicio, len(registros)))
+    return intervalos
+
+def salvar_em_lotes(db, registros, ids, ao_progresso=None, inicio_lote=0,
+                    tamanho_lote=TAMANHO_LOTE, tentativas=3, com_movimentos=True):
+    """Grava os registros (dicts de montar_registro) em commits de até `tamanho_lote` escritas.
+
+    Cada registro vai para o documento de mesmo índice em `ids`, e os resumos mensais e
+    saldos são atualizados no mesmo commit (sem `com_movimentos`, só as transações são
+    gravadas e quem chama refaz os agregados depois, ver gravar_agregados). Como os IDs são fixos e um commit é atômico, basta o primeiro
+    documento do lote existir para saber que ele já foi gravado: repetir um lote que falhou,
+    ou retomar a partir de `inicio_lote` (inclusive do lote 0), não duplica transações nem soma
+    resumos/saldos duas vezes. Custa uma leitura no primeiro lote de cada chamada e em cada nova tentativa.
+    `ao_progresso(lotes_gravados, total_lotes)` é chamado após cada commit. Só ERROS_TRANSITORIOS
+    são tentados de novo, até `tentativas` vezes; qualquer outra exceção é propagada na hora.
+    """
+    colecao = db.collection(COLECAO_TRANSACOES)
+    if com_movimentos:
+        lotes = _dividir_lotes(registros, tamanho_lote)
+    else:
+        lotes = [(inicio, min(inicio + tamanho_lote, len(registros))) for inicio in range(0, len(registros), tamanho_lote)]
+    total_lotes = len(lotes)
+
+    for num_lote in range(inicio_lote, total_lotes):
+        inicio, fim = lotes[num_lote]
+        # O primeiro lote pode ser a repetição de uma chamada que caiu depois do commit
+        conferir = num_lote == inicio_lote
+
+        with instrumentacao.medir('importacao.lote', lote=num_lote + 1, registros=fim - inicio):
+            for tentativa in range(1, tentativas + 1):
+                try:
+                    if conferir and instrumentacao.contar_leitura(colecao.document(ids[inicio]).get()).exists:
+                        break # A falha anterior aconteceu depois do commit
+                    batch = db.batch()
+                    for doc_id, registro in zip(ids[inicio:fim], registros[inicio:fim]):
+                        batch.set(colecao.document(doc_id), {
+                            'criado_em': firestore.SERVER_TIMESTAMP, # Salvo se o registro trouxer o seu (restauração de backup)
+                            **registro,
+                            'atualizado_em': firestore.SERVER_TIMESTAMP
+                        })
+                    if com_movimentos:
+                        _aplicar_movimentos(batch, db, [(registro, 1) for registro in registros[inicio:fim]])
+                    _confirmar(batch)
+                    break
+                except ERROS_TRANSITORIOS:
+                    if tentativa == tentativas:
+                        raise
+                    conferir = True
+                    time.sleep(2 ** tentativa) # Espera crescente antes de tentar de novo
+
+        if ao_progresso:
+            ao_progresso(num_lote + 1, total_lotes)
+    return total_lotes
+
+
+# --- Edição em Lote ---
+
+CAMPOS_EDITAVEIS = ['data', 'tipo', 'categoria_principal', 'sub_categoria', 'descricao', 'valor', 'forma_pagamento']
+
+def _normalizar_edicao(df):
+    # Mesma representação dos dois lados da comparação: data ISO, valor em centavos, textos sem NaN
+    df = df[CAMPOS_EDITAVEIS].copy()
+    df['data'] = pd.to_datetime(df['data'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    df['valor'] = pd.to_numeric(df['valor'], errors='coerce').fillna(0).mul(100).round().astype('int64')
+    for coluna in ['tipo', 'categoria_principal', 'sub_categoria', 'descricao', 'forma_pagamento']:
+        df[coluna] = df[coluna].fillna('').astype(str).str.strip()
+    return df
+
+def diferencas_edicao(original, editado):
+    """Linhas alteradas na grade de edição: {id: argumentos de montar_registro}.
+
+    `original` e `editado` são indexados pelo id do documento e têm as colunas CAMPOS_EDITAVEIS.
+    A comparação é feita de uma vez sobre as colunas; só as linhas que mudaram viram gravações.
+    """
+    antes = _normalizar_edicao(original)
+    depois = _normalizar_edicao(editado.loc[original.index])
+    mudou = (antes != depois).any(axis=1)
+    return {
+        doc_id: [linha['data'], linha['tipo'], linha['categoria_principal'], linha['sub_categoria'],
+                 linha['descricao'], linha['valor'] / 100, linha['forma_pagamento']]
+        for doc_id, linha in depois[mudou].iterrows()
+    }
+
+def salvar_edicoes(db, alteracoes, excluidos=(), tamanho_pagina=TAMANHO_PAGINA_ESCOPO):
+    """Grava as alterações ({id: argumentos de montar_registro}) e exclusões da grade de edição.
+
+    Cada grupo de até `tamanho_pagina` documentos é uma transação: relê as versões atuais,
+    grava todas as alterações e exclusões e leva a diferença aos resumos e saldos em um único
+    commit. Documentos excluídos em outro aparelho no meio do caminho são ignorados.
+    Retorna quantos documentos foram gravados.
+    """
+    excluidos = set(excluidos)
+    operacoes = [(doc_id, None) for doc_id in excluidos]
+    operacoes += [(doc_id, argumentos) for doc_id, argumentos in alteracoes.items() if doc_id not in excluidos]
+    colecao = db.collection(COLECAO_TRANSACOES)
+
+    @firestore.transactional
+    def _gravar(transacao, grupo):
+        refs = [colecao.document(doc_id) for doc_id, _ in grupo]
+        antigos = {snap.id: snap for snap in instrumentacao.contados(db.get_all(refs, transaction=transacao))}
+        movimentos = []
+        gravados = 0
+        for doc_ref, (doc_id, argumentos) in zip(refs, grupo):
+            snap = antigos.get(doc_id)
+            if snap is None or not snap.exists:
+                continue
+            antigo = snap.to_dict()
+            movimentos.append((antigo, -1))
+            gravados += 1
+            if argumentos is None:
+                transacao.delete(doc_ref)
+                transacao.set(db.collection(COLECAO_EXCLUSOES).document(doc_id), _lapide())
+                continue
+            registro = montar_registro(*argumentos)
+            _manter_ocorrencia(antigo, registro)
+            registro['atualizado_em'] = firestore.SERVER_TIMESTAMP
+            transacao.update(doc_ref, registro)
+            movimentos.append((registro, 1))
+        _aplicar_movimentos(transacao, db, movimentos)
+        instrumentacao.contar_escritas(transacao)
+        return gravados
+
+    gravados = 0
+    for inicio in range(0, len(operacoes), tamanho_pagina):
+        gravados += _gravar(db.transaction(), operacoes[inicio:inicio + tamanho_pagina])
+    return gravados
+
+
+# --- Exclusão em Massa ---
+
+def excluir_em_massa(db, consulta, ao_progresso=None, com_movimentos=False, tamanho_pagina=None):
+    """Exclui os documentos da consulta em páginas, um commit em lote por página.
+
+    Sem `com_movimentos`, cada página lê só as referências (projeção no ID, sem os campos).
+    Com `com_movimentos` (exclusões parciais de transações), lê apenas os campos que entram
+    nos resumos e saldos, desconta-os e grava as lápides no mesmo commit.
+    Cada página já excluída some da consulta seguinte, então não há cursor a guardar: se a
+    execução cair no meio, chamar de novo continua de onde parou.
+    `ao_progresso(excluidos, total)` é chamado após cada commit. Retorna o total excluído.
+    """
+    if tamanho_pagina is None:
+        tamanho_pagina = TAMANHO_PAGINA_ESCOPO if com_movimentos else TAMANHO_LOTE
+    if com_movimentos:
+        pagina = consulta.select(['data', 'tipo', 'sub_categoria', 'forma_pagamento', 'valor'])
+    else:
+        pagina = _so_referencias(consulta)
+    pagina = pagina.limit(tamanho_pagina)
+
+    total = consulta.count().get()[0][0].value
+    instrumentacao.contar_leituras(1)
+    excluidos = 0
+    while True:
+        docs = list(instrumentacao.contados(pagina.stream()))
+        if not docs:
+            break
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+            if com_movimentos:
+                batch.set(db.collection(COLECAO_EXCLUSOES).document(doc.id), _lapide())
+        if com_movimentos:
+            _aplicar_movimentos(batch, db, [(doc.to_dict(), -1) for doc in docs])
+        _confirmar(batch)
+
+        excluidos += len(docs)
+        if ao_progresso:
+            ao_progresso(excluidos, max(total, excluidos))
+    return excluidos
+
+
+# --- Importações ---
+
+def registrar_importacao(db, lote, arquivo, quantidade, importado_em=None):
+    """Guarda o lote de uma importação, para poder desfazê-la depois (excluir_importacao).
+
+    `importado_em` só é passado ao restaurar um backup; sem ele, vale a hora do servidor.
+    """
+    db.collection(COLECAO_IMPORTACOES).document(lote).set({
+        'arquivo': arquivo,
+        'quantidade': quantidade,
+        'importado_em': importado_em or firestore.SERVER_TIMESTAMP
+    })
+    instrumentacao.contar_escritas(quantidade=1)
+
+def listar_importacoes(db):
+    """Importações registradas, da mais recente para a mais antiga."""
+    linhas = []
+    for doc in instrumentacao.contados(db.collection(COLECAO_IMPORTACOES).stream()):
+        dados = doc.to_dict()
+        linhas.append({'lote': doc.id, **dados})
+    return sorted(linhas, key=lambda linha: _texto(linha.get('importado_em')), reverse=True)
+
+
+# --- Gravação sem Conexão ---
+
+# Gravações que podem ir para a fila da réplica quando não há conexão (ver gravar/enviar_fila)
+OPERACOES = {
+    'adicionar': adicionar_transacao,
+    'atualizar': atualizar_transacao,
+    'excluir': excluir_transacao,
+    'editar_lote': salvar_edicoes
+}
+
+def gravar(db, operacao, *argumentos, replica=None):
+    """Executa uma das OPERACOES ('adicionar', 'atualizar', 'excluir', 'editar_lote') com seus argumentos.
+
+    Se o Firestore estiver inacessível e houver réplica local, a gravação vai para a fila
+    da réplica e é enviada por enviar_fila quando a conexão voltar. Retorna True se gravou
+    no Firestore e False se ficou na fila.
+    """
+    argumentos = list(argumentos)
+    if operacao == 'adicionar' and len(argumentos) == 7:
+        argumentos.append(db.collection(COLECAO_TRANSACOES).document().id)
+    try:
+        OPERACOES[operacao](db, *argumentos)
+        return True
+    except ERROS_CONEXAO:
+        if replica is None:
+            raise
+        logger.warning("Firestore inacessível; gravação '%s' enfileirada na réplica local", operacao)
+        replica.enfileirar(operacao, argumentos)
+        return False
+
+def enviar_fila(db, replica):
+    """Envia, em ordem, as gravações enfileiradas sem conexão. Para na primeira falha.
+
+    Adições levam o ID gerado na hora da gravação: se o documento já existe, o envio
+    anterior chegou ao servidor e não é repetido (evita somar duas vezes nos resumos).
+    Atualizações e exclusões releem o documento na transação, então repeti-las é seguro.
+    """
+    enviadas = 0
+    for seq, operacao, argumentos in replica.pendentes():
+        if operacao == 'adicionar' and instrumentacao.contar_leitura(db.collection(COLECAO_TRANSACOES).document(argumentos[-1]).get()).exists:
+            replica.remover_da_fila(seq)
+            continue
+        try:
+            OPERACOES[operacao](db, *argumentos)
+        except ERROS_CONEXAO:
+            raise
+        except Exception:
+            # Ex: atualização de um documento excluído em outro aparelho; não trava o resto da fila
+            logger.exception("Gravação enfileirada '%s' descartada", operacao)
+        else:
+            enviadas += 1
+        replica.remover_da_fila(seq)
+    return enviadas
+
+def _aplicar_movimentos(escrita, db, movimentos):
+    """Leva os movimentos (registro, sinal) de uma gravação aos resumos mensais, saldos e vocabulário."""
+    _aplicar_resumos(escrita, db, _deltas_resumo(movimentos))
+    _aplicar_saldos(escrita, db, _deltas_saldo(movimentos))
+    _aplicar_vocabulario(escrita, db, _deltas_vocabulario(movimentos))
+
+def _confirmar(batch):
+    instrumentacao.contar_escritas(batch)
+    return batch.commit()
+
+def _lapide():
+    # Marca de exclusão lida pela sincronização, apagada pelo TTL depois de RETENCAO_EXCLUSOES
+    return {'excluido_em': firestore.SERVER_TIMESTAMP, 'expira_em': datetime.now(timezone.utc) + RETENCAO_EXCLUSOES}
+
+def _so_referencias(consulta):
+    # Projeção só no ID: o Firestore não devolve os campos dos documentos
+    return consulta.select([FieldPath.document_id()])
+
+
+# --- Resumos Mensais ---
+# Totais por mês x tipo x sub_categoria x forma_pagamento, em centavos inteiros (sem deriva de float),
+# mantidos incrementalmente pelas gravações. O dashboard lê poucos documentos em vez das transações.
+
+def _texto(valor):
+    return '' if valor is None or pd.isnull(valor) else str(valor)
+
+def _mes(registro):
+    return _texto(registro.get('data'))[:7] or 'sem-data'
+
+def _centavos(valor):
+    valor = pd.to_numeric(valor, errors='coerce')
+    return 0 if pd.isnull(valor) else int(round(float(valor) * 100))
+
+def _chave_resumo(tipo, sub_cat, pagto):
+    # Hash curto: nomes de categoria podem ter '.', '/' etc., que complicam caminhos de campo
+    return hashlib.sha1(f"{tipo}|{sub_cat}|{pagto}".encode('utf-8')).hexdigest()[:16]
+
+def _deltas_resumo(movimentos):
+    """Soma os movimentos (registro, sinal) em {mes: {chave: entrada}}."""
+    deltas = {}
+    for registro, sinal in movimentos:
+        if not registro:
+            continue
+        tipo = _texto(registro.get('tipo'))
+        sub_cat = _texto(registro.get('sub_categoria'))
+        pagto = _texto(registro.get('forma_pagamento'))
+        entrada = deltas.setdefault(_mes(registro), {}).setdefault(_chave_resumo(tipo, sub_cat, pagto), {
+            'tipo': tipo, 'sub_categoria': sub_cat, 'forma_pagamento': pagto, 'centavos': 0, 'quantidade': 0
+        })
+        entrada['centavos'] += sinal * _centavos(registro.get('valor'))
+        entrada['quantidade'] += sinal
+    return deltas
+
+def _aplicar_resumos(escrita, db, deltas):
+    """Soma os deltas nos documentos de resumo via Increment (em um batch ou transação)."""
+    for mes, entradas in deltas.items():
+        totais = {}
+        for chave, entrada in entradas.items():
+            if not entrada['centavos'] and not entrada['quantidade']:
+                continue # Edição que não mudou nada no agregado
+            totais[chave] = {
+                **entrada,
+                'centavos': firestore.Increment(entrada['centavos']),
+                'quantidade': firestore.Increment(entrada['quantidade'])
+            }
+        if totais:
+            escrita.set(db.collection(COLECAO_RESUMOS).document(mes), {'totais': totais}, merge=True)
+
+def carregar_resumos(db):
+    """Lê todos os resumos mensais: uma leitura por mês, independente do número de transações."""
+    linhas = []
+    for doc in instrumentacao.contados(db.collection(COLECAO_RESUMOS).stream()):
+        for entrada in (doc.to_dict().get('totais') or {}).values():
+            if entrada.get('quantidade', 0) <= 0 and not entrada.get('centavos'):
+                continue # Combinação que ficou vazia depois de edições/exclusões
+            linhas.append({
+                'mes': doc.id,
+                'tipo': entrada.get('tipo', ''),
+                'sub_categoria': entrada.get('sub_categoria', ''),
+                'forma_pagamento': entrada.get('forma_pagamento', ''),
+                'centavos': int(entrada.get('centavos', 0)),
+                'quantidade': int(entrada.get('quantidade', 0))
+            })
+    df = pd.DataFrame(linhas, columns=COLUNAS_RESUMO[:-1])
+    df['valor'] = df['centavos'] / 100
+    return df
+
+def calcular_resumos(df):
+    """Calcula, a partir das transações (brutas ou tipadas), os mesmos totais guardados em resumos_mensais."""
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_RESUMO)
+    # Mês em texto como em _mes: datas ausentes viram '' (o astype(str) do pandas 3 as manteria nulas)
+    if 'centavos' in df.columns: # Frame de tipar_transacoes
+        mes, centavos = df['mes'].astype(object).fillna('').astype(str), df['centavos']
+    else:
+        # Arredonda linha a linha, como os Increment das gravações
+        mes = df['data'].astype(object).fillna('').astype(str).str[:7]
+        centavos = (pd.to_numeric(df['valor'], errors='coerce').fillna(0) * 100).round().astype('int64')
+    base = pd.DataFrame({
+        'mes': mes,
+        'tipo': df['tipo'].astype(object).fillna('').astype(str),
+        'sub_categoria': df['sub_categoria'].astype(object).fillna('').astype(str),
+        'forma_pagamento': df['forma_pagamento'].astype(object).fillna('').astype(str),
+        'centavos': centavos
+    })
+    base['mes'] = base['mes'].mask(base['mes'] == '', 'sem-data')
+    resumo = base.groupby(['mes', 'tipo', 'sub_categoria', 'forma_pagamento'], as_index=False).agg(
+        centavos=('centavos', 'sum'), quantidade=('centavos', 'size')
+    )
+    resumo['valor'] = resumo['centavos'] / 100
+    return resumo[COLUNAS_RESUMO]
+
+def somar_resumos(*resumos):
+    """Soma frames de calcular_resumos (ex: calculados página a página) em um só, no mesmo formato."""
+    chaves = ['mes', 'tipo', 'sub_categoria', 'forma_pagamento']
+    resumo = pd.concat([parte for parte in resumos if not parte.empty] or [pd.DataFrame(columns=COLUNAS_RESUMO)])
+    resumo = resumo.groupby(chaves, as_index=False)[['centavos', 'quantidade']].sum()
+    resumo['valor'] = resumo['centavos'] / 100
+    return resumo[COLUNAS_RESUMO]
+
+def verificar_resumos(atual, esperado):
+    """Linhas em que os resumos gravados (atual) divergem do recálculo (esperado)."""
+    chaves = ['mes', 'tipo', 'sub_categoria', 'forma_pagamento']
+    comparacao = atual[chaves + ['centavos', 'quantidade']].merge(
+        esperado[chaves + ['centavos', 'quantidade']], on=chaves, how='outer', suffixes=('_gravado', '_esperado')
+    ).fillna(0)
+    diferente = (comparacao['centavos_gravado'] != comparacao['centavos_esperado']) | \
+                (comparacao['quantidade_gravado'] != comparacao['quantidade_esperado'])
+    return comparacao[diferente].reset_index(drop=True)
+
+def reconstruir_resumos(db, df=None):
+    """Recalcula os resumos a partir de todas as transações e regrava a coleção do zero.
+
+    Retorna as divergências encontradas entre os resumos que estavam gravados e o recálculo
+    (vazio quando estava tudo consistente). `df` evita reler as transações se já foram lidas.
+    """
+    if df is None:
+        df = ler_todas_transacoes(db)
+    esperado = calcular_resumos(df)
+    divergencias = verificar_resumos(carregar_resumos(db), esperado)
+    _gravar_resumos(db, esperado)
+    return divergencias
+
+def _gravar_resumos(db, esperado):
+    # Sobrescreve a coleção com os totais de um frame de calcular_resumos, excluindo os meses que sumiram
+    colecao = db.collection(COLECAO_RESUMOS)
+    meses_antigos = {doc.id for doc in instrumentacao.contados(_so_referencias(colecao).stream())}
+    batch = db.batch()
+    escritas = 0
+    for mes, grupo in esperado.groupby('mes'):
+        totais = {}
+        for linha in grupo.itertuples(index=False):
+            totais[_chave_resumo(linha.tipo, linha.sub_categoria, linha.forma_pagamento)] = {
+                'tipo': linha.tipo,
+                'sub_categoria': linha.sub_categoria,
+                'forma_pagamento': linha.forma_pagamento,
+                'centavos': int(linha.centavos),
+                'quantidade': int(linha.quantidade)
+            }
+        batch.set(colecao.document(mes), {'totais': totais}) # Sobrescreve o documento inteiro
+        meses_antigos.discard(mes)
+        escritas += 1
+        if escritas == TAMANHO_LOTE:
+            _confirmar(batch)
+            batch = db.batch()
+            escritas = 0
+    for mes in meses_antigos:
+        batch.delete(colecao.document(mes))
+        escritas += 1
+        if escritas == TAMANHO_LOTE:
+            _confirmar(batch)
+            batch = db.batch()
+            escritas = 0
+    if escritas:
+        _confirmar(batch)
+
+
+# --- Saldos Correntes (VR / VA) ---
+# Cada conta guarda o total em centavos e o movimento líquido de cada mês. Os saldos de
+# fechamento por mês saem de uma soma acumulada na leitura, então consultar o saldo em
+# qualquer mês custa uma leitura por conta e uma busca direta no índice.
+
+def _deltas_saldo(movimentos):
+    """Soma os movimentos (registro, sinal) em {conta: {mes: centavos}}."""
+    deltas = {}
+    for registro, sinal in movimentos:
+        if not registro:
+            continue
+        for conta, nome in CONTAS_SALDO.items():
+            if registro.get('tipo') == 'Receita' and registro.get('sub_categoria') == nome:
+                fator = 1
+            elif registro.get('tipo') == 'Despesa' and registro.get('forma_pagamento') == nome:
+                fator = -1
+            else:
+                continue
+            meses = deltas.setdefault(conta, {})
+            mes = _mes(registro)
+            meses[mes] = meses.get(mes, 0) + sinal * fator * _centavos(registro.get('valor'))
+    return deltas
+
+def _aplicar_saldos(escrita, db, deltas):
+    for conta, meses in deltas.items():
+        meses = {mes: centavos for mes, centavos in meses.items() if centavos}
+        if not meses:
+            continue
+        escrita.set(db.collection(COLECAO_SALDOS).document(conta), {
+            'nome': CONTAS_SALDO[conta],
+            'centavos': firestore.Increment(sum(meses.values())),
+            'meses': {mes: firestore.Increment(centavos) for mes, centavos in meses.items()}
+        }, merge=True)
+
+def _fechamentos(meses):
+    """Saldo em centavos no fim de cada mês, com todos os meses do intervalo preenchidos."""
+    movimento = pd.Series(meses, dtype='int64')
+    # Meses zerados (ex: esvaziados por excluir_mes) não estendem o intervalo, como no recálculo
+    movimento = movimento[(movimento.index != 'sem-data') & (movimento != 0)]
+    if movimento.empty:
+        return movimento
+    movimento.index = pd.PeriodIndex(movimento.index, freq='M')
+    intervalo = pd.period_range(movimento.index.min(), movimento.index.max(), freq='M')
+    return movimento.groupby(level=0).sum().reindex(intervalo, fill_value=0).cumsum()
+
+def carregar_saldos(db):
+    """Lê os saldos correntes: {conta: {'nome', 'total', 'fechamentos'}}, valores em reais.
+
+    'fechamentos' é uma Series indexada por mês (Period) com o saldo no fim de cada mês.
+    """
+    saldos = {}
+    for doc in instrumentacao.contados(db.collection(COLECAO_SALDOS).stream()):
+        dados = doc.to_dict()
+        saldos[doc.id] = {
+            'nome': dados.get('nome', CONTAS_SALDO.get(doc.id, doc.id)),
+            'total': int(dados.get('centavos', 0)) / 100,
+            'fechamentos': _fechamentos(dados.get('meses') or {}) / 100
+        }
+    return saldos
+
+def saldos_calculados(df):
+    """Mesmo formato de carregar_saldos, calculado das transações (ex: réplica local sem conexão)."""
+    return {
+        conta: {
+            'nome': CONTAS_SALDO[conta],
+            'total': sum(meses.values()) / 100,
+            'fechamentos': _fechamentos(meses) / 100
+        }
+        for conta, meses in calcular_saldos(df).items()
+    }
+
+def saldo_em(saldo, mes):
+    """Saldo da conta no fim do mês ('YYYY-MM'), a partir de um item de carregar_saldos."""
+    fechamentos = saldo['fechamentos']
+    if fechamentos.empty:
+        return 0.0
+    periodo = pd.Period(mes, freq='M')
+    if periodo < fechamentos.index[0]:
+        return 0.0
+    if periodo > fechamentos.index[-1]:
+        return float(fechamentos.iloc[-1])
+    return float(fechamentos.loc[periodo])
+
+def calcular_saldos(df):
+    """Movimento mensal de cada conta recalculado das transações brutas: {conta: {mes: centavos}}."""
+    if df.empty:
+        return {conta: {} for conta in CONTAS_SALDO}
+    return _saldos_do_resumo(calcular_resumos(df))
+
+def _saldos_do_resumo(resumo):
+    # Entradas: receitas da categoria do vale. Saídas: despesas pagas com ele
+    saldos = {}
+    for conta, nome in CONTAS_SALDO.items():
+        entradas = resumo[(resumo['tipo'] == 'Receita') & (resumo['sub_categoria'] == nome)]
+        saidas = resumo[(resumo['tipo'] == 'Despesa') & (resumo['forma_pagamento'] == nome)]
+        movimento = entradas.groupby('mes')['centavos'].sum().sub(saidas.groupby('mes')['centavos'].sum(), fill_value=0)
+        saldos[conta] = {mes: int(c) for mes, c in movimento.items() if c}
+    return saldos
+
+def reconstruir_saldos(db, df=None):
+    """Confere os saldos correntes contra o recálculo completo e regrava os documentos.
+
+    Retorna {conta: (total_gravado, total_recalculado)} das contas que divergiam, em reais.
+    """
+    if df is None:
+        df = ler_todas_transacoes(db)
+    esperado = calcular_saldos(df)
+
+    colecao = db.collection(COLECAO_SALDOS)
+    batch = db.batch()
+    divergencias = {}
+    for conta, meses in esperado.items():
+        snap = instrumentacao.contar_leitura(colecao.document(conta).get())
+        gravado = snap.to_dict() if snap.exists else {}
+        gravado_meses = {mes: c for mes, c in (gravado.get('meses') or {}).items() if c}
+        total = sum(meses.values())
+        if int(gravado.get('centavos', 0)) != total or gravado_meses != meses:
+            divergencias[conta] = (int(gravado.get('centavos', 0)) / 100, total / 100)
+        batch.set(colecao.document(conta), {'nome': CONTAS_SALDO[conta], 'centavos': total, 'meses': meses})
+    _confirmar(batch)
+    return divergencias
+
+
+# --- Vocabulário (Categorias e Formas de Pagamento) ---
+# Um único documento com as sub_categorias por tipo e as formas de pagamento já usadas, cada uma
+# com a quantidade de transações, mantido pelas gravações como os resumos. Os formulários leem
+# esse documento em vez de varrer as transações para montar as listas.
+
+def _chave_vocabulario(*partes):
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()[:16]
+
+def _deltas_vocabulario(movimentos):
+    """Soma os movimentos (registro, sinal) em {'categorias': {chave: entrada}, 'pagamentos': {...}}."""
+    deltas = {'categorias': {}, 'pagamentos': {}}
+    for registro, sinal in movimentos:
+        if not registro:
+            continue
+        tipo = _texto(registro.get('tipo'))
+        sub_cat = _texto(registro.get('sub_categoria'))
+        pagto = _texto(registro.get('forma_pagamento'))
+        if sub_cat:
+            entrada = deltas['categorias'].setdefault(_chave_vocabulario(tipo, sub_cat), {'tipo': tipo, 'nome': sub_cat, 'quantidade': 0})
+            entrada['quantidade'] += sinal
+        if pagto:
+            entrada = deltas['pagamentos'].setdefault(_chave_vocabulario(pagto), {'nome': pagto, 'quantidade': 0})
+            entrada['quantidade'] += sinal
+    return deltas
+
+def _aplicar_vocabulario(escrita, db, deltas):
+    campos = {}
+    for grupo, entradas in deltas.items():
+        entradas = {
+            chave: {**entrada, 'quantidade': firestore.Increment(entrada['quantidade'])}
+            for chave, entrada in entradas.items() if entrada['quantidade']
+        }
+        if entradas:
+            campos[grupo] = entradas
+    if campos:
+        escrita.set(db.collection(COLECAO_META).document(DOC_VOCABULARIO), campos, merge=True)
+
+def _listas_vocabulario(dados):
+    """Documento do vocabulário -> {'categorias': {tipo: [nomes]}, 'pagamentos': [nomes]}, mais usados primeiro."""
+    categorias = {}
+    for entrada in sorted((dados.get('categorias') or {}).values(), key=lambda e: (-e['quantidade'], e['nome'])):
+        if entrada['quantidade'] > 0:
+            categorias.setdefault(entrada['tipo'], []).append(entrada['nome'])
+    pagamentos = [
+        entrada['nome'] for entrada in sorted((dados.get('pagamentos') or {}).values(), key=lambda e: (-e['quantidade'], e['nome']))
+        if entrada['quantidade'] > 0
+    ]
+    return {'categorias': categorias, 'pagamentos': pagamentos}
+
+def carregar_vocabulario(db):
+    """Lê o vocabulário (ver _listas_vocabulario), ou None se o documento ainda não existe."""
+    snap = instrumentacao.contar_leitura(db.collection(COLECAO_META).document(DOC_VOCABULARIO).get())
+    return _listas_vocabulario(snap.to_dict()) if snap.exists else None
+
+def calcular_vocabulario(df):
+    """Conteúdo do documento do vocabulário recalculado das transações (brutas ou tipadas)."""
+    if df.empty:
+        return {'categorias': {}, 'pagamentos': {}}
+    base = pd.DataFrame({
+        coluna: df[coluna].astype(object).fillna('').astype(str)
+        for coluna in ['tipo', 'sub_categoria', 'forma_pagamento']
+    })
+    categorias = base[base['sub_categoria'] != ''].groupby(['tipo', 'sub_categoria']).size()
+    pagamentos = base[base['forma_pagamento'] != ''].groupby('forma_pagamento').size()
+    return _vocabulario_de_contagens(categorias, pagamentos)
+
+def _vocabulario_do_resumo(resumo):
+    # As quantidades do resumo já são contagens de transações por tipo/categoria e por pagamento
+    categorias = resumo[resumo['sub_categoria'] != ''].groupby(['tipo', 'sub_categoria'])['quantidade'].sum()
+    pagamentos = resumo[resumo['forma_pagamento'] != ''].groupby('forma_pagamento')['quantidade'].sum()
+    return _vocabulario_de_contagens(categorias, pagamentos)
+
+def _vocabulario_de_contagens(categorias, pagamentos):
+    return {
+        'categorias': {
+            _chave_vocabulario(tipo, nome): {'tipo': tipo, 'nome': nome, 'quantidade': int(quantidade)}
+            for (tipo, nome), quantidade in categorias.items()
+        },
+        'pagamentos': {
+            _chave_vocabulario(nome): {'nome': nome, 'quantidade': int(quantidade)}
+            for nome, quantidade in pagamentos.items()
+        }
+    }
+
+def vocabulario_calculado(df):
+    """Mesmo formato de carregar_vocabulario, calculado das transações (ex: réplica local sem conexão)."""
+    return _listas_vocabulario(calcular_vocabulario(df))
+
+def reconstruir_vocabulario(db, df=None):
+    """Regrava o vocabulário a partir das transações. Retorna quantos nomes ele tem."""
+    if df is None:
+        df = ler_todas_transacoes(db)
+    dados = calcular_vocabulario(df)
+    db.collection(COLECAO_META).document(DOC_VOCABULARIO).set(dados)
+    instrumentacao.contar_escritas(quantidade=1)
+    return len(dados['categorias']) + len(dados['pagamentos'])
+
+def gravar_agregados(db, resumo):
+    """Regrava resumos mensais, saldos e vocabulário a partir de um frame de calcular_resumos.
+
+    Para transações gravadas sem os movimentos (salvar_em_lotes com `com_movimentos=False`, na
+    restauração de um backup): os totais somados à parte vão para o banco de uma vez, em uma
+    escrita por mês e por conta. Sobrescreve os documentos, então repetir a chamada não soma nada duas vezes.
+    """
+    _gravar_resumos(db, resumo)
+    colecao = db.collection(COLECAO_SALDOS)
+    batch = db.batch()
+    for conta, meses in _saldos_do_resumo(resumo).items():
+        batch.set(colecao.document(conta), {'nome': CONTAS_SALDO[conta], 'centavos': sum(meses.values()), 'meses': meses})
+    _confirmar(batch)
+    db.collection(COLECAO_META).document(DOC_VOCABULARIO).set(_vocabulario_do_resumo(resumo))
+    instrumentacao.contar_escritas(quantidade=1)
+
+
+# --- Regras de Categorização ---
+
+def carregar_regras(db):
+    """Regras da categorização automática: [{'padrao', 'sub_categoria', 'categoria_principal', 'forma_pagamento'}]."""
+    snap = instrumentacao.contar_leitura(db.collection(COLECAO_META).document(DOC_REGRAS).get())
+    return (snap.to_dict().get('regras') or []) if snap.exists else []
+
+def salvar_regras(db, regras):
+    db.collection(COLECAO_META).document(DOC_REGRAS).set({
+        'regras': regras,
+        'atualizado_em': firestore.SERVER_TIMESTAMP
+    })
+    instrumentacao.contar_escritas(quantidade=1)
+
+
+# --- Consultas por Período ---
+
+def limites_mes(mes):
+    """'YYYY-MM' -> ('YYYY-MM-01', 1º dia do mês seguinte), no formato ISO do campo 'data'."""
+    periodo = pd.Period(mes, freq='M')
+    return periodo.start_time.strftime('%Y-%m-%d'), (periodo + 1).start_time.strftime('%Y-%m-%d')
+
+def _ler_documentos(consulta):
+    items = []
+    for doc in instrumentacao.contados(consulta.stream()):
+        item = doc.to_dict()
+        item['id'] = doc.id # Guarda o ID para poder editar/excluir depois
+        items.append(item)
+    return items
+
+def ler_todas_transacoes(db):
+    """Leitura completa da coleção, sem cache (usada nas reconstruções e conferências)."""
+    items = _ler_documentos(db.collection(COLECAO_TRANSACOES))
+    return pd.DataFrame(items) if items else pd.DataFrame(columns=COLUNAS_TRANSACAO)
+
+def existem_transacoes(db):
+    """Se há ao menos uma transação, com uma leitura (sem baixar a coleção)."""
+    consulta = _so_referencias(db.collection(COLECAO_TRANSACOES).limit(1))
+    return next(iter(instrumentacao.contados(consulta.stream())), None) is not None
+
+def carregar_periodo(db, inicio_iso, fim_iso, tipos=None):
+    """Transações com inicio_iso <= data < fim_iso, filtradas no servidor.
+
+    Como 'data' é string ISO (YYYY-MM-DD), a ordem de texto é a ordem cronológica e o filtro
+    de intervalo usa o índice automático de campo único. Filtrar também por `tipos` exige o
+    índice composto (tipo ASC, data DESC) de firestore.indexes.json
+    (`firebase deploy --only firestore:indexes`). Enquanto ele não existir, o Firestore
+    responde FailedPrecondition: a consulta é refeita só por data e os tipos filtrados aqui.
+    """
+    consulta = db.collection(COLECAO_TRANSACOES) \
+        .where(filter=firestore.FieldFilter('data', '>=', inicio_iso)) \
+        .where(filter=firestore.FieldFilter('data', '<', fim_iso))
+
+    items = None
+    if tipos:
+        try:
+            items = _ler_documentos(
+                consulta.where(filter=firestore.FieldFilter('tipo', 'in', list(tipos)))
+                .order_by('data', direction=firestore.Query.DESCENDING)
+            )
+        except FailedPrecondition as e:
+            logger.warning("Índice composto (tipo, data) ausente; filtrando tipos localmente: %s", e)
+    if items is None:
+        items = _ler_documentos(consulta)
+
+    df = pd.DataFrame(items) if items else pd.DataFrame(columns=COLUNAS_TRANSACAO)
+    if tipos:
+        df = df[df['tipo'].isin(tipos)]
+    return df.reset_index(drop=True)
+
+def carregar_mes(db, mes, tipos=None):
+    """Transações de um mês ('YYYY-MM'): leituras proporcionais ao mês, não ao histórico."""
+    return carregar_periodo(db, *limites_mes(mes), tipos=tipos)
+
+
+# --- Frame Tipado ---
+
+COLUNAS_CATEGORICAS = ['tipo', 'categoria_principal', 'sub_categoria', 'forma_pagamento']
+
+def tipar_transacoes(df):
+    """Frame compacto usado pelas telas, montado uma vez a partir dos documentos brutos.
+
+    Colunas: id, data (datetime64), mes (Period mensal), as COLUNAS_CATEGORICAS como
+    'category', descricao e centavos (int64, sem deriva de float). Os demais campos dos
+    documentos (criado_em, impressao, lote_importacao...) ficam de fora.
+    O frame é compartilhado entre os reruns: filtre e use assign, nunca altere colunas nele.
+    """
+    df = df.reindex(columns=COLUNAS_TRANSACAO)
+    data = pd.to_datetime(df['data'], errors='coerce')
+    tipado = pd.DataFrame({
+        'id': df['id'],
+        'data': data,
+        'mes': data.dt.to_period('M'),
+        **{coluna: df[coluna].astype('category') for coluna in COLUNAS_CATEGORICAS},
+        'descricao': df['descricao'].fillna('').astype(str),
+        # Arredonda linha a linha, como os Increment dos resumos
+        'centavos': pd.to_numeric(df['valor'], errors='coerce').fillna(0).mul(100).round().astype('int64')
+    })
+    return tipado.reset_index(drop=True)
+
+
+# --- Carregamento Incremental ---
+
+def _mais_recente(atual, candidato):
+    if candidato is None or pd.isnull(candidato):
+        return atual
+    if atual is None or candidato > atual:
+        return candidato
+    return atual
+
+def _proxima_marca(marca, inicio):
+    # A alteração mais recente já lida, limitada ao início da leitura menos a margem: o que foi
+    # gravado muito antes não volta na próxima consulta, e o que foi gravado durante ela não se perde
+    limite = inicio - MARGEM_SINCRONIA
+    return limite if marca is None or marca > limite else marca
+
+def _vazio(valor):
+    # Campos ausentes no documento viram NaN no DataFrame
+    return not isinstance(valor, (list, dict)) and pd.isnull(valor)
+
+def _mesclar(df, novos, excluidos):
+    """Aplica ao DataFrame os documentos alterados (upsert por id) e remove os excluídos."""
+    remover = set(excluidos) | {item['id'] for item in novos}
+    if not df.empty and remover:
+        df = df[~df['id'].isin(remover)]
+    if novos:
+        df_novos = pd.DataFrame(novos)
+        df = df_novos if df.empty else pd.concat([df, df_novos], ignore_index=True)
+    return df.reset_index(drop=True)
+
+
+class CacheTransacoes:
+    """Mantém o DataFrame de transações entre os reruns e busca só o que mudou.
+
+    A primeira carga lê a coleção inteira. As seguintes consultam apenas os documentos com
+    'atualizado_em' depois da marca d'água e as lápides de 'exclusoes' do mesmo intervalo.
+    Um 'reset_em' novo em meta/sincronizacao (gravado por excluir_tudo) força a recarga completa,
+    e também uma marca d'água mais antiga que RETENCAO_EXCLUSOES (as lápides podem ter expirado).
+
+    As gravações do próprio app passam por `gravar`/`incluir`, que aplicam o resultado direto
+    no frame assim que o commit é confirmado: o rerun seguinte já mostra a mudança, sem esperar
+    nem consultar o Firestore. A marca d'água não avança, então a sincronização seguinte traz a
+    versão do servidor (com os timestamps reais) por cima da versão local.
+
+    Com uma `replica` (replica.ReplicaLocal), o estado sincronizado também fica em disco: o app
+    abre a partir dele e só puxa o delta, e continua servindo a última cópia se o Firestore
+    estiver inacessível (`offline`). A fila de gravações da réplica é enviada antes de cada
+    sincronização e, quando o app abre a partir da réplica, reaplicada ao frame.
+    """
+
+    def __init__(self, intervalo_sincronia=30, replica=None):
+        # Segundos em que o cache é servido sem consultar o Firestore (salvo se invalidado)
+        self.intervalo_sincronia = intervalo_sincronia
+        self.replica = replica
+        self.df = None
+        self._tipado = None
+        self._tipado_de = None
+        self.versao = 0  # Muda a cada novo frame tipado (chave para caches derivados dele)
+        self.marca_dagua = None
+        self.reset_visto = None
+        self.proxima_sincronia = 0.0
+        self.offline = False
+        self._trava = threading.RLock()
+        self._thread = None
+
+    def invalidar(self):
+        """Força a sincronização na próxima leitura. Chamar depois de toda gravação local."""
+        self.proxima_sincronia = 0.0
+
+    def atualizar(self, db):
+        """Sincroniza com o Firestore se o intervalo venceu (ou se foi invalidado)."""
+        with self._trava:
+            if self.df is None and self.replica is not None:
+                estado = self.replica.carregar()
+                if estado is not None:
+                    self.df, self.marca_dagua, self.reset_visto = estado
+                    # A réplica guarda só o estado do servidor: as gravações ainda na fila (feitas
+                    # sem conexão antes de o app fechar) voltam ao frame até serem enviadas
+                    agora = datetime.now(timezone.utc)
+                    for _, operacao, argumentos in self.replica.pendentes():
+                        self._aplicar_gravacao(operacao, argumentos, agora)
+            try:
+                if self.df is None:
+                    with instrumentacao.medir('firestore.carga_completa'):
+                        self._carga_completa(db)
+                elif time.monotonic() >= self.proxima_sincronia:
+                    with instrumentacao.medir('firestore.sincronizacao'):
+                        if self.replica is not None:
+                            enviar_fila(db, self.replica)
+                        self._sincronizar(db)
+                self.offline = False
+            except ERROS_CONEXAO:
+                if self.df is None:
+                    raise
+                logger.warning("Firestore inacessível; servindo a cópia local das transações")
+                self.offline = True
+                self.proxima_sincronia = time.monotonic() + self.intervalo_sincronia
+
+    def gravar(self, db, operacao, *argumentos):
+        """dados.gravar com a réplica do cache, aplicando a alteração no frame em seguida.
+
+        Também vale para gravações que ficaram na fila sem conexão: o app mostra o que o
+        usuário fez, e a fila é enviada antes da próxima sincronização. Retorna o mesmo que gravar.
+        """
+        argumentos = list(argumentos)
+        if operacao == 'adicionar' and len(argumentos) == 7:
+            # ID gerado aqui, para a versão local e a do servidor serem o mesmo documento
+            argumentos.append(db.collection(COLECAO_TRANSACOES).document().id)
+        gravado = gravar(db, operacao, *argumentos, replica=self.replica)
+
+        with self._trava:
+            if self.df is not None:
+                self._aplicar_gravacao(operacao, argumentos, datetime.now(timezone.utc))
+        return gravado
+
+    def _aplicar_gravacao(self, operacao, argumentos, agora):
+        # Versão local de uma gravação de OPERACOES ('adicionar' já com o ID nos argumentos)
+        novos, excluidos = [], []
+        if operacao == 'adicionar':
+            novos.append({**montar_registro(*argumentos[:7]), 'id': argumentos[7], 'criado_em': agora, 'atualizado_em': agora})
+        elif operacao == 'atualizar':
+            novos = self._editados({argumentos[0]: argumentos[1:]}, agora)
+        elif operacao == 'excluir':
+            excluidos.append(argumentos[0])
+        elif operacao == 'editar_lote':
+            alteracoes, excluidos = argumentos
+            novos = self._editados({doc_id: args for doc_id, args in alteracoes.items() if doc_id not in excluidos}, agora)
+        self.df = _mesclar(self.df, novos, excluidos)
+
+    def incluir(self, registros, ids):
+        """Aplica ao frame os registros que salvar_em_lotes acabou de gravar nos `ids`."""
+        agora = datetime.now(timezone.utc)
+        novos = [{**registro, 'id': doc_id, 'criado_em': agora, 'atualizado_em': agora} for doc_id, registro in zip(ids, registros)]
+        with self._trava:
+            if self.df is not None:
+                self.df = _mesclar(self.df, novos, [])
+
+    def _editados(self, alteracoes, agora):
+        # Versão local dos documentos editados: campos anteriores (criado_em, lote...) + os novos
+        if self.df.empty or not alteracoes:
+            return []
+        anteriores = self.df[self.df['id'].isin(list(alteracoes))].to_dict('records')
+        novos = []
+        for anterior in anteriores:
+            anterior = {campo: valor for campo, valor in anterior.items() if not _vazio(valor)}
+            registro = montar_registro(*alteracoes[anterior['id']])
+            _manter_ocorrencia(anterior, registro)
+            novos.append({**anterior, **registro, 'atualizado_em': agora})
+        return novos
+
+    def carregar(self, db):
+        """Frame tipado (tipar_transacoes), refeito só quando as transações mudaram."""
+        self.atualizar(db)
+        with self._trava:
+            # Toda alteração troca self.df por um frame novo, então a identidade basta
+            if self._tipado_de is not self.df:
+                with instrumentacao.medir('frame.tipar', linhas=len(self.df)):
+                    self._tipado = tipar_transacoes(self.df)
+                self._tipado_de = self.df
+                self.versao += 1
+            return self._tipado
+
+    def iniciar_sincronia(self, db):
+        """Sincroniza em segundo plano (thread daemon), para os reruns não esperarem pela rede."""
+        if self._thread is not None:
+            return
+
+        def _laco():
+            while True:
+                time.sleep(self.intervalo_sincronia)
+                try:
+                    self.atualizar(db)
+                except Exception:
+                    logger.exception("Falha na sincronização em segundo plano")
+
+        self._thread = threading.Thread(target=_laco, name='sincronia-transacoes', daemon=True)
+        self._thread.start()
+
+    def _ler_reset(self, db):
+        snap = instrumentacao.contar_leitura(db.collection(COLECAO_META).document(DOC_SINCRONIZACAO).get())
+        return snap.to_dict().get('reset_em') if snap.exists else None
+
+    def _carga_completa(self, db):
+        inicio = datetime.now(timezone.utc)
+        reset = self._ler_reset(db)
+
+        items = _ler_documentos(db.collection(COLECAO_TRANSACOES))
+        marca = None
+        for item in items:
+            marca = _mais_recente(marca, item.get('atualizado_em'))
+
+        self.df = pd.DataFrame(items)
+        # Documentos antigos não têm 'atualizado_em'; sem nenhuma marca, parte do início da carga
+        self.marca_dagua = _proxima_marca(marca, inicio)
+        self.reset_visto = reset
+        self.proxima_sincronia = time.monotonic() + self.intervalo_sincronia
+        if self.replica is not None:
+            self.replica.substituir(items, self.marca_dagua, self.reset_visto)
+
+    def _sincronizar(self, db):
+        inicio = datetime.now(timezone.utc)
+        reset = self._ler_reset(db)
+        if reset is not None and (self.reset_visto is None or reset > self.reset_visto):
+            self._carga_completa(db)
+            return
+        if self.marca_dagua is None or self.marca_dagua < inicio - RETENCAO_EXCLUSOES + MARGEM_SINCRONIA:
+            # Exclusões desde a marca d'água podem já não ter lápide (ex: réplica muito tempo sem conexão)
+            self._carga_completa(db)
+            return
+
+        desde = self.marca_dagua
+        marca = self.marca_dagua
+
+        alterados = {}
+        consulta = db.collection(COLECAO_TRANSACOES).where(filter=firestore.FieldFilter('atualizado_em', '>', desde))
+        for item in _ler_documentos(consulta):
+            alterados[item['id']] = item
+            marca = _mais_recente(marca, item.get('atualizado_em'))
+
+        excluidos = []
+        consulta = db.collection(COLECAO_EXCLUSOES).where(filter=firestore.FieldFilter('excluido_em', '>', desde))
+        for doc in instrumentacao.contados(consulta.stream()):
+            excluido_em = doc.to_dict().get('excluido_em')
+            marca = _mais_recente(marca, excluido_em)
+            item = alterados.get(doc.id)
+            atualizado_em = item.get('atualizado_em') if item else None
+            # Um documento recriado depois da exclusão continua valendo
+            if atualizado_em is not None and excluido_em is not None and atualizado_em > excluido_em:
+                continue
+            alterados.pop(doc.id, None)
+            excluidos.append(doc.id)
+
+        self.df = _mesclar(self.df, list(alterados.values()), excluidos)
+        self.marca_dagua = _proxima_marca(marca, inicio)
+        self.proxima_sincronia = time.monotonic() + self.intervalo_sincronia
+        if self.replica is not None and (alterados or excluidos):
+            self.replica.aplicar(list(alterados.values()), excluidos, self.marca_dagua, self.reset_visto)
@@ -0,0 +1,174 @@
+"""Leitura e normalização dos extratos/faturas importados do Excel, feita por coluna (sem laço por linha)."""
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+TIPO_EXTRATO = "Extrato Bancário (Misturado)"
+TIPO_FATURA = "Fatura Cartão de Crédito (Apenas Despesas)"
+
+
+# --- Leitura da Planilha ---
+
+def ler_grade(conteudo, nome_arquivo, limite_linhas=None):
+    """Lê a primeira aba como grade bruta (sem cabeçalho), até `limite_linhas` linhas.
+
+    Arquivos .xlsx são lidos pelo iterador somente-leitura do openpyxl, linha a linha: a
+    pré-visualização só percorre as primeiras linhas e o arquivo inteiro nunca vira um
+    modelo de células em memória. Arquivos .xls (formato antigo) passam pelo pandas/xlrd.
+    """
+    if not nome_arquivo.lower().endswith('.xlsx'):
+        return pd.read_excel(BytesIO(conteudo), header=None, nrows=limite_linhas)
+
+    livro = openpyxl.load_workbook(BytesIO(conteudo), read_only=True, data_only=True)
+    try:
+        linhas = []
+        for linha in livro.worksheets[0].iter_rows(values_only=True):
+            linhas.append(linha)
+            if limite_linhas is not None and len(linhas) >= limite_linhas:
+                break
+    finally:
+        livro.close()
+
+    # Linhas vazias no fim da aba (formatação sobrando) não são dados
+    while linhas and all(celula is None for celula in linhas[-1]):
+        linhas.pop()
+    return pd.DataFrame(linhas)
+
+def aplicar_cabecalho(grade, pular_linhas):
+    """Equivalente a pd.read_excel(skiprows=pular_linhas) sobre a grade já lida.
+
+    A linha seguinte às puladas vira o cabeçalho; nomes vazios e repetidos recebem os
+    mesmos nomes que o pandas daria ('Unnamed: 2', 'Valor.1').
+    """
+    corpo = grade.iloc[pular_linhas:]
+    if corpo.empty:
+        return pd.DataFrame()
+
+    nomes = []
+    vistos = {}
+    for i, nome in enumerate(corpo.iloc[0]):
+        nome = f"Unnamed: {i}" if pd.isna(nome) else nome
+        repeticoes = vistos.get(nome, 0)
+        vistos[nome] = repeticoes + 1
+        nomes.append(f"{nome}.{repeticoes}" if repeticoes else nome)
+
+    df = corpo.iloc[1:].reset_index(drop=True)
+    df.columns = nomes
+    return df.infer_objects()
+
+
+# --- Normalização ---
+
+
+def _textos(serie):
+    """Valores de texto da série, sem espaços nas pontas; NaN onde a célula não é texto."""
+    vazia = pd.Series(np.nan, index=serie.index, dtype=object)
+    if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+        return vazia
+    try:
+        return serie.str.strip()
+    except AttributeError: # Coluna sem nenhum texto (ex: só datas do Excel)
+        return vazia
+
+def normalizar_valores(serie):
+    """Converte a coluna de valores para float. Células que não viram número ficam NaN."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+
+    texto = serie.astype(str)
+    # Remove R$, $ e espaços (inclusive o espaço não separável que o Excel usa)
+    texto = texto.str.replace(r'R\$|\$|\s', '', regex=True)
+    # Ajusta vírgula decimal (Brasil: 1.000,00 -> 1000.00)
+    milhar_brasileiro = texto.str.contains(',', regex=False) & texto.str.contains('.', regex=False)
+    texto = texto.mask(milhar_brasileiro, texto.str.replace('.', '', regex=False))
+    texto = texto.str.replace(',', '.', regex=False)
+    return pd.to_numeric(texto, errors='coerce').astype(float)
+
+def normalizar_datas(serie, ano_extrato, mes_extrato):
+    """Converte a coluna de datas para datetime64. Células que não viram data ficam NaT.
+
+    Datas curtas (dd/mm, comuns no Bradesco) recebem o ano do extrato, ou o anterior quando
+    o mês da transação fica muito à frente do mês de referência (compra de dezembro na
+    fatura de janeiro).
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return pd.to_datetime(serie)
+
+    textos = _textos(serie)
+
+    partes = textos.str.extract(r'^(\d{1,2})/(\d{1,2})$')
+    curtas = partes[0].notna()
+    if curtas.any():
+        mes = partes.loc[curtas, 1].astype(int)
+        ano = pd.Series(np.where(mes > mes_extrato + 6, ano_extrato - 1, ano_extrato), index=mes.index)
+        textos = textos.copy()
+        textos[curtas] = partes.loc[curtas, 0].str.zfill(2) + '/' + partes.loc[curtas, 1].str.zfill(2) + '/' + ano.astype(str)
+
+    # Uma única conversão para o formato brasileiro, que é o caso comum
+    datas = pd.to_datetime(textos, format='%d/%m/%Y', errors='coerce')
+
+    iso = datas.isna() & textos.str.match(r'^\d{4}-\d{2}-\d{2}', na=False)
+    if iso.any(): # Ex: 2024-01-05, 2024-01-05 10:30 (ano primeiro: o dayfirst as inverteria)
+        datas[iso] = pd.to_datetime(textos[iso], format='ISO8601', utc=True, errors='coerce').dt.tz_localize(None)
+
+    outros_formatos = textos.notna() & datas.isna()
+    if outros_formatos.any(): # Ex: 5/1/24, 05-01-2024
+        datas[outros_formatos] = pd.to_datetime(textos[outros_formatos], format='mixed', dayfirst=True, errors='coerce')
+
+    nao_textos = textos.isna() & serie.notna()
+    if nao_textos.any(): # Células que o Excel já entregou como data
+        datas[nao_textos] = pd.to_datetime(serie[nao_textos], errors='coerce')
+    return datas
+
+def normalizar_importacao(df_import, col_data, col_desc, col_valor, ano_extrato, mes_extrato,
+                          data_fixa=None, adicionar_data_desc=False):
+    """Gera o frame limpo (data, descricao, valor) das linhas da planilha.
+
+    Retorna (df_limpo, invalidas): `invalidas` é a máscara booleana, alinhada ao df_limpo,
+    das linhas cuja data ou valor não puderam ser lidos. Linhas totalmente vazias são descartadas.
+    Com `data_fixa`, todas as linhas recebem essa data e só o valor é validado.
+    """
+    vazias = df_import[[col_data, col_desc, col_valor]].isna().all(axis=1)
+    df_import = df_import[~vazias]
+
+    df_limpo = pd.DataFrame(index=df_import.index)
+    if data_fixa is not None:
+        df_limpo['data'] = pd.Series(pd.Timestamp(data_fixa), index=df_import.index)
+    else:
+        df_limpo['data'] = normalizar_datas(df_import[col_data], ano_extrato, mes_extrato)
+
+    df_limpo['descricao'] = df_import[col_desc].fillna('').astype(str).str.strip()
+    if adicionar_data_desc:
+        df_limpo['descricao'] = df_limpo['descricao'] + " (Ref: " + df_import[col_data].astype(str) + ")"
+
+    df_limpo['valor'] = normalizar_valores(df_import[col_valor])
+
+    invalidas = df_limpo['data'].isna() | df_limpo['valor'].isna()
+    return df_limpo, invalidas
+
+def classificar_lancamentos(df_limpo, tipo_importacao, cat_princ_fatura=None):
+    """Define tipo, categorias e forma de pagamento das linhas normalizadas.
+
+    No extrato bancário, valores negativos são despesas (Débito/PIX) e os demais receitas
+    (Depósito). Na fatura do cartão, tudo é despesa. Retorna as colunas de montar_registro.
+    """
+    df = pd.DataFrame(index=df_limpo.index)
+    df['data'] = df_limpo['data'].dt.strftime('%Y-%m-%d')
+
+    if tipo_importacao == TIPO_EXTRATO:
+        negativo = df_limpo['valor'] < 0
+        df['tipo'] = np.where(negativo, "Despesa", "Receita")
+        df['categoria_principal'] = "Pessoal"
+        df['sub_categoria'] = "Outros"
+        df['forma_pagamento'] = np.where(negativo, "Débito/PIX", "Depósito")
+    else:
+        df['tipo'] = "Despesa"
+        df['categoria_principal'] = cat_princ_fatura
+        df['sub_categoria'] = "Fatura Cartão"
+        df['forma_pagamento'] = "Cartão de Crédito"
+
+    df['descricao'] = df_limpo['descricao']
+    df['valor'] = df_limpo['valor'].abs()
+    return df[['data', 'tipo', 'categoria_principal', 'sub_categoria', 'descricao', 'valor', 'forma_pagamento']]
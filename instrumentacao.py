@@ -0,0 +1,175 @@
+"""Medição opcional de tempos e de leituras/escritas no Firestore, com log estruturado em JSON.
+
+Desligada por padrão (ativar()): as funções daqui viram quase nada. Ligada, cada bloco
+`with medir('etapa'):` registra a duração e as leituras/escritas feitas dentro dele (inclusive
+nos blocos aninhados) e emite uma linha JSON no logger 'instrumentacao'. As medições ficam
+por thread: cada rerun do Streamlit e a sincronização em segundo plano têm as suas.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger('instrumentacao')
+
+_ativa = False
+_local = threading.local()
+
+
+def ativar(ativa=True):
+    global _ativa
+    _ativa = ativa
+
+def ativa():
+    return _ativa
+
+def configurar_log(nivel=logging.INFO):
+    """Manda as linhas JSON para o stderr (só a mensagem), sem passar pelo logger raiz."""
+    if not logger.handlers:
+        saida = logging.StreamHandler()
+        saida.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(saida)
+    logger.setLevel(nivel)
+    logger.propagate = False
+
+
+class Medicao:
+    """Uma etapa medida: duração, contadores e as etapas aninhadas (filhas)."""
+
+    def __init__(self, etapa, detalhes):
+        self.etapa = etapa
+        self.detalhes = detalhes
+        self.inicio = time.perf_counter()
+        self.ms = None
+        self.leituras = 0
+        self.escritas = 0
+        self.bytes_lidos = 0
+        self.bytes_escritos = 0
+        self.filhas = []
+
+    def encerrar(self):
+        self.ms = (time.perf_counter() - self.inicio) * 1000
+
+    def registro(self):
+        return {
+            'etapa': self.etapa,
+            'ms': round(self.ms, 1) if self.ms is not None else None,
+            'leituras': self.leituras,
+            'escritas': self.escritas,
+            'bytes_lidos': self.bytes_lidos,
+            'bytes_escritos': self.bytes_escritos,
+            **self.detalhes
+        }
+
+    def linhas(self, nivel=0):
+        """Esta etapa e as aninhadas, achatadas em registros com o nível de aninhamento."""
+        yield {'nivel': nivel, **self.registro()}
+        for filha in self.filhas:
+            yield from filha.linhas(nivel + 1)
+
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+def _emitir(medicao):
+    registro = {'em': datetime.now(timezone.utc).isoformat(), 'thread': threading.current_thread().name, **medicao.registro()}
+    logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+@contextmanager
+def medir(etapa, **detalhes):
+    """Mede o bloco. Devolve a Medicao (ou None, se a instrumentação estiver desligada)."""
+    if not _ativa:
+        yield None
+        return
+    medicao = Medicao(etapa, detalhes)
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].filhas.append(medicao)
+    pilha.append(medicao)
+    try:
+        yield medicao
+    finally:
+        pilha.remove(medicao)
+        medicao.encerrar()
+        _emitir(medicao)
+
+def iniciar(etapa, **detalhes):
+    """Abre a medição raiz de um rerun (descarta o que sobrou de um rerun interrompido)."""
+    _local.pilha = []
+    if not _ativa:
+        return None
+    medicao = Medicao(etapa, detalhes)
+    _local.pilha.append(medicao)
+    return medicao
+
+def finalizar(medicao):
+    if medicao is None:
+        return
+    if medicao in _pilha():
+        _pilha().remove(medicao)
+    medicao.encerrar()
+    _emitir(medicao)
+
+
+# --- Contadores do Firestore ---
+
+def _somar(campo, valor):
+    for medicao in _pilha():
+        setattr(medicao, campo, getattr(medicao, campo) + valor)
+
+def tamanho_documento(dados, doc_id=''):
+    """Tamanho aproximado de um documento, pelas regras de armazenamento do Firestore."""
+    def _valor(valor):
+        if isinstance(valor, str):
+            return len(valor.encode('utf-8')) + 1
+        if isinstance(valor, dict):
+            return sum(len(chave.encode('utf-8')) + 1 + _valor(item) for chave, item in valor.items())
+        if isinstance(valor, (list, tuple)):
+            return sum(_valor(item) for item in valor)
+        if valor is None or isinstance(valor, bool):
+            return 1
+        return 8 # Números e timestamps
+    return len(doc_id) + 1 + 16 + _valor(dados or {}) + 32
+
+def contar_leitura(snap):
+    """Conta um DocumentSnapshot lido (get) e o devolve."""
+    if _ativa and _pilha():
+        _somar('leituras', 1)
+        if snap.exists:
+            _somar('bytes_lidos', tamanho_documento(snap.to_dict(), snap.id))
+    return snap
+
+def contados(documentos):
+    """Percorre o stream de uma consulta contando cada documento lido."""
+    if not (_ativa and _pilha()):
+        yield from documentos
+        return
+    for doc in documentos:
+        _somar('leituras', 1)
+        _somar('bytes_lidos', tamanho_documento(doc.to_dict(), doc.id))
+        yield doc
+
+def contar_leituras(quantidade):
+    # Ex: agregações count(), cobradas como leitura
+    if _ativa:
+        _somar('leituras', quantidade)
+
+def contar_escritas(escrita=None, quantidade=0):
+    """Conta as escritas pendentes de um batch/transação (antes do commit) ou `quantidade` avulsas."""
+    if not (_ativa and _pilha()):
+        return
+    tamanho = 0
+    if escrita is not None:
+        pendentes = getattr(escrita, '_write_pbs', None) or []
+        quantidade += len(pendentes)
+        for write_pb in pendentes:
+            try:
+                tamanho += getattr(write_pb, '_pb', write_pb).ByteSize()
+            except AttributeError:
+                pass
+    _somar('escritas', quantidade)
+    _somar('bytes_escritos', tamanho)
@@ -0,0 +1,97 @@
+"""Réplica local (SQLite) das transações, para abrir o app rápido e continuar lendo sem conexão."""
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+
+def _para_json(valor):
+    # Timestamps do Firestore (criado_em/atualizado_em) viram um objeto marcado para voltar a datetime
+    if isinstance(valor, datetime):
+        return {'__datetime__': valor.isoformat()}
+    if hasattr(valor, 'item'): # Escalares numpy
+        return valor.item()
+    raise TypeError(f"Valor não serializável na réplica: {valor!r}")
+
+def _de_json(objeto):
+    if '__datetime__' in objeto:
+        return datetime.fromisoformat(objeto['__datetime__'])
+    return objeto
+
+def _codificar(item):
+    return json.dumps(item, default=_para_json, ensure_ascii=False)
+
+def _decodificar(texto):
+    return json.loads(texto, object_hook=_de_json)
+
+
+class ReplicaLocal:
+    """Cópia das transações em um arquivo SQLite, com a marca d'água da última sincronização.
+
+    Guarda também a fila de gravações feitas sem conexão, enviadas depois por dados.enviar_fila.
+    Cada operação abre a própria conexão, então a réplica pode ser usada pela thread de
+    sincronização em segundo plano e pelos reruns do Streamlit ao mesmo tempo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with closing(self._conectar()) as con, con:
+            con.execute("CREATE TABLE IF NOT EXISTS transacoes (id TEXT PRIMARY KEY, dados TEXT NOT NULL)")
+            con.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+            con.execute("CREATE TABLE IF NOT EXISTS fila_escritas ("
+                        "seq INTEGER PRIMARY KEY AUTOINCREMENT, operacao TEXT NOT NULL, argumentos TEXT NOT NULL)")
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def _gravar_meta(self, con, marca_dagua, reset_visto):
+        con.executemany("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", [
+            ('marca_dagua', _codificar(marca_dagua)),
+            ('reset_visto', _codificar(reset_visto))
+        ])
+
+    # --- Estado sincronizado ---
+
+    def carregar(self):
+        """Retorna (df, marca_dagua, reset_visto), ou None se a réplica ainda não foi preenchida."""
+        with closing(self._conectar()) as con:
+            meta = dict(con.execute("SELECT chave, valor FROM meta").fetchall())
+            if 'marca_dagua' not in meta:
+                return None
+            items = [_decodificar(dados) for (dados,) in con.execute("SELECT dados FROM transacoes")]
+        return pd.DataFrame(items), _decodificar(meta['marca_dagua']), _decodificar(meta['reset_visto'])
+
+    def substituir(self, items, marca_dagua, reset_visto):
+        """Regrava a réplica inteira (depois de uma carga completa do Firestore)."""
+        with closing(self._conectar()) as con, con:
+            con.execute("DELETE FROM transacoes")
+            con.executemany("INSERT INTO transacoes (id, dados) VALUES (?, ?)",
+                            ((item['id'], _codificar(item)) for item in items))
+            self._gravar_meta(con, marca_dagua, reset_visto)
+
+    def aplicar(self, alterados, excluidos, marca_dagua, reset_visto):
+        """Aplica uma sincronização incremental: upsert dos alterados e remoção dos excluídos."""
+        with closing(self._conectar()) as con, con:
+            con.executemany("INSERT OR REPLACE INTO transacoes (id, dados) VALUES (?, ?)",
+                            ((item['id'], _codificar(item)) for item in alterados))
+            con.executemany("DELETE FROM transacoes WHERE id = ?", ((doc_id,) for doc_id in excluidos))
+            self._gravar_meta(con, marca_dagua, reset_visto)
+
+    # --- Fila de gravações sem conexão ---
+
+    def enfileirar(self, operacao, argumentos):
+        with closing(self._conectar()) as con, con:
+            con.execute("INSERT INTO fila_escritas (operacao, argumentos) VALUES (?, ?)",
+                        (operacao, _codificar(argumentos)))
+
+    def pendentes(self):
+        """Gravações na fila, na ordem em que foram feitas: [(seq, operacao, argumentos)]."""
+        with closing(self._conectar()) as con:
+            linhas = con.execute("SELECT seq, operacao, argumentos FROM fila_escritas ORDER BY seq").fetchall()
+        return [(seq, operacao, _decodificar(argumentos)) for seq, operacao, argumentos in linhas]
+
+    def remover_da_fila(self, seq):
+        with closing(self._conectar()) as con, con:
+            con.execute("DELETE FROM fila_escritas WHERE seq = ?", (seq,))
@@ -0,0 +1,108 @@
+"""Séries da aba de Tendências (vários meses/anos), calculadas por coluna sobre os resumos e o frame tipado."""
+import numpy as np
+import pandas as pd
+
+# Agrupamentos oferecidos na tela -> frequência de Period
+FREQUENCIAS = {"Mensal": 'M', "Trimestral": 'Q', "Anual": 'Y'}
+
+# Categorias com linha própria na evolução; as demais são somadas em "Demais"
+MAXIMO_CATEGORIAS = 8
+
+# Pontos de uma série enviada ao Plotly: acima disso a linha é reduzida antes do gráfico
+MAXIMO_PONTOS = 2000
+
+
+def _com_periodo(resumos):
+    # Linhas de resumo com mês válido, com 'mes' como Period mensal
+    validos = resumos[resumos['mes'] != 'sem-data']
+    return validos.assign(mes=pd.PeriodIndex(validos['mes'], freq='M'))
+
+def frequencia_sugerida(inicio, fim):
+    """Agrupamento que mantém os gráficos legíveis: mensal até 3 anos, trimestral até 10, anual depois."""
+    meses = (fim - inicio).n + 1
+    if meses <= 36:
+        return 'M'
+    return 'Q' if meses <= 120 else 'Y'
+
+def receitas_despesas(resumos, inicio, fim, frequencia='M'):
+    """Receita, Despesa, Resultado e saldo Acumulado por período entre os meses `inicio` e `fim`, em reais.
+
+    Montado com um pivot dos resumos mensais. O acumulado soma desde o primeiro mês do
+    histórico (não do início do intervalo) e é o saldo no fim de cada período; meses sem
+    lançamentos entram com zero.
+    """
+    colunas = ['Receita', 'Despesa']
+    base = _com_periodo(resumos)
+    if base.empty:
+        return pd.DataFrame(columns=colunas + ['Resultado', 'Acumulado'], dtype=float)
+
+    tabela = base.pivot_table(index='mes', columns='tipo', values='centavos', aggfunc='sum', fill_value=0)
+    tabela = tabela.reindex(columns=colunas, fill_value=0)
+    tabela = tabela.reindex(pd.period_range(tabela.index.min(), max(tabela.index.max(), fim), freq='M'), fill_value=0)
+    tabela['Resultado'] = tabela['Receita'] - tabela['Despesa']
+    tabela['Acumulado'] = tabela['Resultado'].cumsum()
+    tabela = tabela[(tabela.index >= inicio) & (tabela.index <= fim)]
+
+    periodos = tabela.index.asfreq(frequencia)
+    agrupada = tabela[colunas + ['Resultado']].groupby(periodos).sum()
+    agrupada['Acumulado'] = tabela['Acumulado'].groupby(periodos).last()
+    return agrupada / 100
+
+def evolucao_categorias(resumos, tipo, inicio, fim, frequencia='M', maximo=MAXIMO_CATEGORIAS):
+    """Total de cada sub_categoria do `tipo` por período, em reais (uma coluna por categoria).
+
+    Ficam as `maximo` categorias de maior total no intervalo, em ordem decrescente, e o resto
+    é somado na coluna "Demais".
+    """
+    base = _com_periodo(resumos)
+    base = base[(base['tipo'] == tipo) & (base['mes'] >= inicio) & (base['mes'] <= fim)]
+    if base.empty:
+        return pd.DataFrame(dtype=float)
+
+    tabela = base.pivot_table(index='mes', columns='sub_categoria', values='centavos', aggfunc='sum', fill_value=0)
+    tabela = tabela.reindex(pd.period_range(inicio, fim, freq='M'), fill_value=0)
+    ordem = tabela.sum().sort_values(ascending=False).index
+    if len(ordem) > maximo:
+        tabela = tabela[ordem[:maximo]].assign(Demais=tabela[ordem[maximo:]].sum(axis=1))
+    else:
+        tabela = tabela[ordem]
+    return tabela.groupby(tabela.index.asfreq(frequencia)).sum() / 100
+
+def resultado_anterior(resumos, inicio):
+    """Receitas - despesas, em centavos, de todos os meses anteriores a `inicio` (pelos resumos)."""
+    base = _com_periodo(resumos)
+    base = base[base['mes'] < inicio]
+    sinal = np.select([base['tipo'] == 'Receita', base['tipo'] == 'Despesa'], [1, -1], 0)
+    return int((base['centavos'].to_numpy() * sinal).sum())
+
+def saldo_diario(tipado, inicio, fim, anterior=None):
+    """Saldo acumulado (receitas - despesas) no fim de cada dia entre os meses `inicio` e `fim`, em reais.
+
+    Calculado do frame tipado (tipar_transacoes), com o acumulado desde o início do histórico,
+    como em receitas_despesas. Com `anterior` (centavos, ex: resultado_anterior), basta o frame
+    trazer as transações do intervalo. Pode ter um ponto por dia de vários anos: reduza antes do gráfico.
+    """
+    validos = tipado[tipado['data'].notna()]
+    sinal = np.select([validos['tipo'] == 'Receita', validos['tipo'] == 'Despesa'], [1, -1], 0)
+    movimento = pd.Series(validos['centavos'].to_numpy() * sinal, index=validos['data'].dt.normalize())
+    if anterior is not None:
+        # O saldo de antes do intervalo entra como movimento da véspera de `inicio`
+        movimento = pd.concat([pd.Series([anterior], index=[inicio.start_time - pd.Timedelta(days=1)]), movimento])
+    if movimento.empty:
+        return pd.Series(dtype=float)
+    diario = movimento.groupby(level=0).sum()
+    diario = diario.reindex(pd.date_range(diario.index.min(), diario.index.max(), freq='D'), fill_value=0).cumsum()
+    return diario[inicio.start_time:fim.end_time] / 100
+
+def reduzir(serie, pontos=MAXIMO_PONTOS):
+    """Até `pontos` pontos da série para o gráfico, preservando picos e vales.
+
+    Divide a série em faixas consecutivas e mantém só o menor e o maior valor de cada uma
+    (mais o primeiro e o último ponto), tudo em um groupby. Séries menores voltam inteiras.
+    """
+    if len(serie) <= pontos:
+        return serie
+    faixas = np.arange(len(serie)) * ((pontos - 2) // 2) // len(serie)
+    grupos = pd.Series(serie.to_numpy()).groupby(faixas)
+    manter = np.union1d(np.union1d(grupos.idxmin().to_numpy(), grupos.idxmax().to_numpy()), [0, len(serie) - 1])
+    return serie.iloc[manter]
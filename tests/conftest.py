@@ -0,0 +1,69 @@
+"""Fixtures dos testes: a camada de dados roda sobre o cliente Firestore em memória (benchmarks.firestore_falso)."""
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dados  # noqa: E402
+import instrumentacao  # noqa: E402
+from benchmarks.firestore_falso import ClienteFalso  # noqa: E402
+from benchmarks.gerador import historico  # noqa: E402
+from benchmarks.suite import popular  # noqa: E402
+
+LINHAS_HISTORICO = 300
+
+
+@pytest.fixture
+def db():
+    return ClienteFalso()
+
+@pytest.fixture
+def banco(db):
+    """Banco com um histórico sintético gravado como na importação (com resumos, saldos e vocabulário)."""
+    popular(db, LINHAS_HISTORICO)
+    return db
+
+@pytest.fixture
+def importar():
+    """`importar(db, linhas, lote)` grava uma importação sintética registrada, como a aba de importação."""
+    def _importar(db, linhas, lote='lote-teste'):
+        registros = dados.numerar_ocorrencias([dados.montar_registro(*linha) for linha in historico(linhas, 9).itertuples(index=False)])
+        for registro in registros:
+            registro['lote_importacao'] = lote
+        dados.registrar_importacao(db, lote, 'extrato.xlsx', len(registros))
+        dados.salvar_em_lotes(db, registros, dados.gerar_ids(db, len(registros)))
+        return lote
+    return _importar
+
+@pytest.fixture
+def medir():
+    """`with medir() as medicao:` conta as leituras e escritas do bloco."""
+    instrumentacao.ativar()
+    yield lambda: instrumentacao.medir('teste')
+    instrumentacao.ativar(False)
+
+@pytest.fixture
+def sem_espera(monkeypatch):
+    # As novas tentativas de salvar_em_lotes esperam 2, 4... segundos
+    monkeypatch.setattr(dados.time, 'sleep', lambda segundos: None)
+
+@pytest.fixture
+def conferir_agregados():
+    """Confere resumos, saldos e vocabulário gravados contra o recálculo das transações."""
+    def _conferir(db):
+        df = dados.ler_todas_transacoes(db)
+        divergencias = dados.verificar_resumos(dados.carregar_resumos(db), dados.calcular_resumos(df))
+        assert divergencias.empty, divergencias.to_string()
+
+        gravados, calculados = dados.carregar_saldos(db), dados.saldos_calculados(df)
+        for conta, saldo in calculados.items():
+            gravado = gravados.get(conta, {'total': 0.0, 'fechamentos': pd.Series(dtype=float)})
+            assert gravado['total'] == pytest.approx(saldo['total']), conta
+            pd.testing.assert_series_equal(gravado['fechamentos'], saldo['fechamentos'], check_names=False)
+
+        assert dados.carregar_vocabulario(db) == dados.vocabulario_calculado(df)
+        return df
+    return _conferir
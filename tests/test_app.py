@@ -0,0 +1,78 @@
+"""App inteiro no AppTest do Streamlit, sobre o banco em memória: leituras por rerun."""
+import json
+import logging
+import os
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import instrumentacao
+from benchmarks.reruns import SCRIPT
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app_financas.py')
+
+
+class _Etapas(logging.Handler):
+    """Guarda as linhas JSON da instrumentação emitidas pelo app."""
+
+    def __init__(self):
+        super().__init__()
+        self.registros = []
+
+    def emit(self, record):
+        self.registros.append(json.loads(record.getMessage()))
+
+
+@pytest.fixture
+def etapas():
+    coletor = _Etapas()
+    instrumentacao.logger.addHandler(coletor)
+    yield coletor.registros
+    instrumentacao.logger.removeHandler(coletor)
+    instrumentacao.ativar(False)
+
+@pytest.fixture
+def app(banco, etapas):
+    # Caches do Streamlit são do processo: sem limpar, um teste veria o banco do anterior
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    at = AppTest.from_string(SCRIPT.format(caminho=APP), default_timeout=60)
+    at.secrets['APP_PASSWORD'] = 'teste'
+    at.secrets['MEDIR_TEMPOS'] = True
+    at.secrets['MODO_CONSULTA'] = 'periodo'
+    at.session_state['logged_in'] = True
+    at.session_state['banco_benchmark'] = banco
+    return at
+
+def _rodar(at, etapas):
+    etapas.clear()
+    at.run()
+    assert not at.exception
+    return {registro['etapa']: registro for registro in etapas}
+
+def _controle(at, tipo, rotulo):
+    return next(controle for controle in getattr(at, tipo) if controle.label == rotulo)
+
+
+def test_modo_periodo_nao_carrega_a_colecao(app, etapas):
+    medidas = _rodar(app, etapas)
+    assert 'firestore.carga_completa' not in medidas
+    # Resumos, saldos, vocabulário e o mês mais recente, lido uma vez para o extrato e a edição
+    assert medidas['rerun']['leituras'] == sum(medidas[etapa]['leituras'] for etapa in
+                                               ['firestore.resumos', 'firestore.saldos', 'firestore.mes', 'aba.aba_lancamento'])
+    assert medidas['rerun']['leituras'] < 300
+    assert medidas['aba.aba_tendencias']['leituras'] == 0
+    assert medidas['aba.aba_edicao']['leituras'] == 0
+
+def test_modo_periodo_le_a_colecao_so_com_todos(app, etapas):
+    _rodar(app, etapas)
+    _controle(app, 'selectbox', "Mês").set_value("Todos")
+    assert 'firestore.carga_completa' in _rodar(app, etapas)
+
+def test_saldo_diario_le_so_o_intervalo(app, etapas):
+    _rodar(app, etapas)
+    _controle(app, 'toggle', "Saldo dia a dia").set_value(True)
+    medidas = _rodar(app, etapas)
+    assert 'firestore.carga_completa' not in medidas
+    assert 0 < medidas['firestore.periodo']['leituras'] <= 300
@@ -0,0 +1,68 @@
+"""Exportação e restauração do backup em cada formato, com o histórico de importações."""
+import pandas as pd
+import pytest
+
+import backup
+import dados
+from benchmarks.firestore_falso import ClienteFalso
+
+
+class Interrompida(Exception):
+    pass
+
+
+@pytest.fixture
+def origem(banco, importar):
+    importar(banco, 50)
+    return banco
+
+def _transacoes(db):
+    # Tudo o que o backup guarda, menos 'atualizado_em' (a restauração é uma nova gravação)
+    df = backup.normalizar_pagina(dados.ler_todas_transacoes(db))
+    return df.drop(columns='atualizado_em').sort_values('id').reset_index(drop=True)
+
+def _conferir_restauracao(origem, destino):
+    pd.testing.assert_frame_equal(_transacoes(destino), _transacoes(origem))
+    assert dados.listar_importacoes(destino) == dados.listar_importacoes(origem)
+
+
+@pytest.mark.parametrize('formato', list(backup.ESCRITORES))
+def test_ida_e_volta(origem, tmp_path, conferir_agregados, formato):
+    caminho = tmp_path / f"backup.{formato}"
+    assert backup.exportar(origem, caminho, tamanho_pagina=120) == 350
+
+    destino = ClienteFalso()
+    assert backup.restaurar(destino, caminho, tamanho_pagina=120) == 350
+    _conferir_restauracao(origem, destino)
+    conferir_agregados(destino)
+
+def test_retomada_depois_de_interrupcao(origem, tmp_path, conferir_agregados):
+    caminho = tmp_path / "backup.parquet"
+    backup.exportar(origem, caminho)
+    destino = ClienteFalso()
+    pontos = []
+
+    def _ao_progresso(retomada):
+        pontos.append(retomada)
+        if len(pontos) == 2:
+            raise Interrompida()
+
+    with pytest.raises(Interrompida):
+        backup.restaurar(destino, caminho, ao_progresso=_ao_progresso, tamanho_pagina=100)
+    assert backup.restaurar(destino, caminho, retomada=pontos[-1]) == 350
+    _conferir_restauracao(origem, destino)
+    conferir_agregados(destino)
+
+def test_restaurar_exige_banco_vazio(origem, tmp_path):
+    caminho = tmp_path / "backup.csv"
+    backup.exportar(origem, caminho)
+    with pytest.raises(ValueError):
+        backup.restaurar(origem, caminho)
+
+def test_excel_sem_importacoes(banco, tmp_path):
+    # Sem lote nem data de importação, toda linha termina em células vazias
+    caminho = tmp_path / "backup.xlsx"
+    backup.exportar(banco, caminho)
+    destino = ClienteFalso()
+    assert backup.restaurar(destino, caminho) == 300
+    _conferir_restauracao(banco, destino)
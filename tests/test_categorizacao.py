@@ -0,0 +1,79 @@
+"""Propostas de categoria da importação: regras do usuário, histórico e prefixos."""
+import pandas as pd
+
+from categorizacao import Categorizador, categorizar
+
+COLUNAS = ['tipo', 'descricao', 'sub_categoria', 'categoria_principal', 'forma_pagamento']
+
+
+def _historico(*linhas):
+    return pd.DataFrame(linhas, columns=COLUNAS)
+
+def _importados(*descricoes, tipo='Despesa'):
+    return pd.DataFrame({
+        'tipo': tipo,
+        'descricao': list(descricoes),
+        'sub_categoria': 'Outros',
+        'categoria_principal': 'Pessoal',
+        'forma_pagamento': 'Cartão de Crédito'
+    })
+
+HISTORICO = _historico(
+    ('Despesa', 'UBER *TRIP 1234', 'Transporte', 'Pessoal', 'Cartão de Crédito'),
+    ('Despesa', 'UBER *TRIP 5678', 'Transporte', 'Pessoal', 'Cartão de Crédito'),
+    ('Despesa', 'UBER EATS PEDIDO', 'Restaurante', 'Pessoal', 'Cartão de Crédito'),
+    ('Despesa', 'PADARIA CENTRAL 03/10', 'Mercado', 'Pessoal', 'PIX'),
+)
+
+
+def test_regra_ganha_do_historico():
+    regras = [{'padrao': 'uber trip', 'sub_categoria': 'Trabalho', 'categoria_principal': 'Empresa', 'forma_pagamento': ''}]
+    propostas = Categorizador(HISTORICO, regras).classificar(_importados('UBER *TRIP 9999', 'PADARIA CENTRAL 04/10'))
+    assert propostas['origem'].tolist() == ['regra', 'histórico']
+    assert propostas['sub_categoria'].tolist() == ['Trabalho', 'Mercado']
+    # Campo vazio na regra fica sem proposta: a importação mantém o seu
+    assert pd.isna(propostas['forma_pagamento'].iloc[0])
+
+def test_padrao_mais_longo_ganha():
+    regras = [
+        {'padrao': 'uber', 'sub_categoria': 'Transporte'},
+        {'padrao': 'Uber Eats', 'sub_categoria': 'Restaurante'},
+    ]
+    propostas = Categorizador(_historico(), regras).classificar(_importados('UBER EATS 123', 'UBER *TRIP'))
+    assert propostas['sub_categoria'].tolist() == ['Restaurante', 'Transporte']
+
+def test_prefixo_quando_a_descricao_e_nova():
+    propostas = Categorizador(HISTORICO).classificar(_importados('UBER TRIP HELP.UBER.COM', 'LOJA NOVA'))
+    assert propostas['origem'].iloc[0] == 'prefixo'
+    assert propostas['sub_categoria'].iloc[0] == 'Transporte'
+    assert propostas.iloc[1].isna().all()
+
+def test_historico_sem_confianca_minima_nao_propoe():
+    # 'mercado livre' dividido 50/50 entre duas categorias: abaixo de CONFIANCA_MINIMA (0,6)
+    dividido = _historico(
+        ('Despesa', 'MERCADO LIVRE', 'Eletrônicos', 'Pessoal', 'PIX'),
+        ('Despesa', 'MERCADO LIVRE', 'Casa', 'Pessoal', 'PIX'),
+    )
+    assert Categorizador(dividido).classificar(_importados('MERCADO LIVRE'))['origem'].isna().all()
+
+    # Com 2 de 3 (0,67), a mais frequente é proposta
+    maioria = pd.concat([dividido, dividido.iloc[[0]]], ignore_index=True)
+    assert Categorizador(maioria).classificar(_importados('MERCADO LIVRE'))['sub_categoria'].tolist() == ['Eletrônicos']
+
+def test_categorias_genericas_e_outro_tipo_nao_ensinam():
+    historico = _historico(
+        ('Despesa', 'FARMACIA', 'Outros', 'Pessoal', 'PIX'),
+        ('Receita', 'PADARIA CENTRAL', 'Salário', 'Renda', 'PIX'),
+    )
+    propostas = Categorizador(historico).classificar(_importados('FARMACIA', 'PADARIA CENTRAL'))
+    assert propostas['origem'].isna().all()
+
+def test_manter_pagamento_so_muda_a_categoria():
+    importados = _importados('PADARIA CENTRAL 05/10', 'LOJA NOVA')
+    df, origem = categorizar(importados, Categorizador(HISTORICO), manter_pagamento=True)
+    assert df['sub_categoria'].tolist() == ['Mercado', 'Outros']
+    assert df['forma_pagamento'].tolist() == ['Cartão de Crédito'] * 2
+    assert origem.tolist()[0] == 'histórico'
+
+    df, _ = categorizar(importados, Categorizador(HISTORICO))
+    assert df['forma_pagamento'].tolist() == ['PIX', 'Cartão de Crédito']
@@ -0,0 +1,121 @@
+"""Resumos, saldos e vocabulário mantidos pelas gravações, e retomada de salvar_em_lotes."""
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+
+import dados
+from benchmarks.gerador import historico
+
+
+def _argumentos(linhas, semente=5):
+    return [list(linha) for linha in historico(linhas, semente).itertuples(index=False)]
+
+def _ids(db, quantidade):
+    return [doc.id for doc in db.collection(dados.COLECAO_TRANSACOES).limit(quantidade).stream()]
+
+
+def test_importacao_grava_agregados(banco, conferir_agregados):
+    df = conferir_agregados(banco)
+    assert len(df) == 300
+
+
+@pytest.mark.parametrize('operacao', [
+    lambda db, importar: dados.adicionar_transacao(db, *_argumentos(1)[0]),
+    # Sem data: entra no resumo 'sem-data' e no saldo do vale, como no recálculo
+    lambda db, importar: dados.adicionar_transacao(db, None, 'Receita', 'Renda', 'Vale Refeição',
+                                                   'CREDITO BENEFICIO VR', 900.0, 'Vale Refeição'),
+    # Muda mês, tipo e forma de pagamento: sai de um resumo/saldo e entra em outro
+    lambda db, importar: dados.atualizar_transacao(db, _ids(db, 1)[0], '2024-03-10', 'Despesa', 'Pessoal', 'Mercado',
+                                                   'CARREFOUR', 123.45, 'Vale Alimentação'),
+    lambda db, importar: dados.atualizar_transacao(db, _ids(db, 1)[0], '', 'Despesa', 'Pessoal', 'Mercado',
+                                                   'CARREFOUR', 10.0, 'Vale Alimentação'),
+    lambda db, importar: dados.excluir_transacao(db, _ids(db, 1)[0]),
+    lambda db, importar: dados.salvar_edicoes(db, dict(zip(_ids(db, 10)[:5], _argumentos(5))), excluidos=_ids(db, 10)[5:]),
+    lambda db, importar: dados.excluir_mes(db, '2025-11'),
+    lambda db, importar: dados.excluir_importacao(db, importar(db, 50)),
+], ids=['adicionar', 'adicionar_sem_data', 'atualizar', 'atualizar_sem_data', 'excluir', 'editar_lote',
+        'excluir_mes', 'excluir_importacao'])
+def test_agregados_consistentes_depois_da_gravacao(banco, importar, conferir_agregados, operacao):
+    operacao(banco, importar)
+    conferir_agregados(banco)
+
+def test_excluir_mes_e_importacao_removem_so_o_escopo(banco, importar):
+    antes = dados.ler_todas_transacoes(banco)
+    lote = importar(banco, 40)
+    assert dados.excluir_importacao(banco, lote) == 40
+    assert dados.listar_importacoes(banco) == []
+    no_mes = (antes['data'].str[:7] == '2025-11').sum()
+    assert no_mes > 0
+    assert dados.excluir_mes(banco, '2025-11') == no_mes
+
+    depois = dados.ler_todas_transacoes(banco)
+    assert not (depois['data'].str[:7] == '2025-11').any()
+    assert len(depois) == len(antes) - no_mes
+
+def test_excluir_tudo_zera_agregados_e_grava_o_marco(banco):
+    dados.excluir_tudo(banco)
+    assert not dados.existem_transacoes(banco)
+    assert dados.carregar_resumos(banco).empty
+    assert dados.carregar_saldos(banco) == {}
+    assert dados.carregar_vocabulario(banco) is None
+    assert banco.collection(dados.COLECAO_META).document(dados.DOC_SINCRONIZACAO).get().get('reset_em') is not None
+
+def test_reconstruir_resumos_corrige_divergencias(banco, conferir_agregados):
+    banco.collection(dados.COLECAO_RESUMOS).document('2025-12').delete()
+    assert not dados.reconstruir_resumos(banco).empty
+    assert dados.reconstruir_resumos(banco).empty
+    conferir_agregados(banco)
+
+def test_reconstruir_mantem_resumo_sem_data(banco):
+    dados.adicionar_transacao(banco, None, 'Despesa', 'Pessoal', 'Mercado', 'FEIRA', 30.0, 'Dinheiro')
+    assert dados.reconstruir_resumos(banco).empty
+    assert banco.collection(dados.COLECAO_RESUMOS).document('sem-data').get().exists
+
+
+# --- salvar_em_lotes ---
+
+def _registros(linhas):
+    return dados.numerar_ocorrencias([dados.montar_registro(*args) for args in _argumentos(linhas)])
+
+def _perder_confirmacao(monkeypatch, lotes):
+    """Faz os commits dos `lotes` (contados a partir de 0) chegarem ao banco e a resposta se perder."""
+    confirmar = dados._confirmar
+    chamadas = []
+
+    def _confirmar(batch):
+        numero = len(chamadas)
+        chamadas.append(numero)
+        confirmar(batch)
+        if numero in lotes:
+            raise ServiceUnavailable("resposta perdida")
+    monkeypatch.setattr(dados, '_confirmar', _confirmar)
+
+def test_nova_tentativa_nao_duplica_lote_confirmado(db, monkeypatch, sem_espera, conferir_agregados):
+    registros = _registros(120)
+    _perder_confirmacao(monkeypatch, {1})
+    dados.salvar_em_lotes(db, registros, dados.gerar_ids(db, len(registros)), tamanho_lote=50)
+    df = conferir_agregados(db)
+    assert len(df) == 120
+
+@pytest.mark.parametrize('lote_perdido', [0, 2])
+def test_retomada_nao_duplica_lote_confirmado(db, monkeypatch, conferir_agregados, lote_perdido):
+    registros = _registros(120)
+    ids = dados.gerar_ids(db, len(registros))
+    _perder_confirmacao(monkeypatch, {lote_perdido})
+    with pytest.raises(ServiceUnavailable):
+        dados.salvar_em_lotes(db, registros, ids, tamanho_lote=50, tentativas=1)
+
+    # Retoma do lote que falhou, como a importação pendente do app
+    dados.salvar_em_lotes(db, registros, ids, inicio_lote=lote_perdido, tamanho_lote=50)
+    df = conferir_agregados(db)
+    assert sorted(df['id']) == sorted(ids)
+
+def test_erro_de_dados_nao_e_tentado_de_novo(db, monkeypatch):
+    chamadas = []
+
+    def _confirmar(batch):
+        chamadas.append(batch)
+        raise ValueError("documento inválido")
+    monkeypatch.setattr(dados, '_confirmar', _confirmar)
+    with pytest.raises(ValueError):
+        dados.salvar_em_lotes(db, _registros(10), dados.gerar_ids(db, 10))
+    assert len(chamadas) == 1
@@ -0,0 +1,21 @@
+"""Normalização das planilhas importadas."""
+import pandas as pd
+
+from importacao import normalizar_datas, normalizar_valores
+
+
+def test_normalizar_datas_formatos():
+    serie = pd.Series(['05/01/2024', '2024-01-05', '2024-01-05T10:30:00Z', '5/1/24', '05-01-2024', '05/01', 'abc', None])
+    datas = normalizar_datas(serie, 2024, 1)
+    esperado = ['2024-01-05'] * 6 + [None, None]
+    assert [None if pd.isna(data) else data.strftime('%Y-%m-%d') for data in datas] == esperado
+
+def test_normalizar_datas_curtas_do_ano_anterior():
+    # Compra de dezembro na fatura de janeiro
+    datas = normalizar_datas(pd.Series(['20/12', '03/01']), 2025, 1)
+    assert datas.dt.strftime('%Y-%m-%d').tolist() == ['2024-12-20', '2025-01-03']
+
+def test_normalizar_valores_formato_brasileiro():
+    valores = normalizar_valores(pd.Series(['1.234,56', '-45,90', 'R$ 10,00', 12.5, 'x']))
+    assert valores.iloc[:4].tolist() == [1234.56, -45.90, 10.0, 12.5]
+    assert pd.isna(valores.iloc[4])
@@ -0,0 +1,52 @@
+"""Impressões digitais das transações: numeração das ocorrências e detecção de duplicadas."""
+import pandas as pd
+
+import dados
+
+LANCAMENTO = ['2025-12-05', 'Despesa', 'Pessoal', 'Mercado', 'PADARIA SAO JOAO', 12.5, 'PIX']
+
+
+def _impressoes(db):
+    return sorted(doc.get('impressao') for doc in db.collection(dados.COLECAO_TRANSACOES).stream())
+
+def _base():
+    return dados.montar_registro(*LANCAMENTO)['impressao'][:-2]
+
+
+def test_numerar_ocorrencias_continua_as_ja_usadas():
+    registros = [dados.montar_registro(*LANCAMENTO) for _ in range(3)]
+    dados.numerar_ocorrencias(registros, ja_usadas={_base(): 2})
+    assert [registro['impressao'] for registro in registros] == [f"{_base()}-{n}" for n in (2, 3, 4)]
+
+def test_impressoes_existentes_so_as_gravadas(db, medir):
+    registros = dados.numerar_ocorrencias([dados.montar_registro(*LANCAMENTO[:4], f"LOJA {n}", *LANCAMENTO[5:]) for n in range(40)])
+    dados.salvar_em_lotes(db, registros[:35], dados.gerar_ids(db, 35))
+    with medir() as medicao:
+        existentes = dados.impressoes_existentes(db, [registro['impressao'] for registro in registros])
+    # Dois filtros 'in' (LIMITE_IN = 30) com projeção: uma leitura por documento encontrado
+    assert existentes == {registro['impressao'] for registro in registros[:35]}
+    assert medicao.leituras == 35
+
+def test_lancamento_manual_repetido_vira_nova_ocorrencia(db):
+    for _ in range(3):
+        dados.adicionar_transacao(db, *LANCAMENTO)
+    assert _impressoes(db) == [f"{_base()}-{n}" for n in range(3)]
+
+    # Reimportar um extrato com as três compras encontra todas; uma quarta é nova
+    importados = dados.numerar_ocorrencias([dados.montar_registro(*LANCAMENTO) for _ in range(4)])
+    existentes = dados.impressoes_existentes(db, [registro['impressao'] for registro in importados])
+    assert [registro['impressao'] in existentes for registro in importados] == [True, True, True, False]
+
+def test_preencher_impressoes_segue_a_ordem_de_criacao(db):
+    dados.adicionar_transacao(db, *LANCAMENTO)
+    # Duas transações antigas, sem impressão, criadas em ordem inversa à dos IDs
+    colecao = db.collection(dados.COLECAO_TRANSACOES)
+    for doc_id, criado_em in [('b', pd.Timestamp('2024-01-01', tz='UTC')), ('a', pd.Timestamp('2024-02-01', tz='UTC'))]:
+        registro = dados.montar_registro(*LANCAMENTO)
+        del registro['impressao']
+        colecao.document(doc_id).set({**registro, 'criado_em': criado_em.to_pydatetime()})
+
+    assert dados.preencher_impressoes(db, dados.ler_todas_transacoes(db)) == 2
+    assert colecao.document('b').get().get('impressao') == f"{_base()}-1"
+    assert colecao.document('a').get().get('impressao') == f"{_base()}-2"
+    assert dados.preencher_impressoes(db, dados.ler_todas_transacoes(db)) == 0
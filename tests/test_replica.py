@@ -0,0 +1,92 @@
+"""Réplica local em SQLite e fila de gravações feitas sem conexão."""
+from datetime import timedelta
+
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+
+import dados
+from benchmarks.gerador import historico
+from replica import ReplicaLocal
+
+
+@pytest.fixture
+def replica(tmp_path):
+    return ReplicaLocal(str(tmp_path / 'replica.sqlite'))
+
+@pytest.fixture
+def cache(banco, replica, monkeypatch):
+    # Sem margem, como em test_sincronizacao: a reabertura não relê o que acabou de ser gravado
+    monkeypatch.setattr(dados, 'MARGEM_SINCRONIA', timedelta(0))
+    cache = dados.CacheTransacoes(intervalo_sincronia=3600, replica=replica)
+    cache.carregar(banco)
+    return cache
+
+def _sem_conexao(monkeypatch, operacao, gravar_antes=False):
+    """Faz a `operacao` falhar por conexão; com `gravar_antes`, o commit chega e só a resposta se perde."""
+    original = dados.OPERACOES[operacao]
+
+    def _falhar(*argumentos):
+        if gravar_antes:
+            original(*argumentos)
+        raise ServiceUnavailable("sem conexão")
+    monkeypatch.setitem(dados.OPERACOES, operacao, _falhar)
+
+def _argumentos(semente=6):
+    return list(historico(1, semente=semente).iloc[0])
+
+
+def test_estado_volta_do_disco(banco, replica, cache, medir):
+    df, marca_dagua, reset_visto = replica.carregar()
+    assert sorted(df['id']) == sorted(cache.df['id'])
+    assert marca_dagua == cache.marca_dagua
+    assert reset_visto == cache.reset_visto
+
+    # Outro processo abre a partir do arquivo: só o delta vem do Firestore
+    reaberto = dados.CacheTransacoes(intervalo_sincronia=3600, replica=ReplicaLocal(replica.caminho))
+    with medir() as medicao:
+        tipado = reaberto.carregar(banco)
+    assert len(tipado) == 300
+    assert medicao.leituras < 10
+
+def test_adicao_enfileirada_e_enviada_uma_vez(banco, replica, cache, monkeypatch, conferir_agregados):
+    with monkeypatch.context() as contexto:
+        _sem_conexao(contexto, 'adicionar')
+        assert cache.gravar(banco, 'adicionar', *_argumentos()) is False
+    assert len(cache.df) == 301
+    assert len(replica.pendentes()) == 1
+
+    assert dados.enviar_fila(banco, replica) == 1
+    assert dados.enviar_fila(banco, replica) == 0
+    assert replica.pendentes() == []
+    assert len(conferir_agregados(banco)) == 301
+
+def test_adicao_que_ja_chegou_nao_e_repetida(banco, replica, cache, monkeypatch, conferir_agregados):
+    with monkeypatch.context() as contexto:
+        _sem_conexao(contexto, 'adicionar', gravar_antes=True)
+        cache.gravar(banco, 'adicionar', *_argumentos())
+    assert dados.enviar_fila(banco, replica) == 0
+    assert replica.pendentes() == []
+    assert len(conferir_agregados(banco)) == 301
+
+def test_gravacoes_sem_conexao_sobrevivem_ao_reinicio(banco, replica, cache, monkeypatch):
+    excluido = cache.df['id'].iloc[0]
+    _sem_conexao(monkeypatch, 'adicionar')
+    _sem_conexao(monkeypatch, 'excluir')
+    cache.gravar(banco, 'adicionar', *_argumentos())
+    cache.gravar(banco, 'excluir', excluido)
+    adicionado = replica.pendentes()[0][2][-1]
+
+    # Reaberto ainda sem conexão: a réplica tem o estado do servidor e a fila volta ao frame
+    reaberto = dados.CacheTransacoes(intervalo_sincronia=3600, replica=ReplicaLocal(replica.caminho))
+    tipado = reaberto.carregar(banco)
+    assert reaberto.offline
+    assert adicionado in set(tipado['id'])
+    assert excluido not in set(tipado['id'])
+
+    # Com a conexão de volta, a fila é enviada e o frame fica igual ao banco
+    monkeypatch.undo()
+    reaberto.invalidar()
+    tipado = reaberto.carregar(banco)
+    assert replica.pendentes() == []
+    assert sorted(tipado['id']) == sorted(dados.ler_todas_transacoes(banco)['id'])
+    assert adicionado in set(tipado['id']) and excluido not in set(tipado['id'])
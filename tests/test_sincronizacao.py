@@ -0,0 +1,98 @@
+"""Sincronização incremental do CacheTransacoes: só o delta é lido e o frame fica igual ao banco."""
+from datetime import timedelta
+
+import pytest
+
+import dados
+from benchmarks.gerador import historico
+
+
+@pytest.fixture
+def cache(banco, monkeypatch):
+    # Sem margem, a marca d'água fica na última alteração lida: o cliente em memória não tem
+    # commits concorrentes nem relógio de servidor para a margem cobrir
+    monkeypatch.setattr(dados, 'MARGEM_SINCRONIA', timedelta(0))
+    cache = dados.CacheTransacoes(intervalo_sincronia=3600)
+    cache.carregar(banco)
+    return cache
+
+def _sincronizar(cache, db):
+    cache.invalidar()
+    return cache.carregar(db)
+
+def _conferir_frame(cache, db):
+    banco = dados.ler_todas_transacoes(db).set_index('id').sort_index()
+    local = cache.df.set_index('id').sort_index()
+    assert list(local.index) == list(banco.index)
+    for coluna in dados.CAMPOS_EDITAVEIS:
+        assert local[coluna].tolist() == banco[coluna].tolist(), coluna
+
+
+def test_sincronizacao_le_so_o_delta(banco, cache, medir):
+    ids = [doc.id for doc in banco.collection(dados.COLECAO_TRANSACOES).limit(3).stream()]
+    for argumentos in historico(2, semente=8).itertuples(index=False):
+        dados.adicionar_transacao(banco, *argumentos)
+    dados.atualizar_transacao(banco, ids[0], '2025-12-20', 'Despesa', 'Pessoal', 'Lazer', 'CINEMARK', 50.0, 'PIX')
+    dados.excluir_transacao(banco, ids[1])
+
+    with medir() as medicao:
+        _sincronizar(cache, banco)
+    # Marco de reset + 2 inclusões + 1 edição + 1 lápide
+    assert medicao.leituras == 5
+    _conferir_frame(cache, banco)
+
+def test_sincronizacao_sem_alteracoes_le_so_o_marco(banco, cache, medir):
+    dados.excluir_transacao(banco, cache.df['id'].iloc[0])
+    _sincronizar(cache, banco)
+    with medir() as medicao:
+        _sincronizar(cache, banco)
+    assert medicao.leituras == 1
+
+def test_edicao_em_outro_aparelho_chega_ao_frame(banco, cache):
+    ids = cache.df['id'].iloc[:6].tolist()
+    alteracoes = {doc_id: list(linha) for doc_id, linha in zip(ids[:3], historico(3, semente=4).itertuples(index=False))}
+    dados.salvar_edicoes(banco, alteracoes, excluidos=ids[3:])
+    tipado = _sincronizar(cache, banco)
+    assert len(tipado) == 297
+    _conferir_frame(cache, banco)
+
+def test_excluir_tudo_forca_recarga(banco, cache):
+    dados.excluir_tudo(banco)
+    assert _sincronizar(cache, banco).empty
+
+def test_gravacao_pelo_cache_aparece_sem_consultar(banco, cache, medir):
+    argumentos = list(historico(1, semente=6).iloc[0])
+    with medir() as medicao:
+        cache.gravar(banco, 'adicionar', *argumentos)
+        tipado = cache.carregar(banco)
+    assert len(tipado) == 301
+    assert medicao.leituras == 0
+    _sincronizar(cache, banco)
+    _conferir_frame(cache, banco)
+
+def test_margem_mantem_gravacoes_recentes_na_proxima_leitura(banco):
+    # Com a margem padrão, a marca d'água fica atrás do que foi gravado logo antes da carga
+    cache = dados.CacheTransacoes(intervalo_sincronia=3600)
+    cache.carregar(banco)
+    assert cache.marca_dagua < max(cache.df['atualizado_em'])
+    dados.adicionar_transacao(banco, *historico(1, semente=2).iloc[0])
+    _sincronizar(cache, banco)
+    _conferir_frame(cache, banco)
+
+def test_lapide_expira_depois_da_retencao(banco):
+    doc_id = dados.ler_todas_transacoes(banco)['id'].iloc[0]
+    dados.excluir_transacao(banco, doc_id)
+    lapide = banco.collection(dados.COLECAO_EXCLUSOES).document(doc_id).get().to_dict()
+    assert lapide['expira_em'] - lapide['excluido_em'] >= dados.RETENCAO_EXCLUSOES - timedelta(seconds=1)
+
+def test_marca_dagua_alem_da_retencao_recarrega_tudo(banco, cache, medir):
+    # Lápide já expirada pelo TTL: só a recarga completa percebe a exclusão
+    doc_id = cache.df['id'].iloc[0]
+    dados.excluir_transacao(banco, doc_id)
+    banco.collection(dados.COLECAO_EXCLUSOES).document(doc_id).delete()
+    cache.marca_dagua -= dados.RETENCAO_EXCLUSOES
+    with medir() as medicao:
+        tipado = _sincronizar(cache, banco)
+    assert medicao.leituras > 100
+    assert len(tipado) == 299
+    _conferir_frame(cache, banco)
@@ -0,0 +1,64 @@
+"""Séries da aba de Tendências: acumulados desde o início do histórico e redução para o gráfico."""
+import numpy as np
+import pandas as pd
+
+import dados
+from tendencias import receitas_despesas, reduzir, resultado_anterior, saldo_diario
+
+
+def test_saldo_do_intervalo_com_acumulado_dos_resumos(banco):
+    tipado = dados.tipar_transacoes(dados.ler_todas_transacoes(banco))
+    resumos = dados.carregar_resumos(banco)
+    inicio = fim = pd.Period('2025-12', freq='M')
+    intervalo = tipado[tipado['mes'] == inicio]
+
+    anterior = resultado_anterior(resumos, inicio)
+    assert anterior != 0
+    parcial = saldo_diario(intervalo, inicio, fim, anterior=anterior)
+    pd.testing.assert_series_equal(parcial, saldo_diario(tipado, inicio, fim), check_freq=False)
+
+def _resumos(*linhas):
+    return pd.DataFrame(linhas, columns=['mes', 'tipo', 'sub_categoria', 'forma_pagamento', 'centavos', 'quantidade'])
+
+def _tipado(*linhas):
+    return dados.tipar_transacoes(pd.DataFrame(
+        [(f"id{i}", data, tipo, 'Pessoal', 'Outros', 'X', valor, 'PIX') for i, (data, tipo, valor) in enumerate(linhas)],
+        columns=['id'] + dados.CAMPOS_EDITAVEIS))
+
+
+def test_acumulado_mensal_inclui_meses_antes_do_inicio():
+    resumos = _resumos(
+        ('2024-01', 'Receita', 'Salário', 'PIX', 100_000, 1),
+        ('2024-02', 'Despesa', 'Mercado', 'PIX', 30_000, 1),
+        ('2024-04', 'Despesa', 'Mercado', 'PIX', 20_000, 1),
+        ('sem-data', 'Despesa', 'Mercado', 'PIX', 99_900, 1),
+    )
+    totais = receitas_despesas(resumos, pd.Period('2024-03', freq='M'), pd.Period('2024-04', freq='M'))
+    assert totais.index.astype(str).tolist() == ['2024-03', '2024-04']
+    assert totais['Resultado'].tolist() == [0.0, -200.0]
+    # Janeiro e fevereiro (fora do intervalo) entram no saldo; o 'sem-data' não
+    assert totais['Acumulado'].tolist() == [700.0, 500.0]
+
+def test_saldo_diario_inclui_lancamentos_antes_do_inicio():
+    tipado = _tipado(('2024-01-10', 'Receita', 1000.0), ('2024-02-05', 'Despesa', 300.0), ('2024-02-07', 'Despesa', 50.0))
+    saldo = saldo_diario(tipado, pd.Period('2024-02', freq='M'), pd.Period('2024-02', freq='M'))
+    assert saldo.index[0] == pd.Timestamp('2024-02-01')
+    assert saldo.iloc[0] == 1000.0
+    assert saldo[pd.Timestamp('2024-02-05')] == 700.0
+    assert saldo.iloc[-1] == 650.0
+
+def test_reduzir_limita_os_pontos_e_mantem_extremos():
+    dias = pd.date_range('2015-01-01', periods=10 * 365, freq='D')
+    valores = np.random.default_rng(3).normal(size=len(dias)).cumsum()
+    valores[1234], valores[2345] = 1e6, -1e6 # Picos isolados
+    serie = pd.Series(valores, index=dias)
+
+    pontos = reduzir(serie, pontos=500)
+    assert len(pontos) <= 500
+    assert pontos.index.is_monotonic_increasing
+    assert pontos.index[0] == dias[0] and pontos.index[-1] == dias[-1]
+    assert pontos.max() == 1e6 and pontos.min() == -1e6
+
+def test_reduzir_devolve_series_curtas_inteiras():
+    serie = pd.Series([3.0, 1.0, 2.0])
+    assert reduzir(serie, pontos=10) is serie